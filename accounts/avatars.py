@@ -0,0 +1,68 @@
+"""
+Background avatar processing.
+
+Profile.save schedules ``process_avatar`` whenever the avatar file
+changes. It decodes the upload once and writes center-cropped JPEG and
+WebP thumbnails for each of ``AVATAR_SIZES``. Variant names are derived
+from the SHA-256 of the upload, so identical uploads share files and any
+URL can be cached forever.
+"""
+import logging
+
+from core.images import content_digest, extension, open_normalized, square_variants, variant_names
+from core.models import MediaBlob
+from core.storage import media_storage
+from .models import Profile, AVATAR_SIZES, profile_cache
+
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = 'profile_pics/variants'
+
+
+def variant_name(digest, size, fmt):
+    return f"{VARIANT_DIR}/{digest}_{size}.{extension(fmt)}"
+
+
+def process_avatar(profile_id):
+    """Generate the resized avatars of one profile and mark it ready"""
+    profile = Profile.objects.filter(pk=profile_id).only('user', 'avatar', 'avatar_hash', 'avatar_variants').first()
+    if profile is None:
+        return
+    name = profile.avatar.name
+    current = Profile.objects.filter(pk=profile_id, avatar=name)
+
+    if not name or name == Profile._meta.get_field('avatar').default:
+        current.update(avatar_status='ready', avatar_hash='', avatar_variants={})
+        profile_cache.delete(profile.user_id)
+        return
+
+    try:
+        with profile.avatar.open('rb') as upload:
+            digest = content_digest(upload)
+            variants = {}
+            names = {
+                (size, fmt): variant_name(digest, size, fmt)
+                for size in AVATAR_SIZES for fmt in ('jpeg', 'webp')
+            }
+            if all(media_storage.touch(path) for path in names.values()):
+                rendered = []
+            else:
+                rendered = square_variants(open_normalized(upload), AVATAR_SIZES)
+            for size, fmt, data in rendered:
+                media_storage.save_exact(names[size, fmt], data)
+            for (size, fmt), path in names.items():
+                variants.setdefault(str(size), {})[fmt] = path
+    except Exception:
+        logger.exception("Could not process avatar %s of profile %s", name, profile_id)
+        current.update(avatar_status='failed')
+        profile_cache.delete(profile.user_id)
+        return
+
+    # Filtering on the file name drops the result if another upload won the race
+    # update() skips post_save, so the cached profile is dropped here
+    updated = current.update(avatar_status='ready', avatar_hash=digest, avatar_variants=variants)
+    profile_cache.delete(profile.user_id)
+    if updated:
+        MediaBlob.acquire(variant_names(variants))
+        MediaBlob.release(variant_names(profile.avatar_variants))
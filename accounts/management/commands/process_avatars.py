@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from accounts.avatars import process_avatar
+from accounts.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Generate resized avatars that are still pending (or failed with --retry-failed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true',
+                            help="Also retry avatars whose processing failed")
+        parser.add_argument('--all', action='store_true',
+                            help="Reprocess every uploaded avatar, e.g. after changing AVATAR_SIZES")
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(avatar=Profile._meta.get_field('avatar').default)
+        if not options['all']:
+            statuses = ['pending', 'failed'] if options['retry_failed'] else ['pending']
+            profiles = profiles.filter(avatar_status__in=statuses)
+
+        processed = 0
+        for profile_id in profiles.values_list('id', flat=True).iterator():
+            process_avatar(profile_id)
+            processed += 1
+        failed = Profile.objects.filter(avatar_status='failed').count()
+        self.stdout.write(f"Processed {processed} avatars, {failed} failed")
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.9 on 2026-10-18 04:58
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='avatar',
+            field=models.ImageField(default='default.jpg', storage=core.storage.get_media_storage, upload_to='profile_pics/'),
+        ),
+    ]
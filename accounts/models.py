@@ -1,39 +1,105 @@
-from django.db import models
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models
 from django.contrib.auth.models import User
 from django.urls import reverse
-from PIL import Image
 
+from core.cache import CacheNamespace
+from core.images import pick_variant, variant_names
+from core.models import MediaBlob, TracksSavedFields
+from core.storage import get_media_storage
+from core.tasks import run_in_background
 
-class Profile(models.Model):
+
+AVATAR_SIZES = getattr(settings, 'AVATAR_SIZES', (40, 150, 300))
+PROFILE_CACHE_TIMEOUT = getattr(settings, 'PROFILE_CACHE_TIMEOUT', 60 * 15)
+
+# Profiles with their user, by user id; dropped by accounts.signals
+profile_cache = CacheNamespace('profile', timeout=PROFILE_CACHE_TIMEOUT)
+
+
+class Profile(TracksSavedFields, models.Model):
     """
     Extends Django's built-in User model with additional profile information
     """
+    AVATAR_STATUS_CHOICES = [
+        ('ready', 'Ready'),
+        ('pending', 'Pending'),
+        ('failed', 'Failed'),
+    ]
+    
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(max_length=500, blank=True, help_text="Tell us about yourself")
-    avatar = models.ImageField(default='default.jpg', upload_to='profile_pics/')
+    avatar = models.ImageField(default='default.jpg', upload_to='profile_pics/', storage=get_media_storage)
     location = models.CharField(max_length=100, blank=True)
     birth_date = models.DateField(null=True, blank=True)
     website = models.URLField(max_length=200, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Resized avatars, generated off-request by accounts.avatars:
+    # {"150": {"jpeg": "profile_pics/variants/<sha256>_150.jpg", "webp": ...}, ...}
+    avatar_hash = models.CharField(max_length=64, blank=True)
+    avatar_variants = models.JSONField(default=dict, blank=True)
+    avatar_status = models.CharField(max_length=10, choices=AVATAR_STATUS_CHOICES, default='ready')
+    
     # Email verification
     email_verified = models.BooleanField(default=False)
     email_verification_token = models.CharField(max_length=100, blank=True)
     
+    # So save() can tell whether the avatar changed
+    tracked_fields = ('avatar',)
+    
     def __str__(self):
         return f"{self.user.username}'s Profile"
     
+    @classmethod
+    def for_user(cls, user_id):
+        """The user's profile with its ``user`` loaded, from the cache when possible; None if missing"""
+        return profile_cache.get_or_set(
+            user_id, lambda: cls.objects.using(DEFAULT_DB_ALIAS).select_related('user').filter(user_id=user_id).first()
+        )
+    
     def get_absolute_url(self):
         return reverse('profile', kwargs={'username': self.user.username})
     
     def save(self, *args, **kwargs):
+        # Only a new avatar file needs processing, and that happens in the
+        # background; ordinary saves (e.g. on every login) never decode images
+        avatar_changed = self._avatar_changed()
+        if avatar_changed:
+            previous = [] if self._state.adding else [
+                name
+                for stored in Profile.objects.filter(pk=self.pk).only('avatar', 'avatar_variants')
+                for name in stored.media_names()
+            ]
+            self.avatar_status = 'pending'
+            self.avatar_variants = {}
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'avatar_status', 'avatar_variants'}
+        
         super().save(*args, **kwargs)
         
-        # Resize image if too large
-        if self.avatar:
-            img = Image.open(self.avatar.path)
-            if img.height > 300 or img.width > 300:
-                output_size = (300, 300)
-                img.thumbnail(output_size)
-                img.save(self.avatar.path)
+        if avatar_changed:
+            MediaBlob.acquire(self.media_names())
+            MediaBlob.release(previous)
+            from .avatars import process_avatar
+            run_in_background(process_avatar, self.pk)
+    
+    def _avatar_changed(self):
+        if 'avatar' in self.get_deferred_fields():
+            return False
+        if self._state.adding or 'avatar' not in self.saved_values:
+            return self.avatar.name != self._meta.get_field('avatar').default
+        return self.avatar.name != self.saved_values['avatar']
+    
+    def media_names(self):
+        """Stored files this profile references (for MediaBlob counting)"""
+        if self.avatar.name == self._meta.get_field('avatar').default:
+            return []
+        return [self.avatar.name, *variant_names(self.avatar_variants)]
+    
+    def avatar_url(self, size, fmt='jpeg'):
+        """URL of the smallest generated avatar at least ``size`` px wide"""
+        name = pick_variant(self.avatar_variants, size, fmt)
+        return self.avatar.storage.url(name) if name else self.avatar.url
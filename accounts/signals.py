@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile
-from user_settings.models import UserSettings
+from core.models import MediaBlob
+from .models import Profile, profile_cache
+from user_settings.models import UserSettings, settings_cache
 
 
 @receiver(post_save, sender=User)
@@ -15,10 +17,13 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, update_fields=None, **kwargs):
     """
     Automatically save the Profile when the User is saved
     """
+    # login() only touches last_login; nothing on the profile changes
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
     if hasattr(instance, 'profile'):
         instance.profile.save()
 
@@ -30,3 +35,32 @@ def create_user_settings(sender, instance, created, **kwargs):
     """
     if created:
         UserSettings.objects.create(user=instance)
+
+
+@receiver(post_delete, sender=Profile)
+def release_avatar_media(sender, instance, **kwargs):
+    """
+    Drop the profile's references to its avatar files
+    """
+    MediaBlob.release(instance.media_names())
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    """
+    Drop the cached profile when it changes, and again on commit so a
+    read racing the transaction cannot re-cache the old row.
+    """
+    user_id = instance.user_id
+    profile_cache.delete(user_id)
+    transaction.on_commit(lambda: profile_cache.delete(user_id))
+
+
+@receiver(post_save, sender=UserSettings)
+@receiver(post_delete, sender=UserSettings)
+def invalidate_cached_settings(sender, instance, **kwargs):
+    """Drop the cached settings when they change, now and on commit"""
+    user_id = instance.user_id
+    settings_cache.delete(user_id)
+    transaction.on_commit(lambda: settings_cache.delete(user_id))
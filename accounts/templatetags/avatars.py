@@ -0,0 +1,18 @@
+from django import template
+
+from core.images import variant_srcset
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_url(profile, size, fmt='jpeg'):
+    """URL of ``profile``'s avatar resized to at least ``size`` px"""
+    return profile.avatar_url(size, fmt)
+
+
+@register.simple_tag
+def avatar_srcset(profile, fmt='jpeg'):
+    """``srcset`` listing every generated size of one format"""
+    return variant_srcset(profile.avatar_variants, profile.avatar.storage, fmt)
@@ -1,3 +1,115 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from notifications.models import EmailLog
+from .models import Profile
+
+
+class RegistrationEmailTests(TestCase):
+    def test_register_only_enqueues_welcome_email(self):
+        response = self.client.post(reverse('register'), {
+            'username': 'newbie',
+            'first_name': 'New',
+            'last_name': 'Bie',
+            'email': 'newbie@example.com',
+            'password1': 'a-Strong-pass-42',
+            'password2': 'a-Strong-pass-42',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        log = EmailLog.objects.get(email_type='welcome')
+        self.assertEqual((log.status, log.to_email), ('pending', 'newbie@example.com'))
+        self.assertIn('New', log.html_body)
+
+
+def make_image(size=(640, 480), fmt='PNG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, fmt)
+    return SimpleUploadedFile(f'me.{fmt.lower()}', buffer.getvalue())
+
+
+class AvatarProcessingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.user = User.objects.create_user('pictured', password='pass12345')
+
+    def upload(self, profile, image):
+        with override_settings(MEDIA_ROOT=self.media_root, BACKGROUND_TASKS_EAGER=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                profile.avatar = image
+                profile.save()
+            profile.refresh_from_db()
+
+    def test_upload_is_processed_after_commit(self):
+        profile = self.user.profile
+        with override_settings(MEDIA_ROOT=self.media_root):
+            with self.captureOnCommitCallbacks() as callbacks:
+                profile.avatar = make_image()
+                profile.save()
+        self.assertEqual(profile.avatar_status, 'pending')
+        # Avatar processing, and dropping the cached profile
+        self.assertEqual(len(callbacks), 2)
+
+    def test_variants_are_generated_and_shared(self):
+        profile = self.user.profile
+        self.upload(profile, make_image())
+        self.assertEqual(profile.avatar_status, 'ready')
+        self.assertEqual(sorted(profile.avatar_variants, key=int), ['40', '150', '300'])
+        with override_settings(MEDIA_ROOT=self.media_root):
+            with Image.open(profile.avatar.storage.path(profile.avatar_variants['150']['webp'])) as img:
+                self.assertEqual((img.format, img.size), ('WEBP', (150, 150)))
+            self.assertTrue(profile.avatar_url(100).endswith(f'{profile.avatar_hash}_150.jpg'))
+
+        other = User.objects.create_user('twin', password='pass12345').profile
+        self.upload(other, make_image())
+        self.assertEqual(other.avatar_variants, profile.avatar_variants)
+
+    def test_broken_upload_is_marked_failed(self):
+        profile = self.user.profile
+        with self.assertLogs('accounts.avatars', 'ERROR'):
+            self.upload(profile, SimpleUploadedFile('bad.png', b'not an image'))
+        self.assertEqual(profile.avatar_status, 'failed')
+        with override_settings(MEDIA_ROOT=self.media_root):
+            self.assertEqual(profile.avatar_url(150), profile.avatar.url)
+
+    def test_login_does_not_touch_the_profile(self):
+        with mock.patch.object(Profile, 'save') as save:
+            self.client.post(reverse('login'), {'username': 'pictured', 'password': 'pass12345'})
+        self.assertIn('_auth_user_id', self.client.session)
+        save.assert_not_called()
+
+
+class ProfileViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user('owner', email='owner@example.com', password='pass12345')
+        self.visitor = User.objects.create_user('visitor', password='pass12345')
+        self.client.force_login(self.visitor)
+
+    def test_email_follows_show_email_setting(self):
+        url = reverse('profile_detail', args=['owner'])
+        self.assertNotContains(self.client.get(url), 'owner@example.com')
+        settings = self.owner.settings
+        settings.show_email = True
+        settings.save()
+        self.assertContains(self.client.get(url), 'owner@example.com')
+
+    def test_profile_edit_is_visible_right_away(self):
+        url = reverse('profile_detail', args=['owner'])
+        self.client.get(url)
+        profile = self.owner.profile
+        profile.bio = 'Freshly written'
+        profile.save()
+        self.assertContains(self.client.get(url), 'Freshly written')
+        self.assertEqual(self.client.get(reverse('profile_detail', args=['nobody'])).status_code, 404)
@@ -3,19 +3,21 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.contrib.auth.tokens import default_token_generator
 from django.urls import reverse
-from django.conf import settings
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 import uuid
 
 from .models import Profile
 from .forms import UserRegistrationForm, UserLoginForm, PasswordResetRequestForm, ProfileUpdateForm
-from notifications.models import Notification, EmailLog
+from notifications.models import Notification
+from notifications.outbox import enqueue_email
+from user_settings.models import UserSettings
+from core.uploads import ImageUploadHandler, validate_uploads
 
 
 def register_view(request):
@@ -165,28 +167,39 @@ def password_reset_confirm_view(request, uidb64, token):
 def profile_view(request, username=None):
     """User profile view"""
     if username:
-        user = get_object_or_404(User, username=username)
-        profile = get_object_or_404(Profile, user=user)
-        is_own_profile = request.user == user
+        user_id = get_object_or_404(User.objects.values_list('id', flat=True), username=username)
     else:
-        user = request.user
-        profile = request.user.profile
-        is_own_profile = True
+        user_id = request.user.pk
+    # Profile and settings come from the cache (see accounts.signals for invalidation)
+    profile = Profile.for_user(user_id)
+    if profile is None:
+        raise Http404("No profile for this user")
+    user_settings = UserSettings.for_user(user_id)
+    is_own_profile = request.user.pk == user_id
     
     context = {
-        'profile_user': user,
+        'profile_user': profile.user,
         'profile': profile,
         'is_own_profile': is_own_profile,
+        'show_email': is_own_profile or (user_settings is not None and user_settings.show_email),
     }
     return render(request, 'accounts/profile.html', context)
 
 
 @login_required
+@csrf_exempt
 def profile_edit_view(request):
     """Edit user profile view"""
+    # Avatar uploads are streamed and size-checked; CSRF is checked below
+    request.upload_handlers = [ImageUploadHandler(request)]
+    return _profile_edit(request)
+
+
+@csrf_protect
+def _profile_edit(request):
     if request.method == 'POST':
         form = ProfileUpdateForm(request.POST, request.FILES, instance=request.user.profile)
-        if form.is_valid():
+        if validate_uploads(form, request):
             form.save()
             messages.success(request, 'Your profile has been updated successfully.')
             return redirect('profile')
@@ -197,77 +210,22 @@ def profile_edit_view(request):
 
 
 def send_welcome_email(user):
-    """Send welcome email to new user"""
-    try:
-        subject = 'Welcome to SocialHub!'
-        message = render_to_string('accounts/emails/welcome_email.html', {
-            'user': user,
-            'site_name': 'SocialHub'
-        })
-        
-        send_mail(
-            subject,
-            '',
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            html_message=message,
-            fail_silently=False,
-        )
-        
-        # Log email
-        EmailLog.objects.create(
-            recipient=user,
-            email_type='welcome',
-            subject=subject,
-            is_sent=True
-        )
-    except Exception as e:
-        # Log failed email
-        EmailLog.objects.create(
-            recipient=user,
-            email_type='welcome',
-            subject='Welcome to SocialHub!',
-            is_sent=False,
-            error_message=str(e)
-        )
+    """Queue the welcome email for the outbox worker"""
+    message = render_to_string('accounts/emails/welcome_email.html', {
+        'user': user,
+        'site_name': 'SocialHub'
+    })
+    enqueue_email(user, 'welcome', 'Welcome to SocialHub!', message)
 
 
 def send_password_reset_email(user, uid, token, request):
-    """Send password reset email"""
-    try:
-        reset_url = request.build_absolute_uri(
-            reverse('password_reset_confirm', kwargs={'uidb64': uid, 'token': token})
-        )
-        
-        subject = 'Reset Your SocialHub Password'
-        message = render_to_string('accounts/emails/password_reset_email.html', {
-            'user': user,
-            'reset_url': reset_url,
-            'site_name': 'SocialHub'
-        })
-        
-        send_mail(
-            subject,
-            '',
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            html_message=message,
-            fail_silently=False,
-        )
-        
-        # Log email
-        EmailLog.objects.create(
-            recipient=user,
-            email_type='password_reset',
-            subject=subject,
-            is_sent=True
-        )
-    except Exception as e:
-        # Log failed email
-        EmailLog.objects.create(
-            recipient=user,
-            email_type='password_reset',
-            subject='Reset Your SocialHub Password',
-            is_sent=False,
-            error_message=str(e)
-        )
+    """Queue the password reset email for the outbox worker"""
+    reset_url = request.build_absolute_uri(
+        reverse('password_reset_confirm', kwargs={'uidb64': uid, 'token': token})
+    )
+    message = render_to_string('accounts/emails/password_reset_email.html', {
+        'user': user,
+        'reset_url': reset_url,
+        'site_name': 'SocialHub'
+    })
+    enqueue_email(user, 'password_reset', 'Reset Your SocialHub Password', message)
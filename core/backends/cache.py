@@ -0,0 +1,49 @@
+"""
+Cache backends that report evictions to ``core.metrics.cache_stats``.
+
+Django's backends cull silently once ``MAX_ENTRIES`` is reached; these
+subclasses count what each cull removed. ``LocMemCache`` keeps entries in
+recency order and culls from the least recently used end, so it behaves
+as an LRU. Redis evicts on its own, so its count is read from the
+server's ``INFO`` instead (see ``cache_evictions``).
+"""
+from django.core.cache import caches
+from django.core.cache.backends import filebased, locmem
+from django.core.cache.backends.redis import RedisCache
+
+from core.metrics import cache_stats
+
+
+class LocMemCache(locmem.LocMemCache):
+    def _cull(self):
+        before = len(self._cache)
+        super()._cull()
+        cache_stats.record_evictions(before - len(self._cache))
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    _culling = False
+
+    def _cull(self):
+        self._culling = True
+        try:
+            super()._cull()
+        finally:
+            self._culling = False
+
+    def _delete(self, fname):
+        deleted = super()._delete(fname)
+        if deleted and self._culling:
+            cache_stats.record_evictions(1)
+        return deleted
+
+
+def cache_evictions(alias='default'):
+    """Entries the cache evicted so far, or None when a Redis server can't be asked"""
+    backend = caches[alias]
+    if not isinstance(backend, RedisCache):
+        return cache_stats.evictions
+    try:
+        return backend._cache.get_client(write=False).info('stats').get('evicted_keys', 0)
+    except Exception:
+        return None
@@ -0,0 +1,32 @@
+"""
+SQLite backend tuned for concurrent writers.
+
+* Issues the PRAGMAs in ``settings.SQLITE_PRAGMAS`` (WAL, synchronous,
+  busy timeout, mmap...) on every new connection.
+* Supports ``OPTIONS['transaction_mode']`` as Django 5.1 does. With
+  ``'IMMEDIATE'`` a transaction takes the write lock at BEGIN and waits
+  out the busy timeout there. A DEFERRED transaction that reads before
+  writing instead fails with "database is locked" when another writer
+  got in first, and the busy timeout cannot help it.
+
+Drop this backend for the stock one after upgrading to Django 5.1+.
+"""
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.transaction_mode = kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = getattr(self, 'transaction_mode', None)
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -0,0 +1,86 @@
+"""
+Namespaced, versioned cache keys.
+
+Every cached read model gets a ``CacheNamespace``: keys look like
+``profile:v1:42``, so bumping a namespace's version retires all of its
+entries at once after a change to what is cached, without flushing the
+rest of the cache. Lookups count hits and misses per namespace in
+``core.metrics.cache_stats``. Entries are dropped by the owning app's
+signals when the underlying rows change. Fills must read from the primary
+(``DEFAULT_DB_ALIAS``): a replica lagging behind the write that dropped a
+key would put the old rows back for the whole timeout.
+"""
+from django.core.cache import cache
+
+from .metrics import cache_stats
+
+
+_MISSING = object()
+
+
+class CacheNamespace:
+    def __init__(self, name, version=1, timeout=None):
+        self.name = name
+        self.version = version
+        # None uses the TIMEOUT of the CACHES setting
+        self.timeout = timeout
+
+    def __repr__(self):
+        return f'<CacheNamespace {self.name}:v{self.version}>'
+
+    def key(self, ident):
+        return f'{self.name}:v{self.version}:{ident}'
+
+    def _timeout(self, timeout):
+        return self.timeout if timeout is None else timeout
+
+    def _set_args(self, timeout):
+        timeout = self._timeout(timeout)
+        return () if timeout is None else (timeout,)
+
+    def get(self, ident, default=None):
+        value = cache.get(self.key(ident), _MISSING)
+        if value is _MISSING:
+            cache_stats.record(self.name, misses=1)
+            return default
+        cache_stats.record(self.name, hits=1)
+        return value
+
+    def get_many(self, idents):
+        """Map each cached ident to its value; idents that missed are left out"""
+        keys = {self.key(ident): ident for ident in idents}
+        found = cache.get_many(keys)
+        cache_stats.record(self.name, hits=len(found), misses=len(keys) - len(found))
+        return {keys[key]: value for key, value in found.items()}
+
+    def get_or_set(self, ident, compute, timeout=None):
+        """
+        Cached value of ``ident``, calling ``compute()`` and storing its
+        result on a miss. None isn't stored, so a row that didn't exist
+        yet is looked up again next time.
+        """
+        value = self.get(ident, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            if value is not None:
+                self.set(ident, value, timeout)
+        return value
+
+    def set(self, ident, value, timeout=None):
+        cache.set(self.key(ident), value, *self._set_args(timeout))
+
+    def set_many(self, values, timeout=None):
+        cache.set_many({self.key(ident): value for ident, value in values.items()}, *self._set_args(timeout))
+
+    def add(self, ident, value, timeout=None):
+        return cache.add(self.key(ident), value, *self._set_args(timeout))
+
+    def incr(self, ident, delta=1):
+        """Raises ValueError when ``ident`` isn't cached"""
+        return cache.incr(self.key(ident), delta)
+
+    def delete(self, *idents):
+        if len(idents) == 1:
+            cache.delete(self.key(idents[0]))
+        elif idents:
+            cache.delete_many([self.key(ident) for ident in idents])
@@ -0,0 +1,28 @@
+"""
+Query-plan inspection used to guard the hot queries' indexes.
+
+``full_scans(queryset)`` runs ``EXPLAIN`` and returns the plan lines that
+read a whole table instead of seeking through an index.
+"""
+import re
+
+from django.db import connections
+
+
+# SQLite: "SCAN posts_comment" is a full scan, while "SCAN t USING INDEX i",
+# "SEARCH ..." and "SCAN CONSTANT ROW" are not.
+_SQLITE_SCAN = re.compile(r'\bSCAN (?!CONSTANT ROW)(\w+)(?: AS \w+)?\s*$')
+_POSTGRES_SCAN = re.compile(r'\bSeq Scan on (\w+)')
+
+
+def full_scans(queryset):
+    """Names of the tables ``queryset`` reads with a full table scan"""
+    vendor = connections[queryset.db].vendor
+    plan = queryset.explain()
+    if vendor == 'sqlite':
+        pattern = _SQLITE_SCAN
+    elif vendor == 'postgresql':
+        pattern = _POSTGRES_SCAN
+    else:
+        raise NotImplementedError(f"No plan parser for {vendor}")
+    return [match.group(1) for match in map(pattern.search, plan.splitlines()) if match]
@@ -0,0 +1,66 @@
+"""
+Friendship graph lookups.
+
+Friend sets are resolved with one ``UNION`` of the two directions of
+``Friendship`` and cached per user, so privacy checks and feed building
+cost at most one query per user instead of one per friend. Cached sets are
+dropped by ``core.signals`` whenever a friendship row changes.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .cache import CacheNamespace
+from .models import Friendship
+
+
+FRIENDS_CACHE_TIMEOUT = getattr(settings, 'FRIENDS_CACHE_TIMEOUT', 60 * 15)
+
+friends_cache = CacheNamespace('friends', timeout=FRIENDS_CACHE_TIMEOUT)
+
+
+def _user_id(user):
+    return getattr(user, 'pk', user)
+
+
+def _accepted_edges(user_ids):
+    """Accepted friendships touching ``user_ids`` as one UNION query, read from the primary"""
+    friendships = Friendship.objects.using(DEFAULT_DB_ALIAS)
+    sent = friendships.filter(
+        from_user_id__in=user_ids, status='accepted'
+    ).values_list('from_user_id', 'to_user_id')
+    received = friendships.filter(
+        to_user_id__in=user_ids, status='accepted'
+    ).values_list('to_user_id', 'from_user_id')
+    return sent.union(received, all=True)
+
+
+def friend_ids_many(users):
+    """Map each user id to the frozenset of their friends' ids"""
+    user_ids = {_user_id(user) for user in users}
+    result = friends_cache.get_many(user_ids)
+
+    missing = user_ids - result.keys()
+    if missing:
+        found = {user_id: set() for user_id in missing}
+        for user_id, friend_id in _accepted_edges(missing):
+            found[user_id].add(friend_id)
+        fresh = {user_id: frozenset(friends) for user_id, friends in found.items()}
+        friends_cache.set_many(fresh)
+        result.update(fresh)
+    return result
+
+
+def friend_ids(user):
+    """Frozenset of the ids of ``user``'s accepted friends"""
+    user_id = _user_id(user)
+    return friend_ids_many([user_id])[user_id]
+
+
+def friends_among(user, others):
+    """Subset of ``others`` (users or ids) that are friends with ``user``"""
+    return friend_ids(user) & {_user_id(other) for other in others}
+
+
+def invalidate_friends(*users):
+    """Forget the cached friend sets of the given users"""
+    friends_cache.delete(*(_user_id(user) for user in users))
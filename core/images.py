@@ -0,0 +1,177 @@
+"""
+Image helpers shared by the avatar and post image pipelines.
+"""
+import hashlib
+import math
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+
+# Larger images are refused before decoding (40 MP covers any phone camera)
+IMAGE_MAX_PIXELS = getattr(settings, 'IMAGE_MAX_PIXELS', 40_000_000)
+
+
+# Pillow format name, file extension and encoder options per output format
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+
+
+def content_digest(file, chunk_size=64 * 1024):
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def open_normalized(file):
+    """Open an image upright (EXIF orientation applied) in RGB"""
+    image = Image.open(file)
+    if image.width * image.height > IMAGE_MAX_PIXELS:
+        raise ValueError(f"Image is {image.width}x{image.height}, over the pixel limit")
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def encode(image, fmt):
+    """Encode ``image`` as ``fmt`` ('jpeg' or 'webp'); metadata is not copied"""
+    pil_format, _, options = FORMATS[fmt]
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def extension(fmt):
+    return FORMATS[fmt][1]
+
+
+def square_variants(image, sizes, formats=('jpeg', 'webp')):
+    """
+    Yield ``(size, fmt, bytes)`` for center-cropped square thumbnails,
+    largest first so each one is resampled from the previous.
+    """
+    current = image
+    for size in sorted(sizes, reverse=True):
+        current = ImageOps.fit(current, (size, size), Image.LANCZOS)
+        for fmt in formats:
+            yield size, fmt, encode(current, fmt)
+
+
+def scaled_variants(image, widths, formats=('jpeg', 'webp')):
+    """
+    Yield ``(width, fmt, bytes)`` for copies scaled down to each of
+    ``widths``, keeping the aspect ratio. Images are never upscaled, so
+    widths beyond the original collapse into one variant at full size.
+    """
+    current = image
+    emitted = set()
+    for width in sorted(widths, reverse=True):
+        width = min(width, image.width)
+        if width in emitted:
+            continue
+        emitted.add(width)
+        if width < current.width:
+            height = max(1, round(current.height * width / current.width))
+            current = current.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            yield width, fmt, encode(current, fmt)
+
+
+def pick_variant(variants, size, fmt='jpeg'):
+    """
+    Name of the smallest variant at least ``size`` px wide, or the largest
+    one if none is big enough. ``variants`` maps widths (as strings) to
+    ``{fmt: name}``; returns None when it is empty.
+    """
+    widths = sorted(int(width) for width in variants)
+    if not widths:
+        return None
+    width = next((w for w in widths if w >= size), widths[-1])
+    return variants[str(width)].get(fmt)
+
+
+def variant_names(variants):
+    """Every file name in a variants mapping"""
+    return [name for formats in variants.values() for name in formats.values()]
+
+
+def variant_srcset(variants, storage, fmt='jpeg'):
+    """``srcset`` attribute value listing every variant of one format"""
+    return ', '.join(
+        f"{storage.url(variants[width][fmt])} {width}w"
+        for width in sorted(variants, key=int)
+        if fmt in variants[width]
+    )
+
+
+_BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+
+def _base83(value, length):
+    return ''.join(_BASE83[value // 83 ** (length - i - 1) % 83] for i in range(length))
+
+
+def _to_linear(channel):
+    value = channel / 255
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+
+def _to_srgb(value):
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash(image, x_components=4, y_components=3):
+    """
+    BlurHash (https://blurha.sh) of ``image``: a ~30 character placeholder
+    clients can paint while the real image loads. Computed from a 32px
+    thumbnail, which is visually indistinguishable and keeps this cheap.
+    """
+    small = image.copy()
+    small.thumbnail((32, 32))
+    width, height = small.size
+    pixels = [tuple(_to_linear(c) for c in pixel) for pixel in small.getdata()]
+
+    factors = []
+    for j in range(y_components):
+        cos_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            norm = (1 if i == j == 0 else 2) / (width * height)
+            r = g = b = 0.0
+            for y in range(height):
+                row = pixels[y * width:(y + 1) * width]
+                for x, (pr, pg, pb) in enumerate(row):
+                    basis = cos_x[x] * cos_y[y]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            factors.append((r * norm, g * norm, b * norm))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        quantised = max(0, min(82, math.floor(max(abs(v) for f in ac for v in f) * 166 - 0.5)))
+        maximum = (quantised + 1) / 166
+    else:
+        quantised, maximum = 0, 1
+    result += _base83(quantised, 1)
+    result += _base83((_to_srgb(dc[0]) << 16) + (_to_srgb(dc[1]) << 8) + _to_srgb(dc[2]), 4)
+
+    def quantise(value):
+        scaled = math.copysign(abs(value / maximum) ** 0.5, value)
+        return max(0, min(18, math.floor(scaled * 9 + 9.5)))
+
+    for r, g, b in ac:
+        result += _base83(quantise(r) * 19 * 19 + quantise(g) * 19 + quantise(b), 2)
+    return result
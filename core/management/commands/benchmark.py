@@ -0,0 +1,175 @@
+import json
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from core.metrics import percentile
+from posts.models import Comment, Like, Post
+
+
+BENCHMARK_COMMENT = 'Benchmark comment'
+SCENARIOS = ('feed', 'timeline', 'post_detail', 'like', 'comment', 'profile', 'notifications')
+
+
+class Command(BaseCommand):
+    help = (
+        "Exercise the main pages through the Django test client against the current "
+        "database (see generate_social_graph), report req/s and p50/p99, and fail when "
+        "results regress past --threshold compared with --baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Measured requests per scenario")
+        parser.add_argument('--warmup', type=int, default=10, help="Unmeasured requests per scenario")
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                            help="Run only these scenarios (repeatable)")
+        parser.add_argument('--users', type=int, default=20, help="Distinct logged-in users to rotate through")
+        parser.add_argument('--prefix', default='synthetic', help="Username prefix of the users to log in as")
+        parser.add_argument('--host', help="Host header; defaults to the first ALLOWED_HOSTS entry")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Write results as JSON to this file")
+        parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Allowed relative slowdown before a scenario counts as a regression")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        # Sampled with the seeded rng, so every run logs in as the same users
+        user_ids = list(
+            User.objects.filter(username__startswith=f"{options['prefix']}_").order_by('id').values_list('id', flat=True)
+        )
+        chosen = self.rng.sample(user_ids, min(options['users'], len(user_ids)))
+        users_by_id = User.objects.in_bulk(chosen)
+        users = [users_by_id[user_id] for user_id in chosen]
+        if not users:
+            raise CommandError("No users to benchmark with; run generate_social_graph first")
+        host = options['host'] or next(
+            (h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost'
+        )
+        self.sessions = []
+        for user in users:
+            client = Client(HTTP_HOST=host)
+            client.force_login(user)
+            posts = list(Post.objects.visible_to(user).order_by('-created_at').values_list('id', flat=True)[:100])
+            self.sessions.append((client, user, posts))
+        self.usernames = [user.username for user in users]
+
+        liked_before = self.liked()
+        last_comment_id = Comment.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        results = {}
+        try:
+            for scenario in options['scenario'] or SCENARIOS:
+                results[scenario] = self.measure(getattr(self, f'request_{scenario}'), options)
+        finally:
+            self.restore(liked_before, last_comment_id)
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = self.compare(results, baseline, options['threshold'])
+            if regressions:
+                raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS(f"No regressions beyond {options['threshold']:.0%}"))
+        failed = [name for name, result in results.items() if result['errors']]
+        if failed:
+            raise CommandError(f"Requests failed in: {', '.join(failed)}")
+
+    def measure(self, run, options):
+        for _ in range(options['warmup']):
+            run(*self.rng.choice(self.sessions))
+        durations, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(options['requests']):
+            begin = time.perf_counter()
+            status = run(*self.rng.choice(self.sessions))
+            durations.append((time.perf_counter() - begin) * 1000)
+            errors += status >= 400
+        elapsed = time.perf_counter() - started
+        durations.sort()
+        return {
+            'requests': len(durations),
+            'errors': errors,
+            'rps': len(durations) / elapsed,
+            'p50_ms': percentile(durations, 0.5),
+            'p99_ms': percentile(durations, 0.99),
+        }
+
+    def liked(self):
+        """``(user_id, post_id)`` likes the like scenario can toggle"""
+        users = [user.id for _, user, _ in self.sessions]
+        posts = {post_id for _, _, session_posts in self.sessions for post_id in session_posts}
+        return set(Like.objects.filter(user_id__in=users, post_id__in=posts).values_list('user_id', 'post_id'))
+
+    def restore(self, liked_before, last_comment_id):
+        """Undo the write scenarios, so the next run measures the same data"""
+        Comment.objects.filter(id__gt=last_comment_id, content=BENCHMARK_COMMENT).delete()
+        liked_now = self.liked()
+        toggled = liked_before ^ liked_now
+        users = User.objects.in_bulk({user_id for user_id, _ in toggled})
+        posts = Post.objects.in_bulk({post_id for _, post_id in toggled})
+        for user_id, post_id in liked_now - liked_before:
+            Like.unset(posts[post_id], users[user_id])
+        for user_id, post_id in liked_before - liked_now:
+            Like.set(posts[post_id], users[user_id])
+
+    def report(self, results):
+        self.stdout.write(f"{'scenario':<14}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}")
+        for name, r in results.items():
+            self.stdout.write(
+                f"{name:<14}{r['requests']:>9}{r['errors']:>8}{r['rps']:>9.1f}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+            )
+
+    def compare(self, results, baseline, threshold):
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if not before:
+                continue
+            for key in ('p50_ms', 'p99_ms'):
+                if result[key] > before[key] * (1 + threshold):
+                    regressions.append(f"{name} {key}: {before[key]:.2f} -> {result[key]:.2f}")
+            if result['rps'] < before['rps'] * (1 - threshold):
+                regressions.append(f"{name} req/s: {before['rps']:.1f} -> {result['rps']:.1f}")
+        return regressions
+
+    def pick_post(self, posts):
+        return self.rng.choice(posts) if posts else None
+
+    def request_feed(self, client, user, posts):
+        return client.get(reverse('posts:post_list')).status_code
+
+    def request_timeline(self, client, user, posts):
+        return client.get(reverse('posts:timeline')).status_code
+
+    def request_post_detail(self, client, user, posts):
+        post_id = self.pick_post(posts)
+        return client.get(reverse('posts:post_detail', args=[post_id])).status_code if post_id else 200
+
+    def request_like(self, client, user, posts):
+        # A toggle: about half of these requests unlike again
+        post_id = self.pick_post(posts)
+        if post_id is None:
+            return 200
+        return client.post(reverse('posts:like_post', args=[post_id])).status_code
+
+    def request_comment(self, client, user, posts):
+        post_id = self.pick_post(posts)
+        if post_id is None:
+            return 200
+        return client.post(reverse('posts:add_comment', args=[post_id]), {'content': BENCHMARK_COMMENT}).status_code
+
+    def request_profile(self, client, user, posts):
+        username = self.rng.choice(self.usernames)
+        return client.get(reverse('profile_detail', args=[username])).status_code
+
+    def request_notifications(self, client, user, posts):
+        return client.get(reverse('notifications:inbox')).status_code
@@ -0,0 +1,127 @@
+import random
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.test.utils import override_settings
+
+from core.metrics import percentile
+from posts.models import Comment, Like, Post
+
+
+BENCHMARK_COMMENT = 'benchmark_writes comment'
+
+# What the project ran with before SQLITE_PRAGMAS: rollback journal, an
+# fsync on every commit, Python's default 5 s busy wait, DEFERRED transactions
+SQLITE_DEFAULT_PRAGMAS = {
+    'journal_mode': 'delete',
+    'synchronous': 'full',
+    'busy_timeout': 5000,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent write throughput (comments and like toggles from several "
+        "threads) on the configured database. With --compare on SQLite, first run "
+        "with SQLite's defaults (no SQLITE_PRAGMAS, deferred transactions)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=200, help="Write transactions per thread")
+        parser.add_argument('--compare', action='store_true',
+                            help="SQLite only: also run with the default journal settings")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # Sampled with the seed, so every run writes to the same users and posts
+        rng = random.Random(options['seed'])
+        users = list(User.objects.order_by('id').values_list('id', flat=True))
+        users = rng.sample(users, min(200, len(users)))
+        posts = list(Post.objects.filter(privacy='public').order_by('id').values_list('id', flat=True))
+        posts = rng.sample(posts, min(200, len(posts)))
+        if not users or not posts:
+            raise CommandError("Needs users and public posts; run generate_social_graph first")
+
+        runs = [('configured', None)]
+        if options['compare']:
+            if connection.vendor != 'sqlite':
+                raise CommandError("--compare only applies to SQLite")
+            runs.insert(0, ('sqlite defaults', SQLITE_DEFAULT_PRAGMAS))
+
+        self.stdout.write(f"{'pragmas':<18}{'writes':>8}{'errors':>8}{'writes/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+        try:
+            for label, pragmas in runs:
+                if pragmas is None:
+                    result = self.run(users, posts, options)
+                else:
+                    options_dict = connections.settings['default']['OPTIONS']
+                    mode = options_dict.pop('transaction_mode', None)
+                    try:
+                        with override_settings(SQLITE_PRAGMAS=pragmas):
+                            result = self.run(users, posts, options)
+                    finally:
+                        if mode:
+                            options_dict['transaction_mode'] = mode
+                self.stdout.write(
+                    f"{label:<18}{result['writes']:>8}{result['errors']:>8}{result['rate']:>10.1f}"
+                    f"{result['p50']:>9.2f}{result['p99']:>9.2f}"
+                )
+        finally:
+            connections.close_all()
+            Comment.objects.filter(content=BENCHMARK_COMMENT).delete()
+
+    def run(self, users, posts, options):
+        # Reconnect so the PRAGMAs of this run apply, switching journal mode
+        # before worker threads open their own connections
+        connections.close_all()
+        connection.ensure_connection()
+
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            mine, failed = [], 0
+            try:
+                for i in range(options['writes']):
+                    user_id, post_id = rng.choice(users), rng.choice(posts)
+                    begin = time.perf_counter()
+                    try:
+                        with transaction.atomic():
+                            if i % 2:
+                                Comment.objects.create(post_id=post_id, author_id=user_id, content=BENCHMARK_COMMENT)
+                            else:
+                                deleted, _ = Like.objects.filter(post_id=post_id, user_id=user_id).delete()
+                                if not deleted:
+                                    Like.objects.create(post_id=post_id, user_id=user_id)
+                    except (OperationalError, IntegrityError):
+                        # "database is locked", or two threads liking the same post at once
+                        failed += 1
+                        continue
+                    mine.append((time.perf_counter() - begin) * 1000)
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(mine)
+                errors.append(failed)
+
+        threads = [threading.Thread(target=worker, args=(options['seed'] + n,)) for n in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'writes': len(latencies),
+            'errors': sum(errors),
+            'rate': len(latencies) / elapsed,
+            'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99),
+        }
@@ -0,0 +1,237 @@
+import random
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import Profile
+from core.models import Friendship
+from notifications.models import COALESCED_MESSAGES, SAMPLE_SENDERS, Notification, NotificationActor, describe_actors
+from posts.models import Comment, Like, Post
+from user_settings.models import UserSettings
+
+
+PRIVACY_MIX = [('public', 0.7), ('friends', 0.25), ('private', 0.05)]
+FRIENDSHIP_STATUS_MIX = [('accepted', 0.9), ('pending', 0.08), ('declined', 0.02)]
+
+
+@contextmanager
+def manual_timestamps(*models):
+    """Let bulk_create keep the created_at values we generate"""
+    fields = [model._meta.get_field('created_at') for model in models]
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, saved):
+            field.auto_now_add = value
+
+
+def zipf_cum_weights(count, exponent):
+    """Cumulative weights where rank r is chosen proportionally to 1 / r**exponent"""
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def weighted(rng, mix):
+    values, weights = zip(*mix)
+    return rng.choices(values, weights)[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic social network for load testing: a power-law friend graph, "
+        "posts with a privacy mix, Zipf-distributed likes and comments, and notifications"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--friends', type=int, default=20,
+                            help="Average friendships per user (preferential attachment)")
+        parser.add_argument('--posts', type=float, default=5,
+                            help="Average posts per user")
+        parser.add_argument('--likes', type=float, default=8, help="Average likes per post")
+        parser.add_argument('--comments', type=float, default=2, help="Average comments per post")
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help="Zipf exponent for post popularity and user activity")
+        parser.add_argument('--days', type=int, default=30, help="Spread content over this many days")
+        parser.add_argument('--prefix', default='synthetic', help="Username prefix")
+        parser.add_argument('--password', default='synthetic-pass',
+                            help="Password of every generated user")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--skip-derived', action='store_true',
+                            help="Don't rebuild counters, timelines, friend suggestions and the search index afterwards")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.span = timedelta(days=options['days']).total_seconds()
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f"Users named {prefix}_* already exist; pick another --prefix")
+
+        started = time.perf_counter()
+        with manual_timestamps(Post, Comment, Like, Friendship):
+            users = self.create_users(prefix, options['users'], options['password'])
+            friends = self.create_friendships(users, options['friends'])
+            posts = self.create_posts(users, options['posts'])
+            likes = self.create_engagement(Like, users, friends, posts, options['likes'], options['zipf'])
+            comments = self.create_engagement(Comment, users, friends, posts, options['comments'], options['zipf'])
+        notifications = self.create_notifications(users, posts, likes, comments)
+
+        if not options['skip_derived']:
+            for command in (
+                'reconcile_post_counters', 'rebuild_timelines', 'rebuild_friend_suggestions', 'rebuild_search_index',
+            ):
+                call_command(command, stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(users)} users, {sum(map(len, friends.values())) // 2} friendships, "
+            f"{len(posts)} posts, {len(likes)} likes, {len(comments)} comments and "
+            f"{notifications} notifications in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def timestamp(self, after=None):
+        start = after or self.now - timedelta(seconds=self.span)
+        return start + (self.now - start) * self.rng.random()
+
+    def bulk_create(self, model, objects, **kwargs):
+        return model.objects.bulk_create(objects, batch_size=self.batch_size, **kwargs)
+
+    def create_users(self, prefix, count, password):
+        # Hashing is deliberately slow; every synthetic user shares one hash
+        password = make_password(password)
+        width = len(str(count))
+        self.bulk_create(User, [
+            User(username=f'{prefix}_{i:0{width}d}', email=f'{prefix}_{i}@example.com',
+                 first_name=prefix.title(), last_name=str(i), password=password)
+            for i in range(count)
+        ])
+        # bulk_create skips the signals that normally add these
+        users = list(User.objects.filter(username__startswith=f'{prefix}_').order_by('id'))
+        self.bulk_create(Profile, [Profile(user=user) for user in users])
+        self.bulk_create(UserSettings, [UserSettings(user=user) for user in users])
+        return users
+
+    def create_friendships(self, users, average):
+        """Barabási–Albert graph: newcomers befriend people who already have many friends"""
+        per_user = max(1, average // 2)
+        degree_pool = []
+        edges = set()
+        for new in range(1, len(users)):
+            chosen = set()
+            while len(chosen) < min(per_user, new):
+                chosen.add(self.rng.choice(degree_pool) if degree_pool else self.rng.randrange(new))
+            for other in chosen:
+                edges.add((new, other))
+                degree_pool.extend((new, other))
+
+        friendships, friends = [], defaultdict(set)
+        for a, b in edges:
+            if self.rng.random() < 0.5:
+                a, b = b, a
+            status = weighted(self.rng, FRIENDSHIP_STATUS_MIX)
+            friendships.append(Friendship(
+                from_user=users[a], to_user=users[b], status=status, created_at=self.timestamp(),
+            ))
+            if status == 'accepted':
+                friends[users[a].id].add(users[b].id)
+                friends[users[b].id].add(users[a].id)
+        self.bulk_create(Friendship, friendships)
+        return friends
+
+    def create_posts(self, users, average):
+        # Heavy-tailed authorship: a few users post a lot
+        weights = zipf_cum_weights(len(users), 1.0)
+        authors = self.rng.sample(users, len(users))
+        posts = [
+            Post(
+                author=author,
+                content=f"Synthetic post {i} by {author.username}",
+                privacy=weighted(self.rng, PRIVACY_MIX),
+                created_at=self.timestamp(),
+            )
+            for i, author in enumerate(self.rng.choices(authors, cum_weights=weights, k=int(len(users) * average)))
+        ]
+        return self.bulk_create(Post, posts)
+
+    def create_engagement(self, model, users, friends, posts, average, exponent):
+        """Likes or comments with Zipf-distributed popularity, only from people who can see the post"""
+        ranked_posts = self.rng.sample(posts, len(posts))
+        ranked_users = self.rng.sample(users, len(users))
+        post_weights = zipf_cum_weights(len(posts), exponent)
+        user_weights = zipf_cum_weights(len(users), exponent)
+        total = int(len(posts) * average)
+
+        seen, objects = set(), []
+        targets = self.rng.choices(ranked_posts, cum_weights=post_weights, k=total)
+        actors = self.rng.choices(ranked_users, cum_weights=user_weights, k=total)
+        for post, actor in zip(targets, actors):
+            if post.privacy == 'private':
+                continue
+            if post.privacy == 'friends' and actor.id not in friends[post.author_id]:
+                if not friends[post.author_id]:
+                    continue
+                actor_id = self.rng.choice(sorted(friends[post.author_id]))
+            else:
+                actor_id = actor.id
+            if model is Like:
+                if (post.id, actor_id) in seen:
+                    continue
+                seen.add((post.id, actor_id))
+                objects.append(Like(post=post, user_id=actor_id, created_at=self.timestamp(post.created_at)))
+            else:
+                objects.append(Comment(
+                    post=post, author_id=actor_id, content="Synthetic comment",
+                    created_at=self.timestamp(post.created_at),
+                ))
+        return self.bulk_create(model, objects)
+
+    def create_notifications(self, users, posts, likes, comments):
+        """One coalesced notification per (post, kind), as Notification.create_notification would leave"""
+        usernames = {user.id: user.username for user in users}
+        authors = {post.id: post.author_id for post in posts}
+        post_type = ContentType.objects.get_for_model(Post)
+
+        notifications, notified_actors = [], []
+        for kind, actions, actor_field in (('like', likes, 'user_id'), ('comment', comments, 'author_id')):
+            by_post = defaultdict(list)
+            for action in sorted(actions, key=lambda a: a.created_at, reverse=True):
+                actor_id = getattr(action, actor_field)
+                if actor_id != authors[action.post_id]:
+                    by_post[action.post_id].append((actor_id, action.created_at))
+            for post_id, actors in by_post.items():
+                actor_ids = list(dict.fromkeys(actor_id for actor_id, _ in actors))
+                names = [usernames[actor_id] for actor_id in actor_ids[:SAMPLE_SENDERS]]
+                notifications.append(Notification(
+                    recipient_id=authors[post_id],
+                    sender_id=actor_ids[0],
+                    notification_type=kind,
+                    message=COALESCED_MESSAGES[kind].format(actors=describe_actors(names, len(actor_ids))),
+                    content_type=post_type,
+                    object_id=post_id,
+                    actor_count=len(actor_ids),
+                    sample_senders=names,
+                    created_at=actors[0][1],
+                    is_read=self.rng.random() < 0.6,
+                    is_sent_via_email=True,
+                ))
+                notified_actors.append(actor_ids)
+        self.bulk_create(Notification, notifications)
+        self.bulk_create(NotificationActor, [
+            NotificationActor(notification=notification, user_id=actor_id)
+            for notification, actor_ids in zip(notifications, notified_actors)
+            for actor_id in actor_ids
+        ])
+        return len(notifications)
@@ -0,0 +1,19 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from core.suggestions import refresh_suggestions, SUGGESTION_LIMIT
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored \"people you may know\" suggestions for every user"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=SUGGESTION_LIMIT,
+                            help="Suggestions kept per user")
+
+    def handle(self, *args, **options):
+        users = 0
+        for user_id in User.objects.order_by('id').values_list('id', flat=True).iterator():
+            refresh_suggestions(user_id, limit=options['limit'])
+            users += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt suggestions for {users} users"))
@@ -0,0 +1,45 @@
+from collections import Counter
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import Profile
+from core.models import MediaBlob
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recount MediaBlob references from posts and profiles, then delete unreferenced files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report drift without changing anything")
+
+    def handle(self, *args, **options):
+        expected = Counter()
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True).only('image', 'image_variants')
+        profiles = Profile.objects.only('avatar', 'avatar_variants')
+        for row in chain(posts.iterator(), profiles.iterator()):
+            expected.update(set(row.media_names()))
+
+        stored = dict(MediaBlob.objects.values_list('name', 'ref_count'))
+        drifted = {
+            name: expected.get(name, 0)
+            for name in expected.keys() | stored.keys()
+            if expected.get(name, 0) != stored.get(name)
+        }
+        if options['dry_run']:
+            self.stdout.write(f"{len(drifted)} blobs drifted")
+            return
+
+        with transaction.atomic():
+            MediaBlob.objects.bulk_create(
+                [MediaBlob(name=name) for name in drifted if name not in stored], ignore_conflicts=True,
+            )
+            for name, count in drifted.items():
+                MediaBlob.objects.filter(name=name).update(ref_count=count)
+        deleted = MediaBlob.collect()
+        self.stdout.write(self.style.SUCCESS(
+            f"Fixed {len(drifted)} blobs, deleted {len(deleted)} unreferenced files"
+        ))
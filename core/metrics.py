@@ -0,0 +1,229 @@
+"""
+In-process request and cache metrics.
+
+``InstrumentationMiddleware`` (core.middleware) records a ``Sample`` for a
+fraction of requests (``METRICS_SAMPLE_RATE``). Each route keeps its
+latest ``METRICS_WINDOW`` samples in a ring buffer for percentiles, plus
+running totals that feed Prometheus counters. ``cache_stats`` counts
+hits and misses of every core.cache namespace, and entries the cache
+backend evicted. Everything lives in the memory of the current process,
+so every worker reports its own numbers.
+"""
+import re
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+
+METRICS_WINDOW = getattr(settings, 'METRICS_WINDOW', 1000)
+
+# A statement repeated this many times within one request is reported as N+1
+DUPLICATE_THRESHOLD = getattr(settings, 'METRICS_DUPLICATE_THRESHOLD', 3)
+
+QUANTILES = {'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+
+_LITERALS_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_IN_LIST_RE = re.compile(r"\bIN \((?:\s*(?:%s|\?)\s*,?)+\)", re.IGNORECASE)
+
+
+def query_signature(sql):
+    """SQL with literals and IN-lists folded, so repeats of one query compare equal"""
+    sql = _LITERALS_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+@dataclass
+class Sample:
+    # Times are in milliseconds
+    duration: float
+    status: int
+    query_count: int = 0
+    query_time: float = 0.0
+    template_time: float = 0.0
+    # {signature: executions} for statements that crossed DUPLICATE_THRESHOLD
+    duplicates: dict = field(default_factory=dict)
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+class RouteStats:
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+        self.duration_sum = 0.0
+        self.query_sum = 0
+        self.query_time_sum = 0.0
+        self.template_time_sum = 0.0
+        self.duplicate_sum = 0
+        self.signatures = Counter()
+
+    def add(self, sample):
+        self.samples.append(sample)
+        self.count += 1
+        self.errors += sample.status >= 500
+        self.duration_sum += sample.duration
+        self.query_sum += sample.query_count
+        self.query_time_sum += sample.query_time
+        self.template_time_sum += sample.template_time
+        self.duplicate_sum += len(sample.duplicates)
+        self.signatures.update(sample.duplicates)
+
+
+class MetricsStore:
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, sample):
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = RouteStats(self.window)
+            stats.add(sample)
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+    def snapshot(self):
+        """Per-route summary, slowest p95 first"""
+        with self._lock:
+            routes = [(route, stats, list(stats.samples)) for route, stats in self._routes.items()]
+
+        summary = []
+        for route, stats, samples in routes:
+            durations = sorted(s.duration for s in samples)
+            queries = sorted(s.query_count for s in samples)
+            window = len(samples) or 1
+            summary.append({
+                'route': route,
+                'count': stats.count,
+                'errors': stats.errors,
+                'duration_sum': stats.duration_sum,
+                'query_sum': stats.query_sum,
+                'query_time_sum': stats.query_time_sum,
+                'template_time_sum': stats.template_time_sum,
+                'duplicate_sum': stats.duplicate_sum,
+                'latency': {label: percentile(durations, q) for label, q in QUANTILES.items()},
+                'queries': {label: percentile(queries, q) for label, q in QUANTILES.items()},
+                'avg_query_time': sum(s.query_time for s in samples) / window,
+                'avg_template_time': sum(s.template_time for s in samples) / window,
+                'n_plus_one': stats.signatures.most_common(5),
+            })
+        summary.sort(key=lambda row: row['latency']['p95'], reverse=True)
+        return summary
+
+
+store = MetricsStore()
+
+
+class CacheStats:
+    def __init__(self):
+        self._hits = Counter()
+        self._misses = Counter()
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def record(self, namespace, hits=0, misses=0):
+        with self._lock:
+            self._hits[namespace] += hits
+            self._misses[namespace] += misses
+
+    def record_evictions(self, count):
+        with self._lock:
+            self._evictions += count
+
+    def reset(self):
+        with self._lock:
+            self._hits.clear()
+            self._misses.clear()
+            self._evictions = 0
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+    def snapshot(self):
+        """Per-namespace hit and miss totals, busiest first"""
+        with self._lock:
+            rows = [
+                {'namespace': name, 'hits': self._hits[name], 'misses': self._misses[name]}
+                for name in self._hits.keys() | self._misses.keys()
+            ]
+        for row in rows:
+            lookups = row['hits'] + row['misses']
+            row['hit_rate'] = row['hits'] / lookups if lookups else 0.0
+        rows.sort(key=lambda row: row['hits'] + row['misses'], reverse=True)
+        return rows
+
+
+cache_stats = CacheStats()
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(snapshot=None, sample_rate=None):
+    """Render a snapshot in the Prometheus text exposition format"""
+    rows = store.snapshot() if snapshot is None else snapshot
+    lines = []
+
+    def metric(name, kind, help_text, values):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(values)
+
+    def summary(name, help_text, key, total_key, scale=1):
+        values = []
+        for row in rows:
+            route = _escape_label(row['route'])
+            for label, q in QUANTILES.items():
+                values.append(f'{name}{{route="{route}",quantile="{q}"}} {row[key][label] * scale:.6g}')
+            values.append(f'{name}_sum{{route="{route}"}} {row[total_key] * scale:.6g}')
+            values.append(f'{name}_count{{route="{route}"}} {row["count"]}')
+        metric(name, 'summary', help_text, values)
+
+    def counter(name, help_text, key, scale=1):
+        metric(name, 'counter', help_text, [
+            f'{name}{{route="{_escape_label(row["route"])}"}} {row[key] * scale:.6g}' for row in rows
+        ])
+
+    if sample_rate is not None:
+        metric('socialhub_metrics_sample_rate', 'gauge', 'Fraction of requests that are recorded',
+               [f'socialhub_metrics_sample_rate {sample_rate}'])
+    summary('socialhub_request_duration_seconds', 'Request latency of sampled requests',
+            'latency', 'duration_sum', scale=0.001)
+    summary('socialhub_request_queries', 'SQL queries per sampled request', 'queries', 'query_sum')
+    counter('socialhub_request_errors_total', 'Sampled requests that returned 5xx', 'errors')
+    counter('socialhub_db_query_seconds_total', 'Time spent in SQL by sampled requests',
+            'query_time_sum', scale=0.001)
+    counter('socialhub_template_render_seconds_total', 'Time spent rendering templates by sampled requests',
+            'template_time_sum', scale=0.001)
+    counter('socialhub_duplicate_queries_total', 'Repeated (N+1) statements seen in sampled requests',
+            'duplicate_sum')
+
+    from core.backends.cache import cache_evictions
+
+    cache_rows = cache_stats.snapshot()
+    for name, key, help_text in (
+        ('socialhub_cache_hits_total', 'hits', 'Cache lookups answered from the cache'),
+        ('socialhub_cache_misses_total', 'misses', 'Cache lookups that fell through to the database'),
+    ):
+        metric(name, 'counter', help_text, [
+            f'{name}{{namespace="{_escape_label(row["namespace"])}"}} {row[key]}' for row in cache_rows
+        ])
+    evictions = cache_evictions()
+    metric('socialhub_cache_evictions_total', 'counter', 'Entries the cache backend evicted to make room',
+           [] if evictions is None else [f'socialhub_cache_evictions_total {evictions}'])
+    return '\n'.join(lines) + '\n'
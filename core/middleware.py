@@ -0,0 +1,143 @@
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import DUPLICATE_THRESHOLD, Sample, query_signature, store
+from .routers import RoutingState, _request_state
+
+
+REPLICA_PIN_COOKIE = 'primary_pin'
+REPLICA_PIN_SALT = 'core.routers.pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+# Collector of the sampled request being handled, if any
+_active = ContextVar('request_metrics', default=None)
+
+
+class RequestCollector:
+    """Accumulates SQL and template timings for one sampled request"""
+
+    def __init__(self):
+        self.query_count = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        self.signatures = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += (time.perf_counter() - start) * 1000
+            self.query_count += 1
+            self.signatures[query_signature(sql)] += 1
+
+    def sample(self, duration, status):
+        duplicates = {sql: n for sql, n in self.signatures.items() if n >= DUPLICATE_THRESHOLD}
+        return Sample(
+            duration=duration,
+            status=status,
+            query_count=self.query_count,
+            query_time=self.query_time,
+            template_time=self.template_time,
+            duplicates=duplicates,
+        )
+
+
+def instrument_templates():
+    """
+    Time top-level renders of the Django template backend for sampled
+    requests. Called once from CoreConfig.ready().
+    """
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'instrumented', False):
+        return
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        collector = _active.get()
+        if collector is None or collector.rendering:
+            return original(self, context, request)
+        collector.rendering = True
+        start = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            collector.rendering = False
+            collector.template_time += (time.perf_counter() - start) * 1000
+
+    render.instrumented = True
+    Template.render = render
+
+
+def route_name(request):
+    # Unresolved paths share one bucket so random 404s can't grow the store
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unmatched'
+
+
+class InstrumentationMiddleware:
+    """
+    Record latency, SQL and template timings for a sample of requests
+    (``METRICS_SAMPLE_RATE``). Unsampled requests only pay for one
+    random() call. Should be listed first so it times the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= getattr(settings, 'METRICS_SAMPLE_RATE', 0.1):
+            return self.get_response(request)
+
+        collector = RequestCollector()
+        token = _active.set(collector)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(collector))
+                response = self.get_response(request)
+        finally:
+            _active.reset(token)
+        duration = (time.perf_counter() - start) * 1000
+        store.record(route_name(request), collector.sample(duration, response.status_code))
+        return response
+
+
+class ReplicaPinMiddleware:
+    """
+    Set up ReplicaRouter's per-request state. A request that writes sets a
+    short-lived signed cookie, and the user's requests keep reading from
+    the primary until it expires (``REPLICA_PIN_SECONDS``).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+        pinned = request.method not in SAFE_METHODS or request.get_signed_cookie(
+            REPLICA_PIN_COOKIE, default=None, salt=REPLICA_PIN_SALT, max_age=pin_seconds,
+        ) is not None
+        state = RoutingState(pinned=pinned)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote:
+            response.set_signed_cookie(
+                REPLICA_PIN_COOKIE, '1', salt=REPLICA_PIN_SALT, max_age=pin_seconds,
+                httponly=True, samesite='Lax',
+            )
+        return response
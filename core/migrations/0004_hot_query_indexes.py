@@ -0,0 +1,21 @@
+# Generated by Django 4.2.9 on 2026-10-18 04:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_friend_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(condition=models.Q(('status', 'accepted')), fields=['from_user', 'to_user'], name='friendship_accepted_from_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(condition=models.Q(('status', 'accepted')), fields=['to_user', 'from_user'], name='friendship_accepted_to_idx'),
+        ),
+    ]
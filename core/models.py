@@ -1,9 +1,49 @@
-from django.db import models
+import time
+
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 
 
-class Friendship(models.Model):
+class TracksSavedFields:
+    """
+    Model mixin remembering the stored value of each of ``tracked_fields``
+    as last loaded or saved, so save() and signals can tell what changed.
+    """
+    tracked_fields = ()
+
+    @property
+    def saved_values(self):
+        """``{field: stored value}``; a field is missing while its value is unknown (e.g. not saved yet)"""
+        return self.__dict__.setdefault('_saved_values', {})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        stored = dict(zip(field_names, values))
+        instance.saved_values.update(
+            (field, stored[field]) for field in cls.tracked_fields if field in stored
+        )
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._remember_saved_values(fields)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._remember_saved_values(kwargs.get('update_fields'))
+
+    def _remember_saved_values(self, fields=None):
+        deferred = self.get_deferred_fields()
+        for name in self.tracked_fields:
+            if (fields is None or name in fields) and name not in deferred:
+                field = self._meta.get_field(name)
+                self.saved_values[name] = field.get_prep_value(field.value_from_object(self))
+
+
+class Friendship(TracksSavedFields, models.Model):
     """
     Model for managing friendships between users
     """
@@ -32,9 +72,25 @@ class Friendship(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # So signals can tell what a save changed
+    tracked_fields = ('status',)
+    
     class Meta:
         # Ensure no duplicate friend requests
         unique_together = ('from_user', 'to_user')
+        indexes = [
+            # Friend-set lookups only ever read accepted rows, in either direction
+            models.Index(
+                fields=['from_user', 'to_user'],
+                condition=models.Q(status='accepted'),
+                name='friendship_accepted_from_idx',
+            ),
+            models.Index(
+                fields=['to_user', 'from_user'],
+                condition=models.Q(status='accepted'),
+                name='friendship_accepted_to_idx',
+            ),
+        ]
         
     def __str__(self):
         return f"{self.from_user.username} -> {self.to_user.username} ({self.status})"
@@ -42,27 +98,14 @@ class Friendship(models.Model):
     @classmethod
     def are_friends(cls, user1, user2):
         """Check if two users are friends"""
-        return cls.objects.filter(
-            models.Q(from_user=user1, to_user=user2, status='accepted') |
-            models.Q(from_user=user2, to_user=user1, status='accepted')
-        ).exists()
+        from .graph import friend_ids
+        return user2.pk in friend_ids(user1)
     
     @classmethod
     def get_friends(cls, user):
         """Get all friends of a user"""
-        friend_relationships = cls.objects.filter(
-            models.Q(from_user=user, status='accepted') |
-            models.Q(to_user=user, status='accepted')
-        )
-        
-        friends = []
-        for relationship in friend_relationships:
-            if relationship.from_user == user:
-                friends.append(relationship.to_user)
-            else:
-                friends.append(relationship.from_user)
-        
-        return friends
+        from .graph import friend_ids
+        return list(User.objects.filter(id__in=friend_ids(user)))
     
     @classmethod
     def send_friend_request(cls, from_user, to_user):
@@ -109,3 +152,83 @@ class Friendship(models.Model):
         """Block the user"""
         self.status = 'blocked'
         self.save()
+
+
+class FriendSuggestion(models.Model):
+    """
+    Precomputed "people you may know" entry: ``candidate`` shares
+    ``mutual_count`` friends with ``user``. Maintained by core.suggestions.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='friend_suggestions')
+    candidate = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    mutual_count = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('user', 'candidate')
+        indexes = [
+            models.Index(fields=['user', '-mutual_count'], name='suggestion_rank_idx'),
+        ]
+        
+    def __str__(self):
+        return f"{self.candidate_id} for {self.user_id} ({self.mutual_count} mutual)"
+
+
+class MediaBlob(models.Model):
+    """
+    Reference count of one stored media file (an upload or a variant).
+
+    Uploads are content-addressed (core.storage), so several posts and
+    profiles can point at the same file. The file is deleted only once
+    the last reference is released.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+    
+    @classmethod
+    def acquire(cls, names):
+        """Add one reference to each stored file in ``names``"""
+        names = {name for name in names if name}
+        if not names:
+            return
+        cls.objects.bulk_create([cls(name=name) for name in names], ignore_conflicts=True)
+        cls.objects.filter(name__in=names).update(ref_count=models.F('ref_count') + 1)
+    
+    @classmethod
+    def release(cls, names):
+        """Drop one reference from each file; unreferenced files go after commit"""
+        names = {name for name in names if name}
+        if not names:
+            return
+        cls.objects.filter(name__in=names, ref_count__gt=0).update(ref_count=models.F('ref_count') - 1)
+        transaction.on_commit(lambda: cls.collect(names))
+    
+    @classmethod
+    def collect(cls, names=None):
+        """
+        Delete unreferenced blobs (among ``names``, or all) and their files.
+        
+        Files written or reused within ``MEDIA_COLLECT_GRACE`` seconds are
+        kept: an upload of identical bytes reuses the stored file before its
+        row acquires a reference. They are left for a later collect (see
+        reconcile_media_blobs).
+        """
+        from .storage import media_storage
+        
+        cutoff = time.time() - getattr(settings, 'MEDIA_COLLECT_GRACE', 60 * 60)
+        with transaction.atomic():
+            dead = cls.objects.select_for_update().filter(ref_count=0)
+            if names is not None:
+                dead = dead.filter(name__in=names)
+            dead = [
+                name for name in dead.values_list('name', flat=True)
+                if not media_storage.modified_since(name, cutoff)
+            ]
+            cls.objects.filter(name__in=dead, ref_count=0).delete()
+            for name in dead:
+                media_storage.delete(name)
+        return dead
@@ -0,0 +1,88 @@
+"""
+Keyset (cursor) pagination for querysets ordered newest first.
+
+Pages are addressed by the ``(created_at, id)`` of the last row served
+instead of an OFFSET, so fetching page 1000 costs the same index range
+scan as fetching page 1.
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+DEFAULT_PAGE_SIZE = 20
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor string cannot be decoded"""
+
+
+class KeysetPage:
+    """A single page of results plus the cursor of the following page"""
+
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(created_at, pk):
+    """Encode a ``(created_at, id)`` position as an opaque URL-safe string"""
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by ``encode_cursor``"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        created_at = parse_datetime(timestamp)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if created_at is None:
+        raise InvalidCursor(cursor)
+    return created_at, pk
+
+
+def keyset_filter(queryset, cursor=None, field='created_at', tiebreak='id'):
+    """
+    Order ``queryset`` by ``(-field, -tiebreak)`` and, if given a cursor,
+    restrict it to rows strictly after that position.
+
+    The ``field <= value`` bound is kept separate from the tie-breaker so
+    the database can seek straight into a ``(field, tiebreak)`` index
+    instead of scanning from the top.
+    """
+    queryset = queryset.order_by(f'-{field}', f'-{tiebreak}')
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(**{f'{field}__lte': value}).filter(
+            Q(**{f'{field}__lt': value}) | Q(**{f'{tiebreak}__lt': pk})
+        )
+    return queryset
+
+
+def paginate_keyset(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE, field='created_at'):
+    """Return a ``KeysetPage`` of at most ``page_size`` rows from ``queryset``"""
+    queryset = keyset_filter(queryset, cursor, field=field)
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return KeysetPage(items, next_cursor)
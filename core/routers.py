@@ -0,0 +1,68 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+Replica aliases come from ``settings.DATABASE_REPLICAS`` (see DB_REPLICAS
+in settings). Only reads made while serving a safe (GET/HEAD) request go
+to a replica: feeds, profiles, inboxes and the like. Everything else
+reads from the primary:
+
+* unsafe requests (POST...), which usually read-modify-write;
+* any request after the user wrote within ``REPLICA_PIN_SECONDS``,
+  tracked by a signed cookie set by ReplicaPinMiddleware, so their own
+  post or like never seems to vanish while a replica catches up;
+* reads after a write in the same request, or inside a transaction;
+* code outside a request: background tasks, commands, websockets.
+"""
+import random
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Apps whose rows must never be read stale (a lagging session would log people out)
+PRIMARY_ONLY_APPS = {'sessions'}
+
+
+@dataclass
+class RoutingState:
+    pinned: bool = False
+    wrote: bool = False
+
+
+# Routing state of the request being served; None outside requests
+_request_state = ContextVar('replica_routing', default=None)
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        replicas = replica_aliases()
+        if (
+            state is None
+            or state.pinned
+            or not replicas
+            or model._meta.app_label in PRIMARY_ONLY_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            state.wrote = state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,44 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Friendship
+from .graph import invalidate_friends
+from .suggestions import friendship_changed, request_changed
+from .tasks import run_in_background
+
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def invalidate_friend_cache(sender, instance, **kwargs):
+    """
+    Drop both users' cached friend sets when a friendship changes, and
+    again on commit so a read racing the transaction cannot re-cache
+    the old state.
+    """
+    users = (instance.from_user_id, instance.to_user_id)
+    invalidate_friends(*users)
+    transaction.on_commit(lambda: invalidate_friends(*users))
+
+
+@receiver(post_save, sender=Friendship)
+def refresh_suggestions_on_save(sender, instance, created, **kwargs):
+    """
+    Update mutual-friend suggestions in the background once the change is
+    committed. Only accepting or ending a friendship moves mutual counts;
+    a new request or block just hides the two users from each other.
+    """
+    users = (instance.from_user_id, instance.to_user_id)
+    was_accepted = instance.saved_values.get('status') == 'accepted'
+    if (instance.status == 'accepted') != was_accepted:
+        run_in_background(friendship_changed, *users)
+    elif created:
+        run_in_background(request_changed, *users)
+
+
+@receiver(post_delete, sender=Friendship)
+def refresh_suggestions_on_delete(sender, instance, **kwargs):
+    users = (instance.from_user_id, instance.to_user_id)
+    if instance.status == 'accepted':
+        run_in_background(friendship_changed, *users)
+    else:
+        run_in_background(request_changed, *users)
@@ -0,0 +1,125 @@
+"""
+Content-addressed storage for user uploads.
+
+``ContentAddressedStorage`` hashes an upload while copying it to disk
+and files it as ``<dir>/<digest[:2]>/<digest><ext>``, where ``<dir>`` is
+the field's ``upload_to``. Identical bytes therefore land on the same
+path and are stored once. A file at such a path can never change, so it
+can be served with far-future immutable cache headers (see
+core.views.serve_media).
+
+Several rows may share one file, so files are never deleted directly.
+They are reference-counted through ``core.models.MediaBlob`` instead.
+Reusing a stored file refreshes its modification time, which keeps
+``MediaBlob.collect`` away from it until the new row holds a reference.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+
+# Names containing a SHA-256 digest: stored blobs and the variants derived from them
+CONTENT_ADDRESSED_RE = re.compile(r'[0-9a-f]{64}[^/]*$')
+
+EXTENSION_ALIASES = {'.jpeg': '.jpg'}
+
+
+def is_content_addressed(name):
+    return bool(CONTENT_ADDRESSED_RE.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed in _save
+        return name
+
+    def _save(self, name, content):
+        directory, basename = posixpath.split(name)
+        ext = os.path.splitext(basename)[1].lower()
+        ext = EXTENSION_ALIASES.get(ext, ext)
+        os.makedirs(self.path(directory), exist_ok=True)
+
+        digest = getattr(content, 'content_digest', None)
+        if digest and hasattr(content, 'temporary_file_path'):
+            # Already hashed while streaming (core.uploads): just move it into place
+            name = self._blob_name(directory, digest, ext)
+            self._store(content.temporary_file_path(), name)
+            return name
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path(directory), prefix='.upload-')
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            name = self._blob_name(directory, digest.hexdigest(), ext)
+            self._store(tmp_path, name)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return name
+
+    def save_exact(self, name, data):
+        """
+        Write ``data`` (bytes) to exactly ``name``, for derived files whose
+        name already carries the source digest. The write is atomic, and a
+        file that is already there (e.g. from another worker) is kept.
+        """
+        if self.touch(name):
+            return name
+        directory = posixpath.dirname(name)
+        os.makedirs(self.path(directory), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path(directory), prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(data)
+            self._store(tmp_path, name)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return name
+
+    def touch(self, name):
+        """Mark a stored file as just reused; False if there is no such file"""
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def modified_since(self, name, timestamp):
+        try:
+            return os.path.getmtime(self.path(name)) >= timestamp
+        except FileNotFoundError:
+            return False
+
+    def _blob_name(self, directory, digest, ext):
+        return posixpath.join(directory, digest[:2], digest + ext)
+
+    def _store(self, source_path, name):
+        full_path = self.path(name)
+        if self.touch(name):
+            # Identical bytes are already stored: keep the existing copy
+            return
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        try:
+            file_move_safe(source_path, full_path)
+        except FileExistsError:
+            self.touch(name)
+            return
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    """Storage for uploaded media (a callable keeps it out of migrations)"""
+    return media_storage
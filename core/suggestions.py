@@ -0,0 +1,139 @@
+"""
+"People you may know" recommendations.
+
+Mutual-friend counts are computed by intersecting cached friend sets from
+core.graph (one batched query for any misses) and stored in
+``FriendSuggestion`` so serving suggestions is a single indexed read.
+When a friendship changes only the users whose counts can move are
+recomputed: the two users themselves, and each of their friends' count
+for the other user, trimmed to the top ``SUGGESTION_LIMIT`` like a full
+rebuild.
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .graph import friend_ids, friend_ids_many
+from .models import Friendship, FriendSuggestion
+
+
+SUGGESTION_LIMIT = getattr(settings, 'FRIEND_SUGGESTION_LIMIT', 50)
+BATCH_SIZE = 500
+
+
+def _related_ids(user_id):
+    """Users with any friendship row (accepted, pending, declined, blocked) with ``user_id``"""
+    pairs = Friendship.objects.filter(
+        Q(from_user_id=user_id) | Q(to_user_id=user_id)
+    ).values_list('from_user_id', 'to_user_id')
+    return {to_id if from_id == user_id else from_id for from_id, to_id in pairs}
+
+
+def compute_suggestions(user_id, limit=SUGGESTION_LIMIT):
+    """Return ``[(candidate_id, mutual_count), ...]`` best first"""
+    friends = friend_ids(user_id)
+    if not friends:
+        return []
+
+    mutuals = Counter()
+    for friends_of_friend in friend_ids_many(friends).values():
+        mutuals.update(friends_of_friend)
+    for excluded in _related_ids(user_id) | {user_id}:
+        mutuals.pop(excluded, None)
+    return mutuals.most_common(limit)
+
+
+def refresh_suggestions(user_id, limit=SUGGESTION_LIMIT):
+    """Recompute and store the full suggestion list of one user"""
+    rows = [
+        FriendSuggestion(user_id=user_id, candidate_id=candidate_id, mutual_count=count)
+        for candidate_id, count in compute_suggestions(user_id, limit)
+    ]
+    with transaction.atomic():
+        FriendSuggestion.objects.filter(user_id=user_id).delete()
+        FriendSuggestion.objects.bulk_create(rows)
+
+
+def _top(counts, limit):
+    """The ``limit`` best ``{candidate_id: count}`` entries, ranked as get_suggestions does"""
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit])
+
+
+def refresh_candidate(user_ids, candidate_id, limit=SUGGESTION_LIMIT):
+    """
+    Recompute ``candidate_id``'s mutual count in each of ``user_ids``'
+    suggestions, keeping every list to its top ``limit`` entries.
+
+    A full list whose entry for the candidate dropped or went away can't
+    tell which unstored candidate now makes the cut, so that user's list
+    is recomputed instead.
+    """
+    user_ids = sorted(set(user_ids) - {candidate_id})
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start:start + BATCH_SIZE]
+        graph = friend_ids_many(batch + [candidate_id])
+        candidate_friends = graph[candidate_id]
+        related = {
+            from_id if to_id == candidate_id else to_id
+            for from_id, to_id in Friendship.objects.filter(
+                Q(from_user_id__in=batch, to_user_id=candidate_id)
+                | Q(from_user_id=candidate_id, to_user_id__in=batch)
+            ).values_list('from_user_id', 'to_user_id')
+        }
+        stored = defaultdict(dict)
+        for user_id, other_id, count in FriendSuggestion.objects.filter(
+            user_id__in=batch
+        ).values_list('user_id', 'candidate_id', 'mutual_count'):
+            stored[user_id][other_id] = count
+
+        rows, evicted, rebuild = [], Q(pk__in=[]), []
+        for user_id in batch:
+            count = 0 if user_id in related else len(graph[user_id] & candidate_friends)
+            current = stored[user_id]
+            previous = current.pop(candidate_id, 0)
+            if count < previous and len(current) + 1 >= limit:
+                rebuild.append(user_id)
+                continue
+            if count:
+                current[candidate_id] = count
+            kept = _top(current, limit)
+            if candidate_id in kept:
+                rows.append(FriendSuggestion(user_id=user_id, candidate_id=candidate_id, mutual_count=count))
+            dropped = [other_id for other_id in current if other_id not in kept and other_id != candidate_id]
+            if dropped:
+                evicted |= Q(user_id=user_id, candidate_id__in=dropped)
+        with transaction.atomic():
+            FriendSuggestion.objects.filter(
+                Q(user_id__in=batch, candidate_id=candidate_id) | evicted
+            ).delete()
+            FriendSuggestion.objects.bulk_create(rows)
+        for user_id in rebuild:
+            refresh_suggestions(user_id, limit)
+
+
+def friendship_changed(user_a, user_b):
+    """Incrementally update suggestions after the a-b friendship was made or ended"""
+    refresh_suggestions(user_a)
+    refresh_suggestions(user_b)
+    refresh_candidate(friend_ids(user_a), user_b)
+    refresh_candidate(friend_ids(user_b), user_a)
+
+
+def request_changed(user_a, user_b):
+    """
+    Update suggestions after a non-friend row between a and b appeared or
+    went away: only whether each is suggested to the other can change.
+    """
+    refresh_candidate([user_a], user_b)
+    refresh_candidate([user_b], user_a)
+
+
+def get_suggestions(user, limit=20):
+    """Stored suggestions for ``user``, best first"""
+    return (
+        FriendSuggestion.objects.filter(user=user)
+        .select_related('candidate')
+        .order_by('-mutual_count', 'candidate_id')[:limit]
+    )
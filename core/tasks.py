@@ -0,0 +1,53 @@
+"""
+Minimal background execution for work that must stay off the request path.
+
+Jobs are handed to a small thread pool once the current transaction
+commits, so they always see the rows that scheduled them. Anything that
+must survive a process restart also records its state in the database
+and has a management command to sweep up leftovers (e.g. process_avatars).
+Set ``BACKGROUND_TASKS_EAGER = True`` to run jobs inline, e.g. in tests.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'BACKGROUND_TASK_WORKERS', 2),
+                thread_name_prefix='socialhub-bg',
+            )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(func, '__name__', func))
+    finally:
+        # Worker threads keep their own DB connections; don't leak them
+        close_old_connections()
+
+
+def run_in_background(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` on a worker thread after commit"""
+    def submit():
+        if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+            func(*args, **kwargs)
+        else:
+            _get_executor().submit(_run, func, args, kwargs)
+
+    transaction.on_commit(submit)
@@ -1,3 +1,602 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import resolve, reverse
+from PIL import Image
+
+from accounts.models import Profile
+from user_settings.models import UserSettings
+from notifications.models import Notification
+from posts.comments import first_comment_page_html
+from posts.feed import home_feed
+from posts.models import Comment, Like, Post, TimelineEntry
+from . import graph
+from .backends.cache import FileBasedCache, LocMemCache
+from .cache import CacheNamespace
+from .explain import full_scans
+from .metrics import cache_stats, query_signature, store
+from .middleware import REPLICA_PIN_COOKIE, InstrumentationMiddleware, ReplicaPinMiddleware
+from .pagination import keyset_filter
+from .routers import ReplicaRouter, RoutingState, _request_state
+from .models import Friendship, FriendSuggestion, MediaBlob
+from .storage import media_storage
+from .views import serve_media
+from .suggestions import compute_suggestions, get_suggestions, refresh_candidate, refresh_suggestions
+
+
+class FriendGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob, self.carol, self.dave = [
+            User.objects.create_user(name, password='pass12345')
+            for name in ('alice', 'bob', 'carol', 'dave')
+        ]
+        Friendship.objects.create(from_user=self.alice, to_user=self.bob, status='accepted')
+        Friendship.objects.create(from_user=self.carol, to_user=self.alice, status='accepted')
+        self.pending = Friendship.objects.create(from_user=self.dave, to_user=self.alice)
+
+    def test_saved_values_follow_loads_and_saves(self):
+        self.assertEqual(self.pending.saved_values, {'status': 'pending'})
+        request = Friendship.objects.get(pk=self.pending.pk)
+        self.assertEqual(request.saved_values, {'status': 'pending'})
+        request.status = 'accepted'
+        self.assertEqual(request.saved_values['status'], 'pending')
+        request.save(update_fields=['updated_at'])
+        self.assertEqual(request.saved_values['status'], 'pending')
+        request.refresh_from_db()
+        self.assertEqual(request.saved_values['status'], 'pending')
+        self.assertEqual(Friendship.objects.only('id').get(pk=request.pk).saved_values, {})
+
+    def test_friend_ids_in_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(graph.friend_ids(self.alice), {self.bob.id, self.carol.id})
+        with self.assertNumQueries(0):
+            self.assertTrue(Friendship.are_friends(self.alice, self.carol))
+            self.assertFalse(Friendship.are_friends(self.alice, self.dave))
+
+    def test_friend_ids_many_batches_misses(self):
+        with self.assertNumQueries(1):
+            friends = graph.friend_ids_many([self.alice, self.bob, self.dave])
+        self.assertEqual(friends[self.bob.id], {self.alice.id})
+        self.assertEqual(friends[self.dave.id], frozenset())
+
+    def test_friends_among(self):
+        others = [self.bob, self.carol, self.dave]
+        self.assertEqual(graph.friends_among(self.alice, others), {self.bob.id, self.carol.id})
+
+    def test_cache_invalidated_on_status_change(self):
+        self.assertNotIn(self.dave.id, graph.friend_ids(self.alice))
+        self.pending.accept()
+        self.assertIn(self.dave.id, graph.friend_ids(self.alice))
+        self.assertIn(self.alice.id, graph.friend_ids(self.dave))
+        self.pending.block()
+        self.assertNotIn(self.dave.id, graph.friend_ids(self.alice))
+
+    def test_get_friends_returns_users(self):
+        self.assertEqual(
+            sorted(u.username for u in Friendship.get_friends(self.alice)), ['bob', 'carol']
+        )
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class FriendSuggestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            name: User.objects.create_user(name, password='pass12345')
+            for name in ('me', 'f1', 'f2', 'fof', 'far', 'blocked')
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.befriend('me', 'f1')
+            self.befriend('me', 'f2')
+            self.befriend('f1', 'fof')
+            self.befriend('f2', 'fof')
+            self.befriend('f1', 'blocked')
+            self.befriend('fof', 'far')
+            Friendship.objects.create(
+                from_user=self.users['me'], to_user=self.users['blocked'], status='blocked'
+            )
+
+    def befriend(self, a, b):
+        return Friendship.objects.create(
+            from_user=self.users[a], to_user=self.users[b], status='accepted'
+        )
+
+    def suggested(self, name):
+        return {s.candidate.username: s.mutual_count for s in get_suggestions(self.users[name])}
+
+    def test_mutual_counts_exclude_friends_and_blocked(self):
+        self.assertEqual(self.suggested('me'), {'fof': 2})
+        self.assertEqual(
+            compute_suggestions(self.users['me'].id), [(self.users['fof'].id, 2)]
+        )
+
+    def test_incremental_refresh_matches_full_recompute(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.befriend('me', 'far')
+        # fof is now both a suggestion for me (3 mutuals) and vice versa
+        self.assertEqual(self.suggested('me'), {'fof': 3})
+        self.assertEqual(self.suggested('fof')['me'], 3)
+        for user in self.users.values():
+            stored = {(s.candidate_id, s.mutual_count) for s in FriendSuggestion.objects.filter(user=user)}
+            self.assertEqual(stored, set(compute_suggestions(user.id)), user.username)
+
+    def stored(self, name):
+        return [
+            (s.candidate_id, s.mutual_count)
+            for s in FriendSuggestion.objects.filter(user=self.users[name]).order_by('-mutual_count', 'candidate_id')
+        ]
+
+    def test_incremental_refresh_keeps_the_top_limit(self):
+        me = self.users['me'].id
+        refresh_suggestions(me, limit=1)
+        # far reaches 1 mutual with me: not enough to displace fof's 2
+        self.befriend('f1', 'far')
+        refresh_candidate([me], self.users['far'].id, limit=1)
+        self.assertEqual(self.stored('me'), compute_suggestions(me, 1))
+        # far overtakes fof, which drops to a single mutual
+        self.befriend('f2', 'far')
+        refresh_candidate([me], self.users['far'].id, limit=1)
+        Friendship.objects.get(from_user=self.users['f2'], to_user=self.users['fof']).delete()
+        refresh_candidate([me], self.users['fof'].id, limit=1)
+        self.assertEqual(self.stored('me'), [(self.users['far'].id, 2)])
+        self.assertEqual(self.stored('me'), compute_suggestions(me, 1))
+
+    def test_only_accepting_a_request_recomputes_suggestions(self):
+        with mock.patch('core.signals.friendship_changed') as changed:
+            with self.captureOnCommitCallbacks(execute=True):
+                request, _ = Friendship.send_friend_request(self.users['me'], self.users['fof'])
+            changed.assert_not_called()
+            # The pending request alone hides fof from me
+            self.assertEqual(self.suggested('me'), {})
+            with self.captureOnCommitCallbacks(execute=True):
+                request.accept()
+            changed.assert_called_once_with(self.users['me'].id, self.users['fof'].id)
+
+    def test_suggestions_endpoint(self):
+        self.client.force_login(self.users['me'])
+        response = self.client.get(reverse('core:friend_suggestions'))
+        self.assertEqual(response.json()['results'], [
+            {'id': self.users['fof'].id, 'username': 'fof', 'mutual_friends': 2},
+        ])
+
+
+class HotQueryPlanTests(TestCase):
+    """Fail if a hot query stops using its index and falls back to a table scan"""
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables make a seq scan look cheapest; ask for the indexed plan
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+        self.user = User.objects.create_user('planner', password='pass12345')
+
+    def assertNoFullScan(self, queryset):
+        self.assertEqual(full_scans(queryset), [], queryset.explain())
+
+    def test_harness_detects_full_scan(self):
+        self.assertIn('posts_comment', full_scans(Comment.objects.filter(content='x')))
+
+    def test_friend_edges(self):
+        self.assertNoFullScan(graph._accepted_edges([self.user.id]))
+
+    def test_notification_inbox(self):
+        self.assertNoFullScan(
+            Notification.objects.filter(recipient=self.user).order_by('-created_at', '-id')[:20]
+        )
+
+    def test_unread_notifications(self):
+        self.assertNoFullScan(Notification.objects.filter(recipient=self.user, is_read=False))
+
+    def test_notification_coalesce_lookup(self):
+        self.assertNoFullScan(Notification.objects.filter(
+            recipient=self.user, notification_type='like', content_type_id=1, object_id=1, is_read=False,
+        ))
+
+    def test_comment_thread(self):
+        self.assertNoFullScan(Comment.objects.filter(post_id=1).order_by('created_at'))
+
+    def test_viewer_like_lookup(self):
+        self.assertNoFullScan(Like.objects.filter(post_id=1, user=self.user))
+
+    def test_home_feed_page(self):
+        self.assertNoFullScan(keyset_filter(home_feed(self.user))[:21])
+
+    def test_timeline_page(self):
+        self.assertNoFullScan(
+            keyset_filter(TimelineEntry.objects.filter(owner=self.user), tiebreak='post_id')[:21]
+        )
+
+
+class MediaStorageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root, BACKGROUND_TASKS_EAGER=True, MEDIA_COLLECT_GRACE=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user('uploader', password='pass12345')
+        buffer = BytesIO()
+        Image.new('RGB', (400, 300), 'purple').save(buffer, 'PNG')
+        self.image_bytes = buffer.getvalue()
+
+    def create_post(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(
+                author=self.user, content='meme', image=SimpleUploadedFile('meme.png', self.image_bytes)
+            )
+        post.refresh_from_db()
+        return post
+
+    def test_identical_content_is_stored_once(self):
+        first = media_storage.save('post_images/a.png', ContentFile(b'same bytes'))
+        second = media_storage.save('post_images/b.PNG', ContentFile(b'same bytes'))
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^post_images/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(media_storage.listdir(first.rsplit('/', 1)[0])[1], [first.rsplit('/', 1)[1]])
+
+    def test_shared_files_are_deleted_with_the_last_reference(self):
+        first, second = self.create_post(), self.create_post()
+        self.assertEqual(first.media_names(), second.media_names())
+        names = first.media_names()
+        self.assertEqual(
+            set(MediaBlob.objects.filter(name__in=names).values_list('ref_count', flat=True)), {2}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(all(media_storage.exists(name) for name in names))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(any(media_storage.exists(name) for name in names))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    @override_settings(MEDIA_COLLECT_GRACE=60)
+    def test_reupload_of_unreferenced_file_survives_collect(self):
+        name = media_storage.save('post_images/a.png', ContentFile(b'orphan bytes'))
+        MediaBlob.objects.create(name=name, ref_count=0)
+        stale = time.time() - 120
+        os.utime(media_storage.path(name), (stale, stale))
+
+        # Same bytes uploaded again while the last reference's collect is pending
+        self.assertEqual(media_storage.save('post_images/b.png', ContentFile(b'orphan bytes')), name)
+        self.assertEqual(MediaBlob.collect([name]), [])
+        MediaBlob.acquire([name])
+        self.assertTrue(media_storage.exists(name))
+
+        MediaBlob.objects.filter(name=name).update(ref_count=0)
+        os.utime(media_storage.path(name), (stale, stale))
+        self.assertEqual(MediaBlob.collect([name]), [name])
+        self.assertFalse(media_storage.exists(name))
+
+    def test_variants_written_concurrently_keep_their_exact_name(self):
+        name = 'post_images/variants/' + 'a' * 64 + '_320.jpg'
+        self.assertEqual(media_storage.save_exact(name, b'first'), name)
+        # A second worker that missed the existence check still lands on the same name
+        with mock.patch.object(media_storage, 'touch', return_value=False):
+            self.assertEqual(media_storage.save_exact(name, b'second'), name)
+        self.assertEqual(os.listdir(media_storage.path('post_images/variants')), [os.path.basename(name)])
+        with media_storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'first')
+
+    def test_reconcile_restores_counts(self):
+        post = self.create_post()
+        MediaBlob.objects.update(ref_count=7)
+        MediaBlob.objects.create(name='post_images/stray.jpg')
+        out = StringIO()
+        call_command('reconcile_media_blobs', stdout=out)
+        self.assertEqual(
+            set(MediaBlob.objects.values_list('name', 'ref_count')), {(n, 1) for n in post.media_names()}
+        )
+        self.assertIn('deleted 1', out.getvalue())
+
+    def test_content_addressed_media_is_immutable(self):
+        post = self.create_post()
+        response = serve_media(RequestFactory().get(post.image.url), post.image.name)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        store.reset()
+        self.addCleanup(store.reset)
+        self.user = User.objects.create_user('measured', password='pass12345')
+        self.client.force_login(self.user)
+
+    def route(self, name):
+        return next(row for row in store.snapshot() if row['route'] == name)
+
+    def test_records_latency_queries_and_templates(self):
+        for _ in range(3):
+            self.client.get(reverse('posts:post_list'))
+        row = self.route('posts:post_list')
+        self.assertEqual(row['count'], 3)
+        self.assertGreater(row['queries']['p50'], 0)
+        self.assertGreater(row['latency']['p99'], 0)
+        self.assertGreater(row['avg_template_time'], 0)
+
+    def test_repeated_statements_are_flagged(self):
+        def n_plus_one_view(request):
+            for user in User.objects.all():
+                list(Friendship.objects.filter(from_user=user))
+            return HttpResponse()
+
+        for i in range(4):
+            User.objects.create_user(f'f{i}', password='pass12345')
+        request = RequestFactory().get('/')
+        request.resolver_match = resolve(reverse('posts:post_list'))
+        InstrumentationMiddleware(n_plus_one_view)(request)
+        (signature, executions), = self.route('posts:post_list')['n_plus_one']
+        self.assertEqual(executions, 5)
+        self.assertIn('"from_user_id" = %s', signature)
+
+    def test_sampling_rate_zero_records_nothing(self):
+        with override_settings(METRICS_SAMPLE_RATE=0):
+            self.client.get(reverse('posts:post_list'))
+        self.assertEqual(store.snapshot(), [])
+
+    def test_query_signature_folds_literals(self):
+        self.assertEqual(
+            query_signature("SELECT * FROM t WHERE id = 12 AND name = 'x' AND k IN (%s, %s, %s)"),
+            "SELECT * FROM t WHERE id = ? AND name = ? AND k IN (...)",
+        )
+
+    def test_endpoints_are_staff_only(self):
+        self.client.get(reverse('posts:post_list'))
+        self.assertEqual(self.client.get(reverse('metrics_prometheus')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertContains(self.client.get(reverse('metrics')), 'posts:post_list')
+        body = self.client.get(reverse('metrics_prometheus')).content.decode()
+        self.assertIn('socialhub_request_duration_seconds{route="posts:post_list",quantile="0.95"}', body)
+        self.assertIn('socialhub_request_queries_count{route="posts:post_list"} 1', body)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_prometheus_token(self):
+        self.client.logout()
+        response = self.client.get(reverse('metrics_prometheus'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+
+
+class LoadTestingCommandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def generate(self, **options):
+        out = StringIO()
+        call_command('generate_social_graph', users=60, friends=6, posts=3, stdout=out, **options)
+        return out.getvalue()
+
+    def test_generated_graph_is_consistent(self):
+        self.assertIn('Generated 60 users', self.generate())
+        users = User.objects.filter(username__startswith='synthetic_')
+        self.assertEqual(users.count(), 60)
+        self.assertEqual(Profile.objects.filter(user__in=users).count(), 60)
+        # Power law: the best-connected user has far more friends than the median
+        degrees = sorted(len(graph.friend_ids(user)) for user in users)
+        self.assertGreater(degrees[-1], 2 * degrees[len(degrees) // 2])
+        # Engagement only comes from people allowed to see the post
+        self.assertFalse(Like.objects.filter(post__privacy='private').exclude(user=F('post__author')).exists())
+        post = Post.objects.filter(like_count__gt=0).first()
+        self.assertEqual(post.like_count, post.likes.count())
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_benchmark_reports_and_detects_regressions(self):
+        self.generate(skip_derived=True)
+        output = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        self.addCleanup(os.unlink, output.name)
+        out = StringIO()
+        call_command('benchmark', requests=3, warmup=1, users=3, output=output.name, stdout=out)
+        self.assertIn('post_detail', out.getvalue())
+        with open(output.name) as f:
+            results = json.load(f)
+        self.assertEqual(set(results), {'feed', 'timeline', 'post_detail', 'like', 'comment', 'profile', 'notifications'})
+
+        impossible = {name: dict(r, p50_ms=0, p99_ms=0) for name, r in results.items()}
+        with open(output.name, 'w') as f:
+            json.dump(impossible, f)
+        with self.assertRaisesMessage(CommandError, 'Performance regressions'):
+            call_command('benchmark', requests=3, warmup=0, users=3, scenario=['feed'],
+                         baseline=output.name, stdout=StringIO())
+
+    def test_benchmark_leaves_the_data_as_it_found_it(self):
+        self.generate(skip_derived=True)
+        call_command('reconcile_post_counters', stdout=StringIO())
+        likes = set(Like.objects.values_list('user_id', 'post_id'))
+        counters = dict(Post.objects.values_list('id', 'like_count'))
+        comments = Comment.objects.count()
+        call_command('benchmark', requests=7, warmup=1, users=3, scenario=['like', 'comment'], stdout=StringIO())
+        self.assertEqual(set(Like.objects.values_list('user_id', 'post_id')), likes)
+        self.assertEqual(dict(Post.objects.values_list('id', 'like_count')), counters)
+        self.assertEqual(Comment.objects.count(), comments)
+
+
+@skipUnless(connection.vendor == 'sqlite', "SQLite tuning")
+class SQLiteTuningTests(TestCase):
+    def test_pragmas_applied_to_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    # SimpleTestCase: no wrapping transaction, which would pin every read
+    router = ReplicaRouter()
+
+    def route(self, method='get', cookies=None, write=False):
+        """Serve a request whose view reads, optionally writes, then reads again"""
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Post))
+            if write:
+                self.router.db_for_write(Like)
+            seen.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        return ReplicaPinMiddleware(view)(request), seen
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_safe_request_reads_from_replica(self):
+        response, seen = self.route()
+        self.assertEqual(seen, ['replica1', 'replica1'])
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_sessions_always_use_primary(self):
+        token = _request_state.set(RoutingState())
+        try:
+            self.assertEqual(self.router.db_for_read(Session), 'default')
+            self.router.db_for_write(Session)
+            self.assertFalse(_request_state.get().wrote)
+        finally:
+            _request_state.reset(token)
+
+    def test_writes_pin_the_user_to_primary(self):
+        response, seen = self.route(write=True)
+        self.assertEqual(seen, ['replica1', 'default'])
+        pin = response.cookies[REPLICA_PIN_COOKIE]
+        self.assertEqual(pin['max-age'], 10)
+
+        _, seen = self.route(cookies={REPLICA_PIN_COOKIE: pin.value})
+        self.assertEqual(seen, ['default', 'default'])
+        _, seen = self.route(cookies={REPLICA_PIN_COOKIE: '1'})
+        self.assertEqual(seen, ['replica1', 'replica1'])
+
+    def test_unsafe_requests_read_from_primary(self):
+        _, seen = self.route(method='post')
+        self.assertEqual(seen, ['default', 'default'])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        _, seen = self.route()
+        self.assertEqual(seen, ['default', 'default'])
+
+
+class CacheLayerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_stats.reset()
+        self.addCleanup(cache_stats.reset)
+        self.alice = User.objects.create_user('alice', password='pass12345')
+        self.bob = User.objects.create_user('bob', password='pass12345')
+
+    def test_keys_are_versioned_and_lookups_counted(self):
+        profiles = CacheNamespace('test.profiles')
+        self.assertEqual(profiles.key(7), 'test.profiles:v1:7')
+        self.assertIsNone(profiles.get(7))
+        profiles.set(7, 'cached')
+        self.assertEqual(profiles.get(7), 'cached')
+        self.assertEqual(profiles.get_many([7, 8]), {7: 'cached'})
+        self.assertIsNone(CacheNamespace('test.profiles', version=2).get(7))
+
+        row, = [row for row in cache_stats.snapshot() if row['namespace'] == 'test.profiles']
+        self.assertEqual((row['hits'], row['misses']), (2, 3))
+
+    def test_locmem_evicts_least_recently_used(self):
+        backend = LocMemCache('eviction-test', {'OPTIONS': {'MAX_ENTRIES': 3, 'CULL_FREQUENCY': 3}})
+        self.addCleanup(backend.clear)
+        for key in 'abc':
+            backend.set(key, key)
+        backend.get('a')
+        backend.set('d', 'd')
+        self.assertEqual((backend.get('a'), backend.get('b')), ('a', None))
+        self.assertEqual(cache_stats.evictions, 1)
+
+    def test_file_backend_counts_evictions(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        backend = FileBasedCache(location, {'OPTIONS': {'MAX_ENTRIES': 2, 'CULL_FREQUENCY': 2}})
+        for key in 'abc':
+            backend.set(key, key)
+        self.assertEqual(cache_stats.evictions, 1)
+
+    def test_profile_and_settings_are_invalidated_on_save(self):
+        self.assertEqual(Profile.for_user(self.alice.pk).bio, '')
+        with self.assertNumQueries(0):
+            profile = Profile.for_user(self.alice.pk)
+            self.assertEqual(profile.user.username, 'alice')
+        profile.bio = 'Hello'
+        profile.save()
+        self.assertEqual(Profile.for_user(self.alice.pk).bio, 'Hello')
+
+        self.assertFalse(UserSettings.for_user(self.alice.pk).show_email)
+        settings_row = UserSettings.objects.get(user=self.alice)
+        settings_row.show_email = True
+        settings_row.save()
+        self.assertTrue(UserSettings.for_user(self.alice.pk).show_email)
+
+    def test_cached_post_follows_privacy_changes(self):
+        post = Post.objects.create(author=self.alice, content='Friends only', privacy='friends')
+        self.assertFalse(Post.cached(post.id).is_visible_to(self.bob))
+        Friendship.objects.create(from_user=self.alice, to_user=self.bob, status='accepted')
+        self.assertTrue(Post.cached(post.id).is_visible_to(self.bob))
+
+        post.privacy = 'private'
+        post.save()
+        self.assertFalse(Post.cached(post.id).is_visible_to(self.bob))
+        self.assertTrue(Post.cached(post.id).is_visible_to(self.alice))
+        post.delete()
+        self.assertIsNone(Post.cached(post.id))
+
+    def test_cache_fills_read_from_the_primary(self):
+        post = Post.objects.create(author=self.alice, content='Fresh', privacy='friends')
+        Friendship.objects.create(from_user=self.alice, to_user=self.bob, status='accepted')
+        cache.clear()
+        # Any routed read would go to a replica that isn't configured here
+        with mock.patch.object(ReplicaRouter, 'db_for_read', return_value='replica1'):
+            self.assertEqual(Post.cached(post.id).content, 'Fresh')
+            self.assertEqual(graph.friend_ids(self.bob), {self.alice.pk})
+            self.assertEqual(Profile.for_user(self.alice.pk).user, self.alice)
+            self.assertIsNotNone(UserSettings.for_user(self.alice.pk))
+            first_comment_page_html(post.id)
+
+    def test_missing_rows_are_not_cached(self):
+        self.assertIsNone(Post.cached(10 ** 6))
+        with self.assertNumQueries(1):
+            self.assertIsNone(Post.cached(10 ** 6))
+
+    def test_cache_metrics_are_exported(self):
+        self.alice.is_staff = True
+        self.alice.save()
+        self.client.force_login(self.alice)
+        Profile.for_user(self.bob.pk)
+        Profile.for_user(self.bob.pk)
+        body = self.client.get(reverse('metrics_prometheus')).content.decode()
+        self.assertIn('socialhub_cache_hits_total{namespace="profile"} 1', body)
+        self.assertIn('socialhub_cache_misses_total{namespace="profile"} 1', body)
+        self.assertIn('socialhub_cache_evictions_total 0', body)
+        self.assertContains(self.client.get(reverse('metrics')), '<code>profile</code>')
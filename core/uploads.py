@@ -0,0 +1,112 @@
+"""
+Streaming upload handling for user images.
+
+``ImageUploadHandler`` replaces Django's default handlers for views that
+accept photos. Chunks go straight to a temporary file on disk, never to
+memory, and are SHA-256 hashed on the way so ContentAddressedStorage can
+move the file into place instead of copying it. While chunks arrive it:
+
+* stops reading a file as soon as it exceeds ``IMAGE_UPLOAD_MAX_SIZE``;
+* parses the image header from the first chunks and rejects pictures
+  whose dimensions exceed ``IMAGE_MAX_PIXELS`` (decompression bombs).
+
+A rejected file is skipped rather than aborting the request. The reason
+is recorded in ``request.upload_errors`` for ``validate_uploads`` to
+attach to the form.
+
+Handlers must be installed before the request body is read, which
+CsrfViewMiddleware does. Views therefore use the csrf_exempt/csrf_protect
+split from the Django docs:
+
+    @csrf_exempt
+    def view(request):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return _view(request)
+
+    @csrf_protect
+    def _view(request): ...
+"""
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+from .images import IMAGE_MAX_PIXELS
+
+
+IMAGE_UPLOAD_MAX_SIZE = getattr(settings, 'IMAGE_UPLOAD_MAX_SIZE', 20 * 1024 * 1024)
+
+# Give up looking for the dimensions after this much data (large EXIF blocks come first)
+HEADER_MAX_SIZE = 512 * 1024
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    chunk_size = 64 * 1024
+
+    def __init__(self, request=None, max_size=None, max_pixels=None):
+        super().__init__(request)
+        self.max_size = max_size or IMAGE_UPLOAD_MAX_SIZE
+        self.max_pixels = max_pixels or IMAGE_MAX_PIXELS
+        if request is not None and not hasattr(request, 'upload_errors'):
+            request.upload_errors = {}
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None,
+                 content_type_extra=None):
+        self.field_name = field_name
+        self.received = 0
+        self.header = bytearray()
+        self.digest = hashlib.sha256()
+        if content_length and content_length > self.max_size:
+            self.reject_too_large()
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.reject_too_large()
+        if self.header is not None:
+            self.header += raw_data
+            self.check_dimensions()
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.content_digest = self.digest.hexdigest()
+        return file
+
+    def check_dimensions(self):
+        try:
+            with Image.open(BytesIO(self.header)) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            self.reject("This image has too many pixels.")
+        except Exception:
+            # Header not complete yet; the form's ImageField validates whatever remains
+            if len(self.header) >= HEADER_MAX_SIZE:
+                self.header = None
+            return
+        self.header = None
+        if width * height > self.max_pixels:
+            self.reject(f"Images may have at most {self.max_pixels // 1_000_000} megapixels "
+                        f"(this one is {width}x{height}).")
+
+    def reject_too_large(self):
+        self.reject(f"Images may be at most {filesizeformat(self.max_size)}.")
+
+    def reject(self, message):
+        if self.request is not None:
+            self.request.upload_errors[self.field_name] = message
+        raise SkipFile(message)
+
+
+def validate_uploads(form, request):
+    """``form.is_valid()`` that also fails on files rejected while streaming"""
+    valid = form.is_valid()
+    errors = getattr(request, 'upload_errors', {})
+    for field, message in errors.items():
+        form.add_error(field if field in form.fields else None, message)
+    return valid and not errors
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('suggestions/', views.friend_suggestions, name='friend_suggestions'),
+]
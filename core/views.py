@@ -1,3 +1,70 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
 
-# Create your views here.
+from .backends.cache import cache_evictions
+from .metrics import cache_stats, prometheus_text, store
+from .storage import is_content_addressed
+from .suggestions import get_suggestions
+
+
+@login_required
+def friend_suggestions(request):
+    """People the current user may know, ranked by mutual friends"""
+    suggestions = get_suggestions(request.user)
+    return JsonResponse({
+        'results': [
+            {
+                'id': suggestion.candidate_id,
+                'username': suggestion.candidate.username,
+                'mutual_friends': suggestion.mutual_count,
+            }
+            for suggestion in suggestions
+        ]
+    })
+
+
+def serve_media(request, path):
+    """
+    Serve an uploaded file. Content-addressed names never change content,
+    so browsers and CDNs may keep them for a year without revalidating.
+    In production the web server should send the same headers for them.
+    """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_content_addressed(path):
+        patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
+
+
+@staff_member_required
+def metrics_dashboard(request):
+    """Per-route latency, SQL and N+1 report, and cache hit rates, for this process"""
+    return render(request, 'core/metrics.html', {
+        'routes': store.snapshot(),
+        'cache_namespaces': cache_stats.snapshot(),
+        'cache_evictions': cache_evictions(),
+        'sample_rate': getattr(settings, 'METRICS_SAMPLE_RATE', 0.1),
+    })
+
+
+def metrics_prometheus(request):
+    """
+    The same numbers in Prometheus text format. Staff sessions may read
+    it; scrapers send ``Authorization: Bearer <METRICS_TOKEN>``.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    allowed = request.user.is_active and request.user.is_staff
+    if token and constant_time_compare(authorization, f'Bearer {token}'):
+        allowed = True
+    if not allowed:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(
+        prometheus_text(sample_rate=getattr(settings, 'METRICS_SAMPLE_RATE', 0.1)),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
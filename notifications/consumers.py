@@ -0,0 +1,75 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .push import user_group, post_group
+
+
+MAX_POST_SUBSCRIPTIONS = 100
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Per-browser socket: receives the user's new notifications, plus live
+    counters for the posts the page subscribed to with
+    ``{"subscribe": [post_id, ...]}``.
+    """
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        if self.user is None or not self.user.is_authenticated:
+            await self.close()
+            return
+        self.post_ids = set()
+        await self.channel_layer.group_add(user_group(self.user.id), self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if getattr(self, 'post_ids', None) is None:
+            return
+        await self.channel_layer.group_discard(user_group(self.user.id), self.channel_name)
+        for post_id in self.post_ids:
+            await self.channel_layer.group_discard(post_group(post_id), self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        try:
+            subscribe = {int(post_id) for post_id in content.get('subscribe', [])}
+            unsubscribe = {int(post_id) for post_id in content.get('unsubscribe', [])}
+        except (TypeError, ValueError, AttributeError):
+            return
+
+        for post_id in unsubscribe & self.post_ids:
+            self.post_ids.discard(post_id)
+            await self.channel_layer.group_discard(post_group(post_id), self.channel_name)
+
+        room = MAX_POST_SUBSCRIPTIONS - len(self.post_ids)
+        wanted = sorted(subscribe - self.post_ids)[:max(room, 0)]
+        for post_id in await self.visible_post_ids(wanted):
+            self.post_ids.add(post_id)
+            await self.channel_layer.group_add(post_group(post_id), self.channel_name)
+
+    @database_sync_to_async
+    def visible_post_ids(self, post_ids):
+        from posts.models import Post
+        if not post_ids:
+            return []
+        return list(
+            Post.objects.visible_to(self.user).filter(id__in=post_ids).values_list('id', flat=True)
+        )
+
+    async def notification_created(self, event):
+        await self.send_json({
+            'type': 'notification',
+            'id': event['id'],
+            'notification_type': event['notification_type'],
+            'message': event['message'],
+            'actor_count': event['actor_count'],
+            'unread_count': event['unread_count'],
+        })
+
+    async def post_counters(self, event):
+        await self.send_json({
+            'type': 'counters',
+            'post_id': event['post_id'],
+            'like_count': event['like_count'],
+            'comment_count': event['comment_count'],
+        })
@@ -0,0 +1,13 @@
+from django.utils.functional import SimpleLazyObject
+
+from .models import Notification
+
+
+def notifications(request):
+    """Expose the unread badge count, only computed if a template uses it"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {
+        'unread_notification_count': SimpleLazyObject(lambda: Notification.unread_count(user)),
+    }
@@ -0,0 +1,122 @@
+"""
+Notification email digests.
+
+Unsent notifications are read in a single streaming query ordered by
+recipient, so memory stays bounded by ``batch_size`` recipients no matter
+how many rows are pending. Each recipient gets one digest email per run,
+queued in the EmailLog outbox and sent over one pooled connection per
+batch. Their notifications are then flagged ``is_sent_via_email`` with one
+UPDATE per batch. Notifications of users who get no email are flagged as
+skipped in the same run, so re-enabling email doesn't send a backlog.
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Notification, EmailLog
+from .outbox import LEASE, send_batch
+
+
+DIGEST_MAX_ITEMS = getattr(settings, 'NOTIFICATION_DIGEST_MAX_ITEMS', 20)
+DIGEST_SUBJECT = 'Your SocialHub notifications'
+
+
+def _wants_email():
+    return (
+        (Q(recipient__settings__email_notifications=True) | Q(recipient__settings__isnull=True))
+        & Q(recipient__is_active=True)
+        & ~Q(recipient__email='')
+    )
+
+
+def skip_unwanted(cutoff):
+    """Flag unsent notifications of users who get no email, so they don't pile up; returns how many"""
+    return (
+        Notification.objects.filter(is_sent_via_email=False, created_at__lte=cutoff)
+        .exclude(_wants_email())
+        .update(is_sent_via_email=True)
+    )
+
+
+def pending_notifications(cutoff):
+    """Stream unsent notifications of users who want email, grouped by recipient"""
+    return (
+        Notification.objects.filter(is_sent_via_email=False, created_at__lte=cutoff)
+        .filter(_wants_email())
+        .order_by('recipient_id', 'id')
+        .values(
+            'recipient_id', 'recipient__email', 'recipient__username',
+            'recipient__first_name', 'message', 'created_at', 'is_read',
+        )
+        .iterator(chunk_size=2000)
+    )
+
+
+def _render_digest(rows):
+    unread = [row for row in rows if not row['is_read']]
+    if not unread:
+        return None
+    first = rows[0]
+    return render_to_string('notifications/emails/digest.html', {
+        'name': first['recipient__first_name'] or first['recipient__username'],
+        'notifications': unread[:DIGEST_MAX_ITEMS],
+        'total': len(unread),
+        'remaining': max(len(unread) - DIGEST_MAX_ITEMS, 0),
+        'site_name': 'SocialHub',
+    })
+
+
+def _flush(batch, cutoff):
+    """Queue and send one batch of digests, then flag their notifications"""
+    # Inserted already leased, as claim_batch would leave them, so a
+    # concurrent send_queued_emails worker can't send them a second time
+    lease_until = timezone.now() + timedelta(seconds=LEASE)
+    logs = []
+    for recipient_id, rows in batch:
+        html = _render_digest(rows)
+        if html is not None:
+            logs.append(EmailLog(
+                recipient_id=recipient_id,
+                email_type='notification',
+                subject=DIGEST_SUBJECT,
+                to_email=rows[0]['recipient__email'],
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                html_body=html,
+                status='sending',
+                attempts=1,
+                next_attempt_at=lease_until,
+            ))
+    # Durable before flagging: failed sends stay in the outbox for retries
+    logs = EmailLog.objects.bulk_create(logs)
+    sent, failed = send_batch(logs) if logs else (0, 0)
+    Notification.objects.filter(
+        recipient_id__in=[recipient_id for recipient_id, _ in batch],
+        is_sent_via_email=False,
+        created_at__lte=cutoff,
+    ).update(is_sent_via_email=True)
+    return sent, failed
+
+
+def send_digests(batch_size=500):
+    """Send one digest per recipient with unsent notifications. Returns stats."""
+    cutoff = timezone.now()
+    stats = {'recipients': 0, 'sent': 0, 'failed': 0, 'skipped': skip_unwanted(cutoff)}
+    batch = []
+    for recipient_id, rows in groupby(pending_notifications(cutoff), key=lambda row: row['recipient_id']):
+        batch.append((recipient_id, list(rows)))
+        if len(batch) >= batch_size:
+            sent, failed = _flush(batch, cutoff)
+            stats['recipients'] += len(batch)
+            stats['sent'] += sent
+            stats['failed'] += failed
+            batch = []
+    if batch:
+        sent, failed = _flush(batch, cutoff)
+        stats['recipients'] += len(batch)
+        stats['sent'] += sent
+        stats['failed'] += failed
+    return stats
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from notifications.digest import send_digests
+
+
+class Command(BaseCommand):
+    help = "Email each user one digest of their unsent notifications"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Recipients rendered and sent per SMTP connection")
+
+    def handle(self, *args, **options):
+        stats = send_digests(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {stats['recipients']} recipients: "
+            f"{stats['sent']} digests sent, {stats['failed']} queued for retry, "
+            f"{stats['skipped']} notifications skipped"
+        ))
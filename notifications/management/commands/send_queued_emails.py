@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued emails from the EmailLog outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Emails sent per SMTP connection")
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling instead of exiting once the queue is empty")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain_outbox(batch_size=options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,73 @@
+import asyncio
+import resource
+import statistics
+import time
+import tracemalloc
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from notifications.consumers import NotificationConsumer
+from notifications.push import user_group
+
+
+class Command(BaseCommand):
+    help = (
+        "Open many notification sockets in this process against the configured "
+        "channel layer and measure connect rate, broadcast latency and memory"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=1000, help="Concurrent sockets to open")
+        parser.add_argument('--broadcasts', type=int, default=20, help="Notifications pushed to every socket")
+        parser.add_argument('--batch', type=int, default=200, help="Sockets connected concurrently")
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options['sockets'], options['broadcasts'], options['batch']))
+
+    async def run(self, sockets, broadcasts, batch):
+        # An unsaved user keeps the test off the database: only sockets and the layer are measured
+        user = User(id=0, username='ws-loadtest')
+        application = NotificationConsumer.as_asgi()
+        layer = get_channel_layer()
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        communicators = []
+        started = time.perf_counter()
+        for start in range(0, sockets, batch):
+            group = []
+            for _ in range(min(batch, sockets - start)):
+                communicator = WebsocketCommunicator(application, '/ws/notifications/')
+                communicator.scope['user'] = user
+                group.append(communicator)
+            results = await asyncio.gather(*(c.connect(timeout=30) for c in group))
+            communicators.extend(c for c, (connected, _) in zip(group, results) if connected)
+        connect_seconds = time.perf_counter() - started
+        per_socket = (tracemalloc.get_traced_memory()[0] - baseline) / max(len(communicators), 1)
+
+        latencies = []
+        for i in range(broadcasts):
+            sent = time.perf_counter()
+            await layer.group_send(user_group(user.id), {
+                'type': 'notification.created', 'id': i, 'notification_type': 'like',
+                'message': 'load test', 'actor_count': 1, 'unread_count': i,
+            })
+            await asyncio.gather(*(c.receive_json_from(timeout=30) for c in communicators))
+            latencies.append((time.perf_counter() - sent) * 1000)
+
+        await asyncio.gather(*(c.disconnect() for c in communicators))
+        tracemalloc.stop()
+
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0
+        self.stdout.write(f"Channel layer:      {type(layer).__name__}")
+        self.stdout.write(f"Sockets connected:  {len(communicators)}/{sockets} "
+                          f"({len(communicators) / connect_seconds:.0f} connects/s)")
+        self.stdout.write(f"Memory per socket:  {per_socket / 1024:.1f} KiB "
+                          f"(peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB)")
+        if latencies:
+            self.stdout.write(f"Broadcast to all:   p50 {statistics.median(latencies):.1f} ms, p99 {p99:.1f} ms")
+            self.stdout.write(f"Messages delivered: {len(communicators) * broadcasts / (sum(latencies) / 1000):.0f}/s")
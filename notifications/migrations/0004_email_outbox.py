@@ -0,0 +1,57 @@
+# Generated by Django 4.2.9 on 2026-10-18 04:47
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def mark_existing_logs(apps, schema_editor):
+    # Rows written before the outbox existed were sent (or failed) inline;
+    # they have no body and must never be picked up by the worker
+    EmailLog = apps.get_model('notifications', 'EmailLog')
+    EmailLog.objects.filter(is_sent=True).update(status='sent')
+    EmailLog.objects.filter(is_sent=False).update(status='failed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_coalescing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emaillog',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='from_email',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='html_body',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='to_email',
+            field=models.EmailField(blank=True, max_length=254),
+        ),
+        migrations.RunPython(mark_existing_logs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='emaillog',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'sending'])), fields=['next_attempt_at', 'id'], name='emaillog_due_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-18 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_sent_via_email', False)), fields=['recipient', 'id'], name='notification_unemailed_idx'),
+        ),
+    ]
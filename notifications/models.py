@@ -1,9 +1,38 @@
-from django.db import models
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.utils import timezone
 
+from core.cache import CacheNamespace
+
+
+UNREAD_CACHE_TIMEOUT = getattr(settings, 'NOTIFICATION_UNREAD_CACHE_TIMEOUT', 60 * 5)
+COALESCE_WINDOW = getattr(settings, 'NOTIFICATION_COALESCE_WINDOW', 60 * 60)
+SAMPLE_SENDERS = 3
+
+# Notification types merged into one row per (recipient, object) while unread,
+# with the message rebuilt from the actor list
+COALESCED_MESSAGES = {
+    'like': '{actors} liked your post',
+    'comment': '{actors} commented on your post',
+}
+
+
+def describe_actors(names, actor_count):
+    """'alice', 'alice and bob' or 'alice and 41 others'"""
+    if actor_count == 1:
+        return names[0]
+    if actor_count == 2 and len(names) > 1:
+        return f"{names[0]} and {names[1]}"
+    return f"{names[0]} and {actor_count - 1} others"
+
+
+unread_cache = CacheNamespace('notifications.unread', timeout=UNREAD_CACHE_TIMEOUT)
+
 
 class Notification(models.Model):
     """
@@ -46,11 +75,37 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     is_sent_via_email = models.BooleanField(default=False)
     
+    # Coalesced notifications: how many people acted, and the latest few of them
+    actor_count = models.PositiveIntegerField(default=1)
+    sample_senders = models.JSONField(default=list, blank=True)
+    
     created_at = models.DateTimeField(default=timezone.now)
     read_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Inbox listing, newest first
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_inbox_idx'),
+            # Unread badge and "mark all as read" only touch unread rows
+            models.Index(
+                fields=['recipient', '-created_at'],
+                condition=models.Q(is_read=False),
+                name='notification_unread_idx',
+            ),
+            # Finding the open aggregate to merge a new like/comment into
+            models.Index(
+                fields=['recipient', 'notification_type', 'content_type', 'object_id'],
+                condition=models.Q(is_read=False),
+                name='notification_coalesce_idx',
+            ),
+            # Digest run: stream not-yet-emailed rows in recipient order
+            models.Index(
+                fields=['recipient', 'id'],
+                condition=models.Q(is_sent_via_email=False),
+                name='notification_unemailed_idx',
+            ),
+        ]
         
     def __str__(self):
         return f"Notification to {self.recipient.username}: {self.message}"
@@ -60,24 +115,158 @@ class Notification(models.Model):
         if not self.is_read:
             self.is_read = True
             self.read_at = timezone.now()
-            self.save(update_fields=['is_read', 'read_at'])
+            updated = Notification.objects.filter(pk=self.pk, is_read=False).update(
+                is_read=True, read_at=self.read_at
+            )
+            Notification.adjust_unread_count(self.recipient_id, -updated)
+    
+    @classmethod
+    def mark_all_as_read(cls, recipient, ids=None):
+        """
+        Mark all (or only ``ids``) of a user's unread notifications as read
+        with a single UPDATE. Returns the number of notifications changed.
+        """
+        unread = cls.objects.filter(recipient=recipient, is_read=False)
+        if ids is not None:
+            unread = unread.filter(id__in=ids)
+        updated = unread.update(is_read=True, read_at=timezone.now())
+        if ids is None:
+            # Recount lazily rather than assume 0 while new ones may be arriving
+            unread_cache.delete(recipient.pk)
+        else:
+            cls.adjust_unread_count(recipient.pk, -updated)
+        return updated
+    
+    @classmethod
+    def unread_count(cls, recipient):
+        """
+        Cached number of unread notifications. The counter is adjusted in
+        place on create/read, so COUNT(*) only runs after a cache miss.
+        """
+        count = unread_cache.get(recipient.pk)
+        if count is None:
+            count = cls.objects.filter(recipient=recipient, is_read=False).count()
+            unread_cache.add(recipient.pk, count)
+        return count
+    
+    @classmethod
+    def adjust_unread_count(cls, recipient_id, delta):
+        """Shift a cached unread counter; a missing counter is left to be recounted"""
+        if not delta:
+            return
+        try:
+            unread_cache.incr(recipient_id, delta)
+        except ValueError:
+            pass
     
     @classmethod
     def create_notification(cls, recipient, sender, notification_type, message, content_object=None):
-        """Helper method to create notifications"""
+        """
+        Helper method to create notifications.
+        
+        Likes and comments on the same object are coalesced: while an
+        unread notification for it younger than ``COALESCE_WINDOW`` exists,
+        the new actor is folded into it ("alice and 41 others liked your
+        post") instead of inserting another row.
+        """
+        if notification_type in COALESCED_MESSAGES and content_object is not None and sender is not None:
+            notification = cls._coalesce(recipient, sender, notification_type, content_object)
+            if notification is not None:
+                return notification
+            message = COALESCED_MESSAGES[notification_type].format(actors=sender.username)
+        
         notification = cls.objects.create(
             recipient=recipient,
             sender=sender,
             notification_type=notification_type,
             message=message,
-            content_object=content_object
+            content_object=content_object,
+            sample_senders=[sender.username] if sender else [],
         )
+        if notification_type in COALESCED_MESSAGES and sender is not None:
+            NotificationActor.objects.create(notification=notification, user=sender)
+        return notification
+    
+    @classmethod
+    def notify_many(cls, recipients, sender, notification_type, message, content_object=None):
+        """
+        Send one (uncoalesced) notification to each of ``recipients`` with a
+        single INSERT. Returns the created notifications.
+        """
+        from .push import push_notification
+
+        notifications = cls.objects.bulk_create([
+            cls(
+                recipient=recipient,
+                sender=sender,
+                notification_type=notification_type,
+                message=message,
+                content_object=content_object,
+                sample_senders=[sender.username] if sender else [],
+            )
+            for recipient in recipients
+        ])
+        # bulk_create sends no post_save, so do what notifications.signals would
+        for notification in notifications:
+            cls.adjust_unread_count(notification.recipient_id, 1)
+            push_notification(notification)
+        return notifications
+    
+    @classmethod
+    def _coalesce(cls, recipient, sender, notification_type, content_object):
+        """Merge ``sender`` into an open aggregate, or return None if there is none"""
+        content_type = ContentType.objects.get_for_model(content_object)
+        since = timezone.now() - timedelta(seconds=COALESCE_WINDOW)
+        with transaction.atomic():
+            notification = (
+                cls.objects.select_for_update()
+                .filter(
+                    recipient=recipient,
+                    notification_type=notification_type,
+                    content_type=content_type,
+                    object_id=content_object.pk,
+                    is_read=False,
+                    created_at__gte=since,
+                )
+                .order_by('-created_at')
+                .first()
+            )
+            if notification is None:
+                return None
+            
+            # Someone coming back (e.g. unlike then like again) was counted
+            # already; leave the aggregate alone so toggling pushes nothing.
+            # Rows from before NotificationActor only know their samples.
+            _, new_actor = NotificationActor.objects.get_or_create(notification=notification, user=sender)
+            if not new_actor or sender.username in notification.sample_senders:
+                return notification
+            
+            notification.actor_count += 1
+            notification.sample_senders = [sender.username] + notification.sample_senders[:SAMPLE_SENDERS - 1]
+            notification.sender = sender
+            notification.message = COALESCED_MESSAGES[notification_type].format(
+                actors=describe_actors(notification.sample_senders, notification.actor_count)
+            )
+            notification.save(update_fields=['actor_count', 'sample_senders', 'sender', 'message'])
         return notification
 
 
+class NotificationActor(models.Model):
+    """Everyone folded into a coalesced notification, so nobody is counted twice"""
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='actors')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    
+    class Meta:
+        unique_together = ('notification', 'user')
+
+
 class EmailLog(models.Model):
     """
-    Model to track sent emails
+    Model to track sent emails.
+    
+    Doubles as a durable outbox: request handlers insert ``pending`` rows
+    and the ``send_queued_emails`` worker delivers them (see
+    notifications.outbox).
     """
     EMAIL_TYPES = [
         ('welcome', 'Welcome Email'),
@@ -86,11 +275,27 @@ class EmailLog(models.Model):
         ('notification', 'Notification Email'),
     ]
     
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='email_logs')
     email_type = models.CharField(max_length=20, choices=EMAIL_TYPES)
     subject = models.CharField(max_length=255)
     
+    # Message to deliver
+    to_email = models.EmailField(blank=True)
+    from_email = models.CharField(max_length=255, blank=True)
+    html_body = models.TextField(blank=True)
+    
     # Email status
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # When a pending email may next be tried; for ``sending`` rows, when the worker's claim expires
+    next_attempt_at = models.DateTimeField(default=timezone.now)
     is_sent = models.BooleanField(default=False)
     sent_at = models.DateTimeField(null=True, blank=True)
     error_message = models.TextField(blank=True)
@@ -99,7 +304,14 @@ class EmailLog(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # The worker's "what is due" scan only looks at undelivered rows
+            models.Index(
+                fields=['next_attempt_at', 'id'],
+                condition=models.Q(status__in=['pending', 'sending']),
+                name='emaillog_due_idx',
+            ),
+        ]
         
     def __str__(self):
-        status = "Sent" if self.is_sent else "Failed"
-        return f"{self.email_type} to {self.recipient.username} - {status}"
+        return f"{self.email_type} to {self.recipient.username} - {self.get_status_display()}"
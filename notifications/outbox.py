@@ -0,0 +1,124 @@
+"""
+Durable outbound email queue built on ``EmailLog``.
+
+Request handlers call ``enqueue_email`` (one INSERT) and return. The
+``send_queued_emails`` worker claims due rows in batches, sends each batch
+over a single SMTP connection and reschedules failures with exponential
+backoff until ``EMAIL_OUTBOX_MAX_ATTEMPTS`` is reached.
+
+A claim is a lease: claimed rows move to ``sending`` with
+``next_attempt_at`` pushed ``EMAIL_OUTBOX_LEASE`` seconds ahead, so rows
+held by a crashed worker become due again on their own.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EmailLog
+
+
+MAX_ATTEMPTS = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 6)
+RETRY_BASE = getattr(settings, 'EMAIL_OUTBOX_RETRY_BASE', 60)
+RETRY_MAX = getattr(settings, 'EMAIL_OUTBOX_RETRY_MAX', 60 * 60 * 6)
+LEASE = getattr(settings, 'EMAIL_OUTBOX_LEASE', 60 * 5)
+
+
+def enqueue_email(recipient, email_type, subject, html_message, to_email=None):
+    """Queue an email for the worker and return its ``EmailLog`` row"""
+    return EmailLog.objects.create(
+        recipient=recipient,
+        email_type=email_type,
+        subject=subject,
+        to_email=to_email or recipient.email,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        html_body=html_message,
+    )
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next try after ``attempts`` failures"""
+    return min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+
+
+def claim_batch(batch_size):
+    """Lease up to ``batch_size`` due emails to this worker"""
+    now = timezone.now()
+    with transaction.atomic():
+        due = EmailLog.objects.filter(
+            status__in=['pending', 'sending'], next_attempt_at__lte=now
+        ).order_by('next_attempt_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('id', flat=True)[:batch_size])
+        EmailLog.objects.filter(id__in=ids).update(
+            status='sending',
+            attempts=F('attempts') + 1,
+            next_attempt_at=now + timedelta(seconds=LEASE),
+        )
+    return list(EmailLog.objects.filter(id__in=ids).order_by('id'))
+
+
+def _build_message(log, email_connection):
+    message = EmailMultiAlternatives(
+        subject=log.subject,
+        body='',
+        from_email=log.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=[log.to_email],
+        connection=email_connection,
+    )
+    message.attach_alternative(log.html_body, 'text/html')
+    return message
+
+
+def send_batch(logs, email_connection=None):
+    """
+    Deliver claimed ``logs`` over one connection and record the outcome.
+    Returns ``(sent, failed)`` counts.
+    """
+    email_connection = email_connection or get_connection()
+    sent, failed = [], []
+    try:
+        email_connection.open()
+    except Exception as e:
+        failed = [(log, e) for log in logs]
+    else:
+        try:
+            for log in logs:
+                try:
+                    _build_message(log, email_connection).send()
+                    sent.append(log)
+                except Exception as e:
+                    failed.append((log, e))
+        finally:
+            email_connection.close()
+
+    now = timezone.now()
+    if sent:
+        EmailLog.objects.filter(id__in=[log.id for log in sent]).update(
+            status='sent', is_sent=True, sent_at=now, error_message=''
+        )
+    for log, error in failed:
+        if log.attempts >= MAX_ATTEMPTS:
+            status, next_attempt_at = 'failed', now
+        else:
+            status, next_attempt_at = 'pending', now + timedelta(seconds=retry_delay(log.attempts))
+        EmailLog.objects.filter(id=log.id).update(
+            status=status, next_attempt_at=next_attempt_at, error_message=str(error)
+        )
+    return len(sent), len(failed)
+
+
+def drain_outbox(batch_size=100):
+    """Send everything currently due. Returns ``(sent, failed)`` totals."""
+    total_sent = total_failed = 0
+    while True:
+        logs = claim_batch(batch_size)
+        if not logs:
+            return total_sent, total_failed
+        sent, failed = send_batch(logs)
+        total_sent += sent
+        total_failed += failed
@@ -0,0 +1,54 @@
+"""
+Real-time delivery over the channel layer.
+
+Each connected browser joins a per-user group for its notifications and
+per-post groups for the like/comment counters of posts it is showing.
+Pushes are sent after the surrounding transaction commits, so clients
+never see a row that could still be rolled back.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+
+def user_group(user_id):
+    return f'user.{user_id}'
+
+
+def post_group(post_id):
+    return f'post.{post_id}'
+
+
+def _group_send(group, event):
+    layer = get_channel_layer()
+    if layer is not None:
+        async_to_sync(layer.group_send)(group, event)
+
+
+def push_notification(notification):
+    """Send a created or coalesced notification to the recipient's sockets"""
+    from .models import Notification
+
+    def send():
+        _group_send(user_group(notification.recipient_id), {
+            'type': 'notification.created',
+            'id': notification.id,
+            'notification_type': notification.notification_type,
+            'message': notification.message,
+            'actor_count': notification.actor_count,
+            'unread_count': Notification.unread_count(notification.recipient),
+        })
+
+    transaction.on_commit(send)
+
+
+def push_post_counters(post_id):
+    """Send a post's current like/comment counters to everyone viewing it"""
+    from posts.models import Post
+
+    def send():
+        counters = Post.objects.filter(id=post_id).values('like_count', 'comment_count').first()
+        if counters is not None:
+            _group_send(post_group(post_id), {'type': 'post.counters', 'post_id': post_id, **counters})
+
+    transaction.on_commit(send)
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Notification
+from .push import push_notification
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    """Bump the recipient's cached unread counter"""
+    if created and not instance.is_read:
+        Notification.adjust_unread_count(instance.recipient_id, 1)
+
+
+@receiver(post_save, sender=Notification)
+def push_saved_notification(sender, instance, created, update_fields=None, **kwargs):
+    """Push new and freshly coalesced notifications to the recipient's sockets"""
+    if created or (update_fields and 'actor_count' in update_fields):
+        push_notification(instance)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    """Drop an unread notification from the recipient's cached counter"""
+    if not instance.is_read:
+        Notification.adjust_unread_count(instance.recipient_id, -1)
@@ -1,3 +1,295 @@
+from io import StringIO
+from unittest import mock
+
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser, User
+from django.core import mail
+from django.core.management import call_command
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Like, Post
+from .consumers import NotificationConsumer
+from . import outbox
+from .digest import send_digests
+from .models import EmailLog, Notification
+
+
+class NotificationCenterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader', password='pass12345')
+        self.client.force_login(self.user)
+
+    def notify(self, count=1):
+        return [
+            Notification.create_notification(
+                recipient=self.user, sender=None, notification_type='welcome', message=f'n{i}'
+            )
+            for i in range(count)
+        ]
+
+    def test_unread_count_is_cached_and_kept_in_step(self):
+        self.notify(2)
+        self.assertEqual(Notification.unread_count(self.user), 2)
+        first, = self.notify()
+        with self.assertNumQueries(0):
+            self.assertEqual(Notification.unread_count(self.user), 3)
+        first.mark_as_read()
+        first.mark_as_read()
+        with self.assertNumQueries(0):
+            self.assertEqual(Notification.unread_count(self.user), 2)
+
+    def test_mark_selected_as_read_is_one_update(self):
+        notifications = self.notify(3)
+        Notification.unread_count(self.user)
+        with self.assertNumQueries(1):
+            updated = Notification.mark_all_as_read(self.user, ids=[n.id for n in notifications[:2]])
+        self.assertEqual(updated, 2)
+        self.assertEqual(Notification.unread_count(self.user), 1)
+
+    def test_mark_all_view(self):
+        self.notify(3)
+        response = self.client.post(reverse('notifications:mark_read'), {'all': '1'})
+        self.assertRedirects(response, reverse('notifications:inbox'))
+        self.assertEqual(Notification.unread_count(self.user), 0)
+        self.assertFalse(self.user.notifications.filter(is_read=False).exists())
+
+    def test_inbox_pages(self):
+        self.notify(25)
+        response = self.client.get(reverse('notifications:inbox'))
+        self.assertEqual(len(response.context['notifications']), 20)
+        response = self.client.get(reverse('notifications:inbox'), {'cursor': response.context['next_cursor']})
+        self.assertEqual(len(response.context['notifications']), 5)
+        self.assertIsNone(response.context['next_cursor'])
+
+
+class NotificationCoalescingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.post = Post.objects.create(author=self.author, content='viral')
+        self.fans = [User.objects.create_user(f'fan{i}', password='pass12345') for i in range(5)]
+
+    def like(self, user):
+        return Like.objects.create(post=self.post, user=user)
+
+    def test_burst_of_likes_becomes_one_notification(self):
+        for fan in self.fans:
+            self.like(fan)
+        notification = Notification.objects.get(recipient=self.author)
+        self.assertEqual(notification.actor_count, 5)
+        self.assertEqual(notification.sample_senders, ['fan4', 'fan3', 'fan2'])
+        self.assertEqual(notification.message, 'fan4 and 4 others liked your post')
+        self.assertEqual(Notification.unread_count(self.author), 1)
+
+    def test_returning_actor_is_not_counted_again(self):
+        for fan in self.fans[:4]:
+            self.like(fan)
+        notification = Notification.objects.get(recipient=self.author)
+        self.assertEqual(notification.message, 'fan3 and 3 others liked your post')
+
+        # fan0 dropped out of the sample; toggling their like must not inflate the count
+        for _ in range(3):
+            Like.unset(self.post, self.fans[0])
+            Like.set(self.post, self.fans[0])
+        notification.refresh_from_db()
+        self.assertEqual(notification.actor_count, 4)
+        self.assertEqual(notification.message, 'fan3 and 3 others liked your post')
+
+        self.like(self.fans[4])
+        notification.refresh_from_db()
+        self.assertEqual(notification.message, 'fan4 and 4 others liked your post')
+
+    def test_two_actors_are_named(self):
+        self.like(self.fans[0])
+        self.like(self.fans[1])
+        self.assertEqual(
+            Notification.objects.get(recipient=self.author).message, 'fan1 and fan0 liked your post'
+        )
+
+    def test_read_notification_starts_a_new_aggregate(self):
+        self.like(self.fans[0])
+        Notification.mark_all_as_read(self.author)
+        self.like(self.fans[1])
+        self.assertEqual(Notification.objects.filter(recipient=self.author).count(), 2)
+
+    def test_likes_and_comments_are_separate(self):
+        self.like(self.fans[0])
+        Comment.objects.create(post=self.post, author=self.fans[0], content='wow')
+        self.assertEqual(
+            sorted(Notification.objects.values_list('notification_type', flat=True)), ['comment', 'like']
+        )
+
+    def test_own_likes_do_not_notify(self):
+        self.like(self.author)
+        self.assertFalse(Notification.objects.exists())
+
+
+class NotificationSocketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.fan = User.objects.create_user('fan', password='pass12345')
+        self.post = Post.objects.create(author=self.author, content='live')
+        self.hidden = Post.objects.create(author=self.fan, content='secret', privacy='private')
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    def like_post(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(post=self.post, user=self.fan)
+
+    def like_hidden_post(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(post=self.hidden, user=self.author)
+
+    async def test_anonymous_socket_is_rejected(self):
+        communicator, connected = await self.connect(AnonymousUser())
+        self.assertFalse(connected)
+
+    async def test_pushes_notification_and_counters(self):
+        communicator, connected = await self.connect(self.author)
+        self.assertTrue(connected)
+        await communicator.send_json_to({'subscribe': [self.post.id, self.hidden.id]})
+        # Let the subscription (a database round trip) finish before liking
+        await communicator.receive_nothing(timeout=0.2)
+
+        await database_sync_to_async(self.like_post)()
+        messages = [await communicator.receive_json_from(), await communicator.receive_json_from()]
+        by_type = {message['type']: message for message in messages}
+        self.assertEqual(by_type['counters'], {
+            'type': 'counters', 'post_id': self.post.id, 'like_count': 1, 'comment_count': 0,
+        })
+        self.assertEqual(by_type['notification']['message'], 'fan liked your post')
+        self.assertEqual(by_type['notification']['unread_count'], 1)
+
+        # Subscribing to a post the user cannot see is silently ignored
+        await database_sync_to_async(self.like_hidden_post)()
+        self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+        await communicator.disconnect()
+
+
+class FailingBackend:
+    """Email connection whose sends always fail"""
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise ConnectionError('SMTP unavailable')
+
+
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('mailme', email='mailme@example.com', password='pass12345')
+
+    def test_drain_sends_queued_email_once(self):
+        log = outbox.enqueue_email(self.user, 'welcome', 'Hello', '<p>Hi</p>')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(outbox.drain_outbox(), (1, 0))
+        self.assertEqual(outbox.drain_outbox(), (0, 0))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['mailme@example.com'])
+        log.refresh_from_db()
+        self.assertEqual((log.status, log.is_sent, log.attempts), ('sent', True, 1))
+
+    def test_failures_back_off_then_give_up(self):
+        log = outbox.enqueue_email(self.user, 'welcome', 'Hello', '<p>Hi</p>')
+        with mock.patch.object(outbox, 'MAX_ATTEMPTS', 2):
+            outbox.send_batch(outbox.claim_batch(10), FailingBackend())
+            log.refresh_from_db()
+            self.assertEqual((log.status, log.attempts), ('pending', 1))
+            self.assertGreater(log.next_attempt_at, timezone.now())
+            self.assertEqual(outbox.claim_batch(10), [])
+
+            EmailLog.objects.filter(id=log.id).update(next_attempt_at=timezone.now())
+            outbox.send_batch(outbox.claim_batch(10), FailingBackend())
+        log.refresh_from_db()
+        self.assertEqual((log.status, log.attempts), ('failed', 2))
+        self.assertIn('SMTP unavailable', log.error_message)
+
+    def test_expired_claim_is_retried(self):
+        outbox.enqueue_email(self.user, 'welcome', 'Hello', '<p>Hi</p>')
+        self.assertEqual(len(outbox.claim_batch(10)), 1)
+        self.assertEqual(outbox.claim_batch(10), [])
+        EmailLog.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(len(outbox.claim_batch(10)), 1)
+
+    def test_retry_delay_is_exponential_and_capped(self):
+        self.assertEqual([outbox.retry_delay(n) for n in (1, 2, 3)], [60, 120, 240])
+        self.assertEqual(outbox.retry_delay(50), outbox.RETRY_MAX)
+
+
+class NotificationDigestTests(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(f'user{i}', email=f'user{i}@example.com', password='pass12345')
+            for i in range(3)
+        ]
+        opted_out = self.users[2].settings
+        opted_out.email_notifications = False
+        opted_out.save()
+        for user in self.users:
+            for i in range(3):
+                Notification.create_notification(
+                    recipient=user, sender=None, notification_type='welcome', message=f'event {i}'
+                )
+
+    def test_one_digest_per_recipient(self):
+        out = StringIO()
+        call_command('send_notification_digests', '--batch-size', '1', stdout=out)
+        self.assertIn('2 digests sent', out.getvalue())
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['user0@example.com', 'user1@example.com'])
+        self.assertIn('event 2', mail.outbox[0].alternatives[0][0])
+
+        self.assertIn('3 notifications skipped', out.getvalue())
+        # The opted-out user's notifications are flagged as skipped, not left to pile up
+        self.assertFalse(Notification.objects.filter(is_sent_via_email=False).exists())
+        self.assertEqual(EmailLog.objects.filter(email_type='notification', status='sent').count(), 2)
+
+        mail.outbox.clear()
+        send_digests()
+        self.assertEqual(mail.outbox, [])
+
+    def test_reenabling_email_does_not_send_skipped_notifications(self):
+        send_digests()
+        mail.outbox.clear()
+        opted_in = self.users[2].settings
+        opted_in.email_notifications = True
+        opted_in.save()
+        Notification.create_notification(recipient=self.users[2], sender=None, notification_type='welcome', message='fresh')
+        self.assertEqual(send_digests()['sent'], 1)
+        body = mail.outbox[0].alternatives[0][0]
+        self.assertIn('fresh', body)
+        self.assertNotIn('event 0', body)
+
+    def test_digests_being_sent_are_not_claimed_by_the_outbox_worker(self):
+        claimed = []
+
+        def send_after_worker_runs(logs):
+            # A send_queued_emails worker waking up between the INSERT and the send
+            claimed.extend(outbox.claim_batch(100))
+            return outbox.send_batch(logs)
+
+        with mock.patch('notifications.digest.send_batch', side_effect=send_after_worker_runs):
+            send_digests()
+        self.assertEqual(claimed, [])
+        self.assertEqual(len(mail.outbox), 2)
 
-# Create your tests here.
+    def test_read_notifications_are_not_emailed(self):
+        for user in self.users:
+            Notification.mark_all_as_read(user)
+        self.assertEqual(send_digests()['sent'], 0)
+        self.assertFalse(Notification.objects.filter(recipient=self.users[0], is_sent_via_email=False).exists())
@@ -1,3 +1,39 @@
-from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest
+from django.shortcuts import render, redirect
+from django.views.decorators.http import require_POST
 
-# Create your views here.
+from core.pagination import InvalidCursor, paginate_keyset
+from .models import Notification
+
+
+INBOX_PAGE_SIZE = 20
+
+
+@login_required
+def inbox(request):
+    """Notification inbox, newest first, in keyset pages"""
+    notifications = request.user.notifications.select_related('sender')
+    try:
+        page = paginate_keyset(notifications, cursor=request.GET.get('cursor'), page_size=INBOX_PAGE_SIZE)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid inbox cursor")
+    return render(request, 'notifications/inbox.html', {
+        'notifications': page.items,
+        'next_cursor': page.next_cursor,
+    })
+
+
+@require_POST
+@login_required
+def mark_read(request):
+    """Mark the selected notifications (or all of them) as read in one UPDATE"""
+    if request.POST.get('all'):
+        Notification.mark_all_as_read(request.user)
+    else:
+        try:
+            ids = [int(value) for value in request.POST.getlist('ids')]
+        except ValueError:
+            return HttpResponseBadRequest("Invalid notification id")
+        Notification.mark_all_as_read(request.user, ids=ids)
+    return redirect('notifications:inbox')
@@ -0,0 +1,49 @@
+"""
+Comment threads on the post detail page.
+
+Threads are served newest first in keyset pages of ``COMMENT_PAGE_SIZE``
+(the ``comment_thread_idx`` index), so a post with 50,000 comments
+renders as fast as one with 20. The first page is rendered once and
+cached as HTML until a comment is added or removed (see posts.signals);
+older pages come from the ``post_comments`` "load more" endpoint.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.template.loader import render_to_string
+
+from core.cache import CacheNamespace
+from core.pagination import paginate_keyset
+from .models import Comment
+
+
+COMMENT_PAGE_SIZE = getattr(settings, 'COMMENT_PAGE_SIZE', 20)
+COMMENT_CACHE_TIMEOUT = getattr(settings, 'COMMENT_CACHE_TIMEOUT', 60 * 10)
+
+
+first_page_cache = CacheNamespace('posts.comments', timeout=COMMENT_CACHE_TIMEOUT)
+
+
+def get_comment_page(post_id, cursor=None, page_size=COMMENT_PAGE_SIZE, using=None):
+    """Return one ``KeysetPage`` of a post's comments with their authors"""
+    comments = Comment.objects.using(using).filter(post_id=post_id).select_related('author')
+    return paginate_keyset(comments, cursor=cursor, page_size=page_size)
+
+
+def render_comment_page(post_id, cursor=None, using=None):
+    page = get_comment_page(post_id, cursor=cursor, using=using)
+    return render_to_string('posts/_comment_page.html', {
+        'post_id': post_id,
+        'comments': page.items,
+        'next_cursor': page.next_cursor,
+    })
+
+
+def first_comment_page_html(post_id):
+    """Rendered newest comments of a post, from the cache when possible"""
+    return first_page_cache.get_or_set(
+        post_id, lambda: render_comment_page(post_id, using=DEFAULT_DB_ALIAS)
+    )
+
+
+def invalidate_comment_page(post_id):
+    first_page_cache.delete(post_id)
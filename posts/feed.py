@@ -0,0 +1,24 @@
+"""
+Home feed construction.
+
+The feed is served in fixed-size keyset pages so a request only ever
+touches ``FEED_PAGE_SIZE + 1`` rows of the post index, no matter how
+large ``posts_post`` grows.
+"""
+from django.conf import settings
+
+from core.pagination import paginate_keyset
+from .models import Post
+
+
+FEED_PAGE_SIZE = getattr(settings, 'FEED_PAGE_SIZE', 20)
+
+
+def home_feed(viewer):
+    """Queryset of every post visible to ``viewer``, with engagement data"""
+    return Post.objects.visible_to(viewer).with_engagement(viewer)
+
+
+def get_feed_page(viewer, cursor=None, page_size=FEED_PAGE_SIZE):
+    """Return one ``KeysetPage`` of the viewer's home feed"""
+    return paginate_keyset(home_feed(viewer), cursor=cursor, page_size=page_size)
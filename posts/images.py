@@ -0,0 +1,87 @@
+"""
+Background ingestion of post images.
+
+Post.save schedules ``process_post_image`` whenever a new image is
+attached. The worker decodes the upload once and:
+
+* replaces it with an upright, EXIF-free progressive JPEG no larger than
+  ``POST_IMAGE_MAX_SIZE`` on its longest side, so the original (and any
+  GPS tags in it) is never served: until then pages show a placeholder;
+* writes JPEG and WebP copies at each of ``POST_IMAGE_WIDTHS`` for
+  ``srcset``;
+* records the upright dimensions and a BlurHash placeholder so pages can
+  reserve space and paint something before the image arrives.
+
+File names are derived from the SHA-256 of the upload, so a re-upload of
+the same bytes reuses the existing files. Every file the post ends up
+referencing is counted in core.models.MediaBlob, and the raw upload is
+released once it has been replaced.
+"""
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from core.images import (
+    blurhash, content_digest, encode, extension, open_normalized, scaled_variants, variant_names,
+)
+from core.models import MediaBlob
+from core.storage import media_storage
+from .models import Post, POST_IMAGE_WIDTHS
+
+
+logger = logging.getLogger(__name__)
+
+POST_IMAGE_MAX_SIZE = getattr(settings, 'POST_IMAGE_MAX_SIZE', 2048)
+VARIANT_DIR = 'post_images/variants'
+
+
+def variant_name(digest, width, fmt):
+    return f"{VARIANT_DIR}/{digest}_{width}.{extension(fmt)}"
+
+
+def process_post_image(post_id):
+    """Re-encode one post's upload, generate its variants and mark it ready"""
+    post = Post.objects.filter(pk=post_id).only('image', 'image_variants').first()
+    if post is None or not post.image:
+        return
+    name = post.image.name
+    current = Post.objects.filter(pk=post_id, image=name)
+
+    try:
+        with post.image.open('rb') as upload:
+            digest = content_digest(upload)
+            image = open_normalized(upload)
+            image.load()
+    except Exception:
+        logger.exception("Could not decode image %s of post %s", name, post_id)
+        current.update(image_status='failed')
+        return
+
+    try:
+        image.thumbnail((POST_IMAGE_MAX_SIZE, POST_IMAGE_MAX_SIZE))
+        # Content-addressed, so re-encoding an already stored image is a no-op
+        master = post.image.storage.save('post_images/image.jpg', ContentFile(encode(image, 'jpeg')))
+
+        variants = {}
+        for width, fmt, data in scaled_variants(image, POST_IMAGE_WIDTHS):
+            path = media_storage.save_exact(variant_name(digest, width, fmt), data)
+            variants.setdefault(str(width), {})[fmt] = path
+        placeholder = blurhash(image)
+    except Exception:
+        logger.exception("Could not process image %s of post %s", name, post_id)
+        current.update(image_status='failed')
+        return
+
+    # Filtering on the file name drops the result if the image was replaced meanwhile
+    updated = current.update(
+        image=master,
+        image_status='ready',
+        image_width=image.width,
+        image_height=image.height,
+        image_blurhash=placeholder,
+        image_variants=variants,
+    )
+    if updated:
+        MediaBlob.acquire([master, *variant_names(variants)])
+        MediaBlob.release(post.media_names())
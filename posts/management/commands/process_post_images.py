@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts.images import process_post_image
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Re-encode post images that are still pending (or failed with --retry-failed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true',
+                            help="Also retry images whose processing failed")
+        parser.add_argument('--all', action='store_true',
+                            help="Reprocess every post image, e.g. after changing POST_IMAGE_WIDTHS")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            statuses = ['pending', 'failed'] if options['retry_failed'] else ['pending']
+            posts = posts.filter(image_status__in=statuses)
+
+        processed = 0
+        for post_id in posts.values_list('id', flat=True).iterator():
+            process_post_image(post_id)
+            processed += 1
+        failed = Post.objects.filter(image_status='failed').count()
+        self.stdout.write(f"Processed {processed} images, {failed} failed")
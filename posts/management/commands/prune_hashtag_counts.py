@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts.tags import prune_hashtag_counts
+
+
+class Command(BaseCommand):
+    help = "Delete hourly hashtag counters older than the trending window (run periodically)"
+
+    def handle(self, *args, **options):
+        deleted = prune_hashtag_counts()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} hashtag counters"))
@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from posts.models import TimelineEntry
+from core.graph import friend_ids
+from posts.timeline import backfill_timeline, TIMELINE_BACKFILL_SIZE
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized friends timelines from existing posts and friendships"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--per-friend', type=int, default=TIMELINE_BACKFILL_SIZE,
+                            help="Recent posts copied from each friend")
+
+    def handle(self, *args, **options):
+        TimelineEntry.objects.all().delete()
+        users = 0
+        for user_id in User.objects.values_list('id', flat=True).iterator():
+            backfill_timeline(user_id, user_id, limit=options['per_friend'])
+            for friend_id in friend_ids(user_id):
+                backfill_timeline(user_id, friend_id, limit=options['per_friend'])
+            users += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt timelines for {users} users"))
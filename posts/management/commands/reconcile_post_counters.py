@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Post, Like, Comment
+
+
+def _count_of(model):
+    counts = (
+        model.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.like_count / comment_count and fix any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of posts checked per query")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        checked = fixed = 0
+
+        while True:
+            ids = list(
+                Post.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            checked += len(ids)
+
+            drifted = list(
+                Post.objects.filter(id__in=ids)
+                .annotate(actual_likes=_count_of(Like), actual_comments=_count_of(Comment))
+                .filter(~Q(like_count=F('actual_likes')) | ~Q(comment_count=F('actual_comments')))
+                .values_list('id', flat=True)
+            )
+            if not drifted:
+                continue
+
+            # Recount inside the UPDATE itself so concurrent likes are not lost
+            fixed += Post.objects.filter(id__in=drifted).update(
+                like_count=_count_of(Like),
+                comment_count=_count_of(Comment),
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} posts, fixed {fixed}"))
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.9 on 2026-10-18 04:58
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.get_media_storage, upload_to='post_images/'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.9 on 2026-10-18 05:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_content_addressed_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HashtagCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=100)),
+                ('hour', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='hashtag_count_hour_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='hashtagcount',
+            constraint=models.UniqueConstraint(fields=('tag', 'hour'), name='hashtag_count_bucket_uniq'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.9 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+def queue_unprocessed_images(apps, schema_editor):
+    # Images uploaded before 0008 are raw uploads marked ready; queue them for
+    # process_post_images so their EXIF/GPS data is stripped before display
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.exclude(image='').exclude(image__isnull=True).filter(
+        image_status='ready', image_variants={},
+    ).update(image_status='pending')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_hashtag_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(queue_unprocessed_images, migrations.RunPython.noop),
+    ]
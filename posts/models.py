@@ -1,41 +1,211 @@
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, connections, models, router
+from django.db.models.signals import post_delete, post_save
 from django.conf import settings
+from django.utils import timezone
 
-class Post(models.Model):
+from core.cache import CacheNamespace
+from core.images import pick_variant, variant_names
+from core.models import MediaBlob, TracksSavedFields
+from core.storage import get_media_storage
+from core.tasks import run_in_background
+
+
+# Widths of the re-encoded copies served in place of the upload:
+# thumbnail, feed column and full-size view
+POST_IMAGE_WIDTHS = getattr(settings, 'POST_IMAGE_WIDTHS', (320, 640, 1280))
+
+POST_CACHE_TIMEOUT = getattr(settings, 'POST_CACHE_TIMEOUT', 60 * 15)
+
+# Fields of the cached post snapshot: what access checks and writes against a post
+# need. Counters and image state change without post_save, so they are left out.
+CACHED_POST_FIELDS = ('id', 'author', 'privacy', 'content', 'created_at')
+
+post_cache = CacheNamespace('post', timeout=POST_CACHE_TIMEOUT)
+
+
+def visibility_q(viewer, prefix=''):
+    """
+    Build a ``Q`` matching posts ``viewer`` is allowed to see.
+
+    ``prefix`` lets related models (e.g. ``'post__'``) reuse the same rule.
+    Friendship is resolved with subqueries so the whole check runs inside
+    the database instead of in Python.
+    """
+    from core.models import Friendship
+
+    sent = Friendship.objects.filter(from_user=viewer, status='accepted').values('to_user')
+    received = Friendship.objects.filter(to_user=viewer, status='accepted').values('from_user')
+    return (
+        models.Q(**{f'{prefix}privacy': 'public'})
+        | models.Q(**{f'{prefix}author': viewer})
+        | models.Q(**{f'{prefix}privacy': 'friends', f'{prefix}author__in': sent})
+        | models.Q(**{f'{prefix}privacy': 'friends', f'{prefix}author__in': received})
+    )
+
+
+class PostQuerySet(models.QuerySet):
+    def visible_to(self, viewer):
+        """Restrict to posts the viewer is allowed to see"""
+        return self.filter(visibility_q(viewer))
+
+    def with_engagement(self, viewer):
+        """
+        Load the author and annotate ``viewer_liked`` so templates need no
+        per-post queries. Counts come from the stored counter columns.
+        """
+        return self.select_related('author').annotate(
+            viewer_liked=models.Exists(
+                Like.objects.filter(post=models.OuterRef('pk'), user=viewer)
+            ),
+        )
+
+
+class Post(TracksSavedFields, models.Model):
     PRIVACY_CHOICES = [
         ('public', 'Public'),
         ('friends', 'Friends Only'),
         ('private', 'Private'),
     ]
+    IMAGE_STATUS_CHOICES = [
+        ('ready', 'Ready'),
+        ('pending', 'Pending'),
+        ('failed', 'Failed'),
+    ]
 
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='posts')
     content = models.TextField(blank=True)
-    image = models.ImageField(upload_to='post_images/', blank=True, null=True)
+    image = models.ImageField(upload_to='post_images/', storage=get_media_storage, blank=True, null=True)
     privacy = models.CharField(max_length=10, choices=PRIVACY_CHOICES, default='public')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized counters, kept in step by posts.signals
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    # Filled in by posts.images once the upload has been re-encoded:
+    # {"640": {"jpeg": "post_images/variants/<sha256>_640.jpg", "webp": ...}, ...}
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_blurhash = models.CharField(max_length=64, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True)
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, default='ready')
+
+    objects = PostQuerySet.as_manager()
+
+    # So save() can tell whether the image changed, and posts.tags only
+    # handles the text an edit added
+    tracked_fields = ('image', 'content')
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the home feed and of a single author's posts
+            models.Index(fields=['-created_at', '-id'], name='post_feed_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_feed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.author.username} - {self.content[:30]}"
 
+    def save(self, *args, **kwargs):
+        # Uploads are re-encoded by a background worker, never in the request
+        image_changed = self._image_changed()
+        if image_changed:
+            previous = [] if self._state.adding else [
+                name
+                for stored in type(self).objects.filter(pk=self.pk).only('image', 'image_variants')
+                for name in stored.media_names()
+            ]
+            self.image_status = 'pending' if self.image else 'ready'
+            self.image_variants = {}
+            self.image_width = self.image_height = None
+            self.image_blurhash = ''
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {
+                    'image_status', 'image_variants', 'image_width', 'image_height', 'image_blurhash',
+                }
+
+        super().save(*args, **kwargs)
+
+        if image_changed:
+            MediaBlob.acquire([self.image.name])
+            MediaBlob.release(previous)
+            if self.image:
+                from .images import process_post_image
+                run_in_background(process_post_image, self.pk)
+
+    @classmethod
+    def cached(cls, post_id):
+        """
+        Snapshot of the post (``CACHED_POST_FIELDS`` and the author) from the
+        cache when possible; None if it doesn't exist. Dropped by posts.signals
+        whenever the post is saved or deleted.
+        """
+        return post_cache.get_or_set(
+            post_id,
+            lambda: cls.objects.using(DEFAULT_DB_ALIAS).select_related('author').only(*CACHED_POST_FIELDS).filter(id=post_id).first(),
+        )
+
+    def is_visible_to(self, viewer):
+        """``visibility_q`` for a single loaded post, using the cached friend graph"""
+        from core.graph import friend_ids
+
+        if self.privacy == 'public' or self.author_id == viewer.pk:
+            return True
+        return self.privacy == 'friends' and self.author_id in friend_ids(viewer)
+
+    def _image_changed(self):
+        if 'image' in self.get_deferred_fields():
+            return False
+        if self._state.adding or 'image' not in self.saved_values:
+            return bool(self.image)
+        return (self.image.name or None) != (self.saved_values['image'] or None)
+
+    def media_names(self):
+        """Stored files this post references (for MediaBlob counting)"""
+        return [self.image.name, *variant_names(self.image_variants)] if self.image else []
+
+    def image_url(self, width, fmt='jpeg'):
+        """
+        URL of the smallest processed copy at least ``width`` px wide, or
+        None until posts.images has processed the upload (which is never
+        served itself)
+        """
+        name = pick_variant(self.image_variants, width, fmt)
+        return self.image.storage.url(name) if name else None
+
     def likes_count(self):
-        return self.likes.count()
+        return self.like_count
 
     def comments_count(self):
-        return self.comments.count()
+        return self.comment_count
+
+    @classmethod
+    def adjust_counter(cls, post_id, field, delta):
+        """Atomically add ``delta`` to a counter column without reading it"""
+        posts = cls.objects.filter(id=post_id)
+        if delta < 0:
+            posts = posts.filter(**{f'{field}__gte': -delta})
+        posts.update(**{field: models.F(field) + delta})
 
 
-class Comment(models.Model):
+class Comment(TracksSavedFields, models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='comments')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # So posts.tags only handles the text an edit added
+    tracked_fields = ('content',)
+
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # A post's comment thread in either direction, id as tie-breaker
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_thread_idx'),
+        ]
 
     def __str__(self):
         return f"{self.author.username} on {self.post.id}"
@@ -51,3 +221,119 @@ class Like(models.Model):
 
     def __str__(self):
         return f"{self.user.username} likes Post {self.post.id}"
+
+    @classmethod
+    def set(cls, post, user):
+        """
+        Like ``post`` as ``user`` with one INSERT ... ON CONFLICT DO NOTHING.
+        Returns whether this call added the like. Repeated or concurrent
+        calls are no-ops, so the post_save handlers (counter, notification)
+        run exactly once per like.
+        """
+        like = cls(post=post, user=user, created_at=timezone.now())
+        using = router.db_for_write(cls, instance=like)
+        connection = connections[using]
+        table, post_column, user_column = cls._like_columns(connection)
+        created_at = cls._meta.get_field('created_at').get_db_prep_value(like.created_at, connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({post_column}, {user_column}, created_at) VALUES (%s, %s, %s) "
+                f"ON CONFLICT ({post_column}, {user_column}) DO NOTHING RETURNING id",
+                [post.pk, user.pk, created_at],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return False
+        like.pk = row[0]
+        like._state.adding = False
+        like._state.db = using
+        post_save.send(sender=cls, instance=like, created=True, update_fields=None, raw=False, using=using)
+        return True
+
+    @classmethod
+    def unset(cls, post, user):
+        """
+        Remove ``user``'s like of ``post`` with one DELETE ... RETURNING.
+        Returns whether this call removed it; post_delete handlers only run
+        for the call that actually deleted the row.
+        """
+        using = router.db_for_write(cls)
+        connection = connections[using]
+        table, post_column, user_column = cls._like_columns(connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {post_column} = %s AND {user_column} = %s RETURNING id",
+                [post.pk, user.pk],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return False
+        like = cls(pk=row[0], post=post, user=user)
+        like._state.adding = False
+        like._state.db = using
+        post_delete.send(sender=cls, instance=like, using=using, origin=like)
+        return True
+
+    @classmethod
+    def _like_columns(cls, connection):
+        quote = connection.ops.quote_name
+        return (
+            quote(cls._meta.db_table),
+            quote(cls._meta.get_field('post').column),
+            quote(cls._meta.get_field('user').column),
+        )
+
+
+class HashtagCount(models.Model):
+    """Uses of a hashtag in posts and comments during one hour (see posts.tags)"""
+    tag = models.CharField(max_length=100)
+    hour = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'hour'], name='hashtag_count_bucket_uniq'),
+        ]
+        indexes = [
+            # Trending: every bucket inside the window
+            models.Index(fields=['hour'], name='hashtag_count_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.tag} x{self.count} at {self.hour:%Y-%m-%d %H:00}"
+
+
+class TimelineEntry(models.Model):
+    """
+    Materialized home timeline row: ``post`` appears in ``owner``'s friends
+    feed. Written on post creation (fan-out on write) so reading a timeline
+    is a single range scan on ``(owner, created_at)``.
+    """
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    # Copies of the post's author and timestamp so reads and unfriending never join posts_post
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_idx'),
+            models.Index(fields=['owner', 'author'], name='timeline_owner_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in {self.owner_id}'s timeline"
+
+
+class PullAuthor(models.Model):
+    """
+    Author with too many friends to fan out to. Their posts are not copied
+    into timelines; readers merge them in at read time instead.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    friend_count = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Pull author {self.user_id} ({self.friend_count} friends)"
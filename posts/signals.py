@@ -0,0 +1,176 @@
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from core.models import Friendship, MediaBlob
+from notifications.models import Notification
+from notifications.push import push_post_counters
+from .comments import invalidate_comment_page
+from .models import Post, Comment, Like, post_cache
+from .tags import process_content
+from .timeline import fan_out_post, backfill_timeline, remove_from_timeline
+
+
+def _deleted_with_post(origin):
+    """Whether a like or comment is going because its post is being deleted"""
+    if isinstance(origin, QuerySet):
+        return origin.model is Post
+    return isinstance(origin, Post)
+
+
+def _content_saved(instance, update_fields):
+    return (
+        'content' not in instance.get_deferred_fields()
+        and (update_fields is None or 'content' in update_fields)
+    )
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_timelines(sender, instance, created, **kwargs):
+    """Fan a new post out to the author's friends' timelines"""
+    if created:
+        fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def extract_post_tags(sender, instance, created, update_fields=None, **kwargs):
+    """Count new hashtags and notify new mentions in the post's text"""
+    if _content_saved(instance, update_fields):
+        previous = None if created else instance.saved_values.get('content')
+        process_content(instance.content, previous, instance.author, instance, 'post')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_cached_post(sender, instance, **kwargs):
+    """Drop the cached post snapshot, now and again on commit"""
+    post_id = instance.pk
+    post_cache.delete(post_id)
+    transaction.on_commit(lambda: post_cache.delete(post_id))
+
+
+@receiver(post_delete, sender=Post)
+def drop_cached_comment_page(sender, instance, **kwargs):
+    """Drop a deleted post's comment page once, rather than per cascaded comment"""
+    invalidate_comment_page(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def release_post_media(sender, instance, **kwargs):
+    """Drop the post's references to its image files"""
+    MediaBlob.release(instance.media_names())
+
+
+@receiver(post_save, sender=Like)
+def increment_like_count(sender, instance, created, **kwargs):
+    """Bump the post's like counter when a like is added"""
+    if created:
+        Post.adjust_counter(instance.post_id, 'like_count', 1)
+        push_post_counters(instance.post_id)
+
+
+@receiver(post_save, sender=Like)
+def notify_post_liked(sender, instance, created, **kwargs):
+    """Tell the author someone liked their post (coalesced per post)"""
+    if created and instance.user_id != instance.post.author_id:
+        Notification.create_notification(
+            recipient=instance.post.author,
+            sender=instance.user,
+            notification_type='like',
+            message='',
+            content_object=instance.post,
+        )
+
+
+@receiver(post_delete, sender=Like)
+def decrement_like_count(sender, instance, origin=None, **kwargs):
+    """Drop the post's like counter when a like is removed (including cascades)"""
+    if _deleted_with_post(origin):
+        # The post row is going too; nothing to count or push
+        return
+    Post.adjust_counter(instance.post_id, 'like_count', -1)
+    push_post_counters(instance.post_id)
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, **kwargs):
+    """Bump the post's comment counter when a comment is added"""
+    if created:
+        Post.adjust_counter(instance.post_id, 'comment_count', 1)
+        push_post_counters(instance.post_id)
+
+
+@receiver(post_save, sender=Comment)
+def notify_post_commented(sender, instance, created, **kwargs):
+    """Tell the author someone commented on their post (coalesced per post)"""
+    if created and instance.author_id != instance.post.author_id:
+        Notification.create_notification(
+            recipient=instance.post.author,
+            sender=instance.author,
+            notification_type='comment',
+            message='',
+            content_object=instance.post,
+        )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_cached_comments(sender, instance, origin=None, **kwargs):
+    """
+    Drop the post's cached first comment page, and again on commit so a
+    read racing the transaction cannot re-cache the old thread.
+    """
+    if _deleted_with_post(origin):
+        # drop_cached_comment_page handles the whole post at once
+        return
+    post_id = instance.post_id
+    invalidate_comment_page(post_id)
+    transaction.on_commit(lambda: invalidate_comment_page(post_id))
+
+
+@receiver(post_save, sender=Comment)
+def extract_comment_tags(sender, instance, created, update_fields=None, **kwargs):
+    """Count new hashtags and notify new mentions in the comment's text"""
+    if _content_saved(instance, update_fields):
+        previous = None if created else instance.saved_values.get('content')
+        process_content(instance.content, previous, instance.author, instance.post, 'comment')
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, origin=None, **kwargs):
+    """Drop the post's comment counter when a comment is removed (including cascades)"""
+    if _deleted_with_post(origin):
+        return
+    Post.adjust_counter(instance.post_id, 'comment_count', -1)
+    push_post_counters(instance.post_id)
+
+
+def _clear_unless_friends(a, b):
+    """
+    Drop each user's posts from the other's timeline, unless they're still
+    friends: friendship rows are per direction, so b -> a may stay accepted
+    while a -> b is declined or deleted.
+    """
+    still_friends = Friendship.objects.filter(
+        Q(from_user_id=a, to_user_id=b) | Q(from_user_id=b, to_user_id=a), status='accepted'
+    ).exists()
+    if not still_friends:
+        remove_from_timeline(a, b)
+        remove_from_timeline(b, a)
+
+
+@receiver(post_save, sender=Friendship)
+def sync_timelines_on_friendship_change(sender, instance, **kwargs):
+    """Backfill timelines for new friends, clear them when a friendship ends"""
+    a, b = instance.from_user_id, instance.to_user_id
+    if instance.status == 'accepted':
+        backfill_timeline(a, b)
+        backfill_timeline(b, a)
+    else:
+        _clear_unless_friends(a, b)
+
+
+@receiver(post_delete, sender=Friendship)
+def clear_timelines_on_friendship_delete(sender, instance, **kwargs):
+    """Clear both timelines when the last friendship row between two users is removed"""
+    _clear_unless_friends(instance.from_user_id, instance.to_user_id)
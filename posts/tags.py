@@ -0,0 +1,123 @@
+"""
+Hashtags and @mentions.
+
+Post and comment text is parsed in a single regex pass on save (see
+posts.signals); on edits only tags and names new to the text count.
+Mentioned usernames are resolved with one query and notified with one
+bulk INSERT. Hashtag uses in public posts and their comments are added
+to hourly ``HashtagCount`` buckets, so trending tags are a sum over a day
+of small buckets instead of a scan over recent posts.
+"""
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from core.cache import CacheNamespace
+from core.graph import friends_among
+from notifications.models import Notification
+from .models import HashtagCount
+
+
+TRENDING_WINDOW_HOURS = getattr(settings, 'TRENDING_WINDOW_HOURS', 24)
+TRENDING_CACHE_TIMEOUT = getattr(settings, 'TRENDING_CACHE_TIMEOUT', 60)
+
+# More mentions than this in one text are ignored, so a post can't spam the site
+MAX_MENTIONS = getattr(settings, 'MAX_MENTIONS', 20)
+
+trending_cache = CacheNamespace('posts.trending', timeout=TRENDING_CACHE_TIMEOUT)
+
+HASHTAG_MAX_LENGTH = 100
+
+# "#tag" or "@username", not inside words, emails or URL fragments
+_TOKEN_RE = re.compile(r'(?<![\w#@/&])(?:#(\w+)|@([\w.+-]*\w))')
+
+
+def parse_content(text):
+    """Lowercased hashtags and mentioned usernames in ``text``, in order of appearance"""
+    hashtags, usernames = {}, {}
+    for tag, username in _TOKEN_RE.findall(text or ''):
+        if tag and not tag.isdigit():
+            hashtags[tag.lower()[:HASHTAG_MAX_LENGTH]] = None
+        elif username:
+            usernames[username] = None
+    return list(hashtags), list(usernames)
+
+
+def process_content(text, previous, author, post, where):
+    """
+    Count the hashtags and notify the mentions of a saved post or comment.
+    ``previous`` is the text before this save (None if unknown or new).
+    """
+    hashtags, usernames = parse_content(text)
+    if previous:
+        old_hashtags, old_usernames = parse_content(previous)
+        hashtags = [tag for tag in hashtags if tag not in old_hashtags]
+        usernames = [name for name in usernames if name not in old_usernames]
+    # Trending is shown to everyone, so only public text may feed it
+    if post.privacy == 'public':
+        count_hashtags(hashtags)
+    notify_mentions(usernames[:MAX_MENTIONS], author, post, where)
+
+
+def notify_mentions(usernames, author, post, where):
+    """Notify the mentioned users who can see ``post``; one SELECT and one INSERT"""
+    if not usernames:
+        return []
+    recipients = [
+        user for user in User.objects.filter(username__in=usernames).only('id', 'username')
+        if user.pk != author.pk
+    ]
+    if post.privacy == 'private':
+        recipients = [user for user in recipients if user.pk == post.author_id]
+    elif post.privacy == 'friends':
+        friends = friends_among(post.author_id, [user.pk for user in recipients])
+        recipients = [user for user in recipients if user.pk == post.author_id or user.pk in friends]
+    return Notification.notify_many(
+        recipients,
+        sender=author,
+        notification_type='mention',
+        message=f"{author.username} mentioned you in a {where}",
+        content_object=post,
+    )
+
+
+def _hour(when):
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+def count_hashtags(hashtags, when=None):
+    """Add one use of each tag to the bucket of the current hour"""
+    if not hashtags:
+        return
+    hour = _hour(when or timezone.now())
+    HashtagCount.objects.bulk_create(
+        [HashtagCount(tag=tag, hour=hour) for tag in hashtags], ignore_conflicts=True,
+    )
+    HashtagCount.objects.filter(tag__in=hashtags, hour=hour).update(count=F('count') + 1)
+
+
+def trending_hashtags(limit=10):
+    """Most used tags over the last ``TRENDING_WINDOW_HOURS``, as ``[(tag, uses)]``"""
+    trending = trending_cache.get(limit)
+    if trending is None:
+        since = _hour(timezone.now()) - timedelta(hours=TRENDING_WINDOW_HOURS - 1)
+        trending = list(
+            HashtagCount.objects.filter(hour__gte=since)
+            .values('tag')
+            .annotate(uses=Sum('count'))
+            .order_by('-uses', 'tag')
+            .values_list('tag', 'uses')[:limit]
+        )
+        trending_cache.set(limit, trending)
+    return trending
+
+
+def prune_hashtag_counts(now=None):
+    """Delete buckets that have left the trending window; returns how many"""
+    since = _hour(now or timezone.now()) - timedelta(hours=TRENDING_WINDOW_HOURS - 1)
+    deleted, _ = HashtagCount.objects.filter(hour__lt=since).delete()
+    return deleted
@@ -0,0 +1,18 @@
+from django import template
+
+from core.images import variant_srcset
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_image_url(post, width, fmt='jpeg'):
+    """URL of ``post``'s image scaled to at least ``width`` px"""
+    return post.image_url(width, fmt)
+
+
+@register.simple_tag
+def post_image_srcset(post, fmt='jpeg'):
+    """``srcset`` listing every processed width of one format"""
+    return variant_srcset(post.image_variants, post.image.storage, fmt)
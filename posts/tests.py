@@ -1,3 +1,550 @@
-from django.test import TestCase
+import hashlib
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from core import uploads
+from core.models import Friendship, MediaBlob
+from notifications.models import Notification
+from . import timeline
+from .comments import COMMENT_PAGE_SIZE, first_page_cache
+from .feed import get_feed_page
+from .models import Comment, HashtagCount, Like, Post, PullAuthor, TimelineEntry
+from .tags import count_hashtags, notify_mentions, parse_content, prune_hashtag_counts, trending_hashtags
+
+
+class FeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user('viewer', password='pass12345')
+        self.friend = User.objects.create_user('friend', password='pass12345')
+        self.stranger = User.objects.create_user('stranger', password='pass12345')
+        Friendship.objects.create(from_user=self.friend, to_user=self.viewer, status='accepted')
+
+    def test_feed_respects_privacy(self):
+        visible = [
+            Post.objects.create(author=self.stranger, content='public', privacy='public'),
+            Post.objects.create(author=self.friend, content='friends', privacy='friends'),
+            Post.objects.create(author=self.viewer, content='mine', privacy='private'),
+        ]
+        Post.objects.create(author=self.stranger, content='strangers only', privacy='friends')
+        Post.objects.create(author=self.friend, content='secret', privacy='private')
+
+        page = get_feed_page(self.viewer)
+        self.assertEqual({p.id for p in page}, {p.id for p in visible})
+        self.assertFalse(page.has_next)
+
+    def test_keyset_pages_cover_feed_without_overlap(self):
+        posts = [Post.objects.create(author=self.stranger, content=str(i)) for i in range(7)]
+        # Identical timestamps force the id tie-breaker to do its job
+        Post.objects.update(created_at=posts[0].created_at)
+
+        seen, cursor = [], None
+        while True:
+            page = get_feed_page(self.viewer, cursor=cursor, page_size=3)
+            seen.extend(p.id for p in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, sorted((p.id for p in posts), reverse=True))
+
+    def test_post_list_view(self):
+        Post.objects.create(author=self.stranger, content='hello world')
+        self.client.force_login(self.viewer)
+        response = self.client.get(reverse('posts:post_list'))
+        self.assertContains(response, 'hello world')
+        response = self.client.get(reverse('posts:post_list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_hidden_post_detail_is_404(self):
+        post = Post.objects.create(author=self.stranger, content='x', privacy='private')
+        self.client.force_login(self.viewer)
+        response = self.client.get(reverse('posts:post_detail', args=[post.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class FeedQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user('viewer', password='pass12345')
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.client.force_login(self.viewer)
+
+    def add_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(author=self.author, content=f'post {i}')
+            Like.objects.create(post=post, user=self.viewer)
+            Comment.objects.create(post=post, author=self.author, content='hi')
+
+    def count_feed_queries(self):
+        # Warm per-user caches (e.g. the unread badge) so only page queries are counted
+        self.client.get(reverse('posts:post_list'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('posts:post_list'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_feed_query_count_is_constant(self):
+        self.add_posts(2)
+        small = self.count_feed_queries()
+        self.add_posts(8)
+        self.assertEqual(self.count_feed_queries(), small)
+
+    def test_engagement_annotations(self):
+        self.add_posts(1)
+        post = Post.objects.with_engagement(self.viewer).get()
+        self.assertEqual((post.like_count, post.comment_count, post.viewer_liked), (1, 1, True))
+        post = Post.objects.with_engagement(self.author).get()
+        self.assertFalse(post.viewer_liked)
+
+    def test_post_detail_query_count_is_constant(self):
+        post = Post.objects.create(author=self.author, content='busy')
+        url = reverse('posts:post_detail', args=[post.id])
+        Comment.objects.create(post=post, author=self.author, content='first')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        small = len(ctx.captured_queries)
+        for i in range(5):
+            commenter = User.objects.create_user(f'c{i}', password='pass12345')
+            Comment.objects.create(post=post, author=commenter, content='more')
+        # The new comments dropped the cached first page; compare like with like
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertEqual(len(ctx.captured_queries), small)
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.fan = User.objects.create_user('fan', password='pass12345')
+        self.post = Post.objects.create(author=self.author, content='counted')
+
+    def test_counters_follow_creates_and_deletes(self):
+        like = Like.objects.create(post=self.post, user=self.fan)
+        Comment.objects.create(post=self.post, author=self.fan, content='nice')
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+
+        like.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_cascaded_delete_updates_counters(self):
+        Like.objects.create(post=self.post, user=self.fan)
+        Comment.objects.create(post=self.post, author=self.fan, content='nice')
+        self.fan.delete()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (0, 0))
+
+    def test_deleting_a_post_skips_per_row_counter_updates(self):
+        fans = [User.objects.create_user(f'fan{i}', password='pass12345') for i in range(5)]
+        second = Post.objects.create(author=self.author, content='also counted')
+        for post in (self.post, second):
+            for fan in fans:
+                Like.objects.create(post=post, user=fan)
+                Comment.objects.create(post=post, author=fan, content='nice')
+
+        for delete in (self.post.delete, Post.objects.filter(id=second.id).delete):
+            with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks() as callbacks:
+                delete()
+            self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE "posts_post"')])
+            self.assertLess(len(callbacks), len(fans))
+        self.assertFalse(Like.objects.exists() or Comment.objects.exists())
+
+    def test_reconcile_command_fixes_drift(self):
+        Like.objects.create(post=self.post, user=self.fan)
+        Post.objects.filter(id=self.post.id).update(like_count=42, comment_count=7)
+        out = StringIO()
+        call_command('reconcile_post_counters', stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 0))
+        self.assertIn('fixed 1', out.getvalue())
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user('reader', password='pass12345')
+        self.friend = User.objects.create_user('friend', password='pass12345')
+        self.stranger = User.objects.create_user('stranger', password='pass12345')
+        self.friendship = Friendship.objects.create(
+            from_user=self.reader, to_user=self.friend, status='accepted'
+        )
+
+    def timeline_ids(self):
+        return [p.id for p in timeline.get_timeline_page(self.reader)]
+
+    def test_new_posts_fan_out_to_friends(self):
+        shared = Post.objects.create(author=self.friend, content='hi', privacy='friends')
+        Post.objects.create(author=self.friend, content='secret', privacy='private')
+        Post.objects.create(author=self.stranger, content='public', privacy='public')
+        own = Post.objects.create(author=self.reader, content='me', privacy='private')
+        self.assertEqual(self.timeline_ids(), [own.id, shared.id])
+
+    def test_high_fanout_author_is_read_on_demand(self):
+        with mock.patch.object(timeline, 'TIMELINE_FANOUT_LIMIT', 0):
+            post = Post.objects.create(author=self.friend, content='famous')
+        self.assertTrue(PullAuthor.objects.filter(user=self.friend).exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.reader, post=post).exists())
+        self.assertEqual(self.timeline_ids(), [post.id])
+
+    def test_unfriending_and_refriending(self):
+        post = Post.objects.create(author=self.friend, content='hi')
+        self.friendship.block()
+        self.assertEqual(self.timeline_ids(), [])
+        self.friendship.accept()
+        self.assertEqual(self.timeline_ids(), [post.id])
+
+    def test_reverse_request_keeps_timelines_of_friends(self):
+        post = Post.objects.create(author=self.friend, content='hi')
+        reverse_row = Friendship.objects.create(from_user=self.friend, to_user=self.reader, status='pending')
+        reverse_row.decline()
+        self.assertEqual(self.timeline_ids(), [post.id])
+        reverse_row.delete()
+        self.assertEqual(self.timeline_ids(), [post.id])
+        self.friendship.delete()
+        self.assertEqual(self.timeline_ids(), [])
+
+    def test_timeline_pages(self):
+        posts = [Post.objects.create(author=self.friend, content=str(i)) for i in range(5)]
+        first = timeline.get_timeline_page(self.reader, page_size=3)
+        second = timeline.get_timeline_page(self.reader, cursor=first.next_cursor, page_size=3)
+        self.assertEqual([p.id for p in first] + [p.id for p in second],
+                         [p.id for p in reversed(posts)])
+        self.assertFalse(second.has_next)
+
+
+class PostImageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root, BACKGROUND_TASKS_EAGER=True, MEDIA_COLLECT_GRACE=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user('photographer', password='pass12345')
+
+    def upload(self, size=(3000, 2000)):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        Image.new('RGB', size, 'orange').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('holiday.jpg', buffer.getvalue())
+
+    def stored_name(self, upload):
+        upload.seek(0)
+        digest = hashlib.sha256(upload.read()).hexdigest()
+        return f'post_images/{digest[:2]}/{digest}.jpg'
+
+    def create_post(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.author, content='look', image=image)
+        post.refresh_from_db()
+        return post
+
+    def test_upload_is_reencoded_with_variants(self):
+        upload = self.upload()
+        post = self.create_post(upload)
+        self.assertEqual(post.image_status, 'ready')
+        # EXIF orientation applied, then capped at the maximum size
+        self.assertEqual((post.image_width, post.image_height), (1365, 2048))
+        self.assertTrue(post.image_blurhash)
+        self.assertEqual(sorted(post.image_variants, key=int), ['320', '640', '1280'])
+        with Image.open(default_storage.path(post.image.name)) as master:
+            self.assertEqual(master.size, (1365, 2048))
+            self.assertNotIn(0x0112, master.getexif())
+        with Image.open(default_storage.path(post.image_variants['640']['webp'])) as variant:
+            self.assertEqual((variant.format, variant.size), ('WEBP', (640, 960)))
+        # The raw upload is released once replaced, so its file is gone
+        self.assertNotEqual(post.image.name, self.stored_name(upload))
+        self.assertFalse(default_storage.exists(self.stored_name(upload)))
+        self.assertTrue(post.image_url(500).endswith('_640.jpg'))
+
+    def test_small_images_are_not_upscaled(self):
+        post = self.create_post(self.upload(size=(500, 400)))
+        self.assertEqual(sorted(post.image_variants, key=int), ['320', '400'])
+
+    def test_feed_serves_srcset(self):
+        post = self.create_post(self.upload())
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('posts:post_list'))
+        self.assertContains(response, post.image_variants['320']['webp'])
+        self.assertContains(response, f'data-blurhash="{post.image_blurhash}"')
+        self.assertNotContains(response, 'max-width:300px')
+
+    def test_unprocessed_upload_is_never_linked(self):
+        self.client.force_login(self.author)
+        with mock.patch('posts.images.process_post_image'):
+            pending = self.create_post(self.upload())
+        self.assertEqual(pending.image_status, 'pending')
+        response = self.client.get(reverse('posts:post_detail', args=[pending.id]))
+        self.assertNotContains(response, pending.image.url)
+        self.assertContains(response, 'Processing image')
+        Post.objects.filter(id=pending.id).update(image_status='failed')
+        cache.clear()
+        response = self.client.get(reverse('posts:post_detail', args=[pending.id]))
+        self.assertNotContains(response, pending.image.url)
+        self.assertContains(response, 'Image unavailable')
+
+    def test_plain_save_does_not_reprocess(self):
+        post = self.create_post(self.upload())
+        with mock.patch('posts.images.process_post_image') as process:
+            with self.captureOnCommitCallbacks(execute=True):
+                post.content = 'edited'
+                post.save()
+        process.assert_not_called()
+
+
+class PostUploadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root, BACKGROUND_TASKS_EAGER=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user('uploader', password='pass12345')
+        self.client.force_login(self.author)
+
+    def image(self, size=(200, 100)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'navy').save(buffer, 'PNG')
+        return SimpleUploadedFile('pic.png', buffer.getvalue(), content_type='image/png')
+
+    def submit(self, image, client=None):
+        return (client or self.client).post(reverse('posts:post_create'), {'content': 'hi', 'image': image})
+
+    def test_upload_is_hashed_and_moved_into_storage(self):
+        image = self.image()
+        digest = hashlib.sha256(image.read()).hexdigest()
+        image.seek(0)
+        response = self.submit(image)
+        post = Post.objects.get()
+        self.assertRedirects(response, reverse('posts:post_detail', args=[post.id]), fetch_redirect_response=False)
+        self.assertTrue(MediaBlob.objects.filter(name=f'post_images/{digest[:2]}/{digest}.png').exists())
+
+    def test_oversized_upload_is_rejected_while_streaming(self):
+        with mock.patch.object(uploads, 'IMAGE_UPLOAD_MAX_SIZE', 100):
+            response = self.submit(self.image())
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Images may be at most 100')
+        self.assertFalse(Post.objects.exists())
+
+    def test_too_many_pixels_is_rejected_from_the_header(self):
+        with mock.patch.object(uploads, 'IMAGE_MAX_PIXELS', 10_000):
+            with mock.patch.object(uploads.ImageUploadHandler, 'chunk_size', 64):
+                response = self.submit(self.image())
+        self.assertContains(response, 'this one is 200x100')
+        self.assertFalse(Post.objects.exists())
+
+    def test_csrf_is_still_enforced(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        self.assertEqual(self.submit(self.image(), client).status_code, 403)
+
+
+class HashtagMentionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.friend = User.objects.create_user('friend.one', password='pass12345')
+        self.stranger = User.objects.create_user('stranger', password='pass12345')
+        Friendship.objects.create(from_user=self.author, to_user=self.friend, status='accepted')
+
+    def mentions(self):
+        return sorted(
+            Notification.objects.filter(notification_type='mention').values_list('recipient__username', flat=True)
+        )
+
+    def test_parse_content(self):
+        self.assertEqual(
+            parse_content("#Django and #django, @friend.one. mail a@b.com #42 x#no @stranger!"),
+            (['django'], ['friend.one', 'stranger']),
+        )
+
+    def test_mentions_are_resolved_and_notified_in_bulk(self):
+        post = Post.objects.create(author=self.author, content='hello @friend.one @stranger @nobody @author')
+        self.assertEqual(self.mentions(), ['friend.one', 'stranger'])
+        self.assertEqual(Notification.unread_count(self.friend), 1)
+        self.assertEqual(
+            Notification.objects.get(recipient=self.friend).message, 'author mentioned you in a post'
+        )
+
+        # Editing only notifies people the edit added
+        post.content = 'hello @friend.one @stranger, also #news'
+        post.save()
+        self.assertEqual(self.mentions(), ['friend.one', 'stranger'])
+
+        # One SELECT resolves every name, one INSERT notifies everyone
+        with self.assertNumQueries(2):
+            notified = notify_mentions(['friend.one', 'stranger', 'nobody'], self.author, post, 'post')
+        self.assertEqual(len(notified), 2)
+
+    def test_mentions_respect_visibility(self):
+        Post.objects.create(author=self.author, content='@friend.one @stranger', privacy='friends')
+        self.assertEqual(self.mentions(), ['friend.one'])
+        post = Post.objects.create(author=self.author, content='@friend.one', privacy='private')
+        self.assertEqual(self.mentions(), ['friend.one'])
+
+        Comment.objects.create(post=post, author=self.author, content='@stranger')
+        self.assertEqual(self.mentions(), ['friend.one'])
+
+    def test_comment_mentions(self):
+        post = Post.objects.create(author=self.author, content='public')
+        Comment.objects.create(post=post, author=self.stranger, content='@author look #wow')
+        notification = Notification.objects.get(notification_type='mention')
+        self.assertEqual(notification.recipient, self.author)
+        self.assertEqual(notification.message, 'stranger mentioned you in a comment')
+
+    def test_hashtag_counts_and_trending(self):
+        post = Post.objects.create(author=self.author, content='#python #django')
+        Comment.objects.create(post=post, author=self.friend, content='#python')
+        post.content = '#python #django #new'
+        post.save()
+        self.assertEqual(sum(HashtagCount.objects.values_list('count', flat=True)), 4)
+
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(self.stranger)
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(response.json()['hashtags'], [
+            {'tag': 'python', 'uses': 2}, {'tag': 'django', 'uses': 1}, {'tag': 'new', 'uses': 1},
+        ])
+        with self.assertNumQueries(0):
+            trending_hashtags()
+
+    def test_non_public_hashtags_stay_out_of_trending(self):
+        private = Post.objects.create(author=self.author, content='#secretplan', privacy='private')
+        friends_only = Post.objects.create(author=self.author, content='#insidejoke', privacy='friends')
+        Comment.objects.create(post=private, author=self.author, content='#secretplan again')
+        Comment.objects.create(post=friends_only, author=self.friend, content='#insidejoke')
+        self.assertEqual(trending_hashtags(), [])
+        self.assertFalse(HashtagCount.objects.exists())
+
+    def test_old_buckets_leave_the_window(self):
+        count_hashtags(['old'], when=timezone.now() - timedelta(days=2))
+        count_hashtags(['fresh'])
+        self.assertEqual(trending_hashtags(), [('fresh', 1)])
+        self.assertEqual(prune_hashtag_counts(), 1)
+        self.assertEqual(list(HashtagCount.objects.values_list('tag', flat=True)), ['fresh'])
+
+
+class LikeApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.fan = User.objects.create_user('fan', password='pass12345')
+        self.post = Post.objects.create(author=self.author, content='likeable')
+        self.url = reverse('posts:like_api', args=[self.post.id])
+        self.client.force_login(self.fan)
+
+    def test_set_and_unset_are_idempotent(self):
+        first = self.client.put(self.url).json()
+        second = self.client.put(self.url).json()
+        self.assertEqual(first, {'post_id': self.post.id, 'liked': True, 'changed': True, 'like_count': 1})
+        self.assertEqual(second, {**first, 'changed': False})
+        self.assertEqual(Notification.objects.get(recipient=self.author).actor_count, 1)
+
+        self.assertEqual(self.client.delete(self.url).json()['like_count'], 0)
+        self.assertEqual(self.client.delete(self.url).json(), {
+            'post_id': self.post.id, 'liked': False, 'changed': False, 'like_count': 0,
+        })
+        self.assertFalse(Like.objects.exists())
+
+    def test_each_change_is_one_statement_plus_the_counter(self):
+        with self.assertNumQueries(2):
+            self.assertTrue(Like.set(self.post, self.author))
+        with self.assertNumQueries(1):
+            self.assertFalse(Like.set(self.post, self.author))
+        with self.assertNumQueries(2):
+            self.assertTrue(Like.unset(self.post, self.author))
+        with self.assertNumQueries(1):
+            self.assertFalse(Like.unset(self.post, self.author))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_rejects_get_and_hidden_posts(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        hidden = Post.objects.create(author=self.author, content='secret', privacy='private')
+        self.assertEqual(self.client.put(reverse('posts:like_api', args=[hidden.id])).status_code, 404)
+
+    def test_form_fallback(self):
+        form_url = reverse('posts:like_post', args=[self.post.id])
+        self.assertEqual(self.client.get(form_url).status_code, 405)
+        self.client.post(form_url, {'action': 'like'})
+        self.client.post(form_url, {'action': 'like'})
+        self.assertEqual(Like.objects.count(), 1)
+        # Without an action the form toggles
+        self.client.post(form_url)
+        self.assertEqual(Like.objects.count(), 0)
+
+
+class CommentThreadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.post = Post.objects.create(author=self.author, content='popular')
+        self.commenters = [User.objects.create_user(f'commenter{i}', password='pass12345') for i in range(3)]
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.commenters[i % 3], content=f'comment {i:03d}')
+            for i in range(COMMENT_PAGE_SIZE * 2 + 5)
+        ])
+        Post.objects.filter(id=self.post.id).update(comment_count=COMMENT_PAGE_SIZE * 2 + 5)
+        self.client.force_login(self.author)
+        self.detail_url = reverse('posts:post_detail', args=[self.post.id])
+
+    def test_detail_renders_first_page_then_serves_it_from_cache(self):
+        response = self.client.get(self.detail_url)
+        self.assertContains(response, 'comment 044')
+        self.assertContains(response, 'comment 025')
+        self.assertNotContains(response, 'comment 024')
+        self.assertContains(response, 'Load older comments')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.detail_url)
+        self.assertFalse([q for q in queries if 'posts_comment' in q['sql']])
+
+    def test_load_more_pages_through_the_thread(self):
+        page = self.client.get(self.detail_url).context['comments_html']
+        cursor = page.split('cursor=')[1].split('"')[0]
+        older = self.client.get(reverse('posts:post_comments', args=[self.post.id]), {'cursor': cursor})
+        self.assertContains(older, 'comment 024')
+        self.assertContains(older, 'comment 005')
+        self.assertNotContains(older, 'comment 025')
+        with self.assertNumQueries(2):
+            # User and one page of comments with their authors; session and post come from the cache
+            self.client.get(reverse('posts:post_comments', args=[self.post.id]))
+
+        bad = self.client.get(reverse('posts:post_comments', args=[self.post.id]), {'cursor': 'nonsense'})
+        self.assertEqual(bad.status_code, 400)
+
+    def test_new_comment_invalidates_cached_page(self):
+        self.client.get(self.detail_url)
+        self.assertIsNotNone(first_page_cache.get(self.post.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('posts:add_comment', args=[self.post.id]), {'content': 'fresh reply'})
+        self.assertIsNone(first_page_cache.get(self.post.id))
+        self.assertContains(self.client.get(self.detail_url), 'fresh reply')
+
+    def test_hidden_post_comments_are_not_served(self):
+        Post.objects.filter(id=self.post.id).update(privacy='private')
+        self.client.force_login(self.commenters[0])
+        response = self.client.get(reverse('posts:post_comments', args=[self.post.id]))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,114 @@
+"""
+Friends timeline built with hybrid fan-out.
+
+New posts are pushed into a ``TimelineEntry`` row for every friend of the
+author (fan-out on write), so reading a timeline is one range scan on
+``(owner, created_at)``. Authors with more than ``TIMELINE_FANOUT_LIMIT``
+friends are recorded as ``PullAuthor`` instead and their posts are merged
+in when a follower reads (fan-out on read), which keeps a single post
+from turning into millions of inserts.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Q
+
+from core.graph import friend_ids
+from core.models import Friendship
+from core.pagination import KeysetPage, encode_cursor, keyset_filter
+from .models import Post, TimelineEntry, PullAuthor
+
+
+TIMELINE_FANOUT_LIMIT = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 5000)
+TIMELINE_BACKFILL_SIZE = getattr(settings, 'TIMELINE_BACKFILL_SIZE', 50)
+TIMELINE_PAGE_SIZE = getattr(settings, 'TIMELINE_PAGE_SIZE', 20)
+
+SHARED_PRIVACY = ('public', 'friends')
+
+
+def fan_out_post(post):
+    """Push a new post into the timelines of its author and the author's friends"""
+    owners = {post.author_id}
+    if post.privacy in SHARED_PRIVACY:
+        friends = friend_ids(post.author_id)
+        if len(friends) > TIMELINE_FANOUT_LIMIT:
+            PullAuthor.objects.update_or_create(
+                user_id=post.author_id, defaults={'friend_count': len(friends)}
+            )
+        else:
+            owners |= friends
+
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(owner_id=owner_id, post_id=post.id,
+                          author_id=post.author_id, created_at=post.created_at)
+            for owner_id in owners
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_timeline(owner_id, author_id, limit=TIMELINE_BACKFILL_SIZE):
+    """Copy an author's recent posts into a (new) friend's or their own timeline"""
+    if PullAuthor.objects.filter(user_id=author_id).exists():
+        return
+    recent = Post.objects.filter(author_id=author_id)
+    if owner_id != author_id:
+        recent = recent.filter(privacy__in=SHARED_PRIVACY)
+    recent = (
+        recent.order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:limit]
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(owner_id=owner_id, post_id=post_id,
+                          author_id=author_id, created_at=created_at)
+            for post_id, created_at in recent
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def remove_from_timeline(owner_id, author_id):
+    """Drop an author's posts from a former friend's timeline"""
+    TimelineEntry.objects.filter(owner_id=owner_id, author_id=author_id).delete()
+
+
+def get_timeline_page(viewer, cursor=None, page_size=TIMELINE_PAGE_SIZE):
+    """Return one ``KeysetPage`` of the viewer's friends timeline"""
+    pushed = keyset_filter(
+        TimelineEntry.objects.filter(owner=viewer), cursor, tiebreak='post_id'
+    ).values_list('created_at', 'post_id')[:page_size + 1]
+    streams = [list(pushed)]
+
+    sent = Friendship.objects.filter(from_user=viewer, status='accepted').values('to_user')
+    received = Friendship.objects.filter(to_user=viewer, status='accepted').values('from_user')
+    pull_ids = list(
+        PullAuthor.objects.filter(Q(user__in=sent) | Q(user__in=received))
+        .values_list('user_id', flat=True)
+    )
+    if pull_ids:
+        pulled = keyset_filter(
+            Post.objects.filter(author_id__in=pull_ids, privacy__in=SHARED_PRIVACY), cursor
+        ).values_list('created_at', 'id')[:page_size + 1]
+        streams.append(list(pulled))
+
+    # Both streams are already sorted newest first; a post can sit in both
+    # if its author became a pull author after it was fanned out.
+    rows, seen = [], set()
+    for created_at, post_id in heapq.merge(*streams, reverse=True):
+        if post_id in seen:
+            continue
+        seen.add(post_id)
+        rows.append((created_at, post_id))
+        if len(rows) > page_size:
+            break
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(*rows[-1])
+
+    posts = Post.objects.with_engagement(viewer).in_bulk([post_id for _, post_id in rows])
+    return KeysetPage([posts[post_id] for _, post_id in rows if post_id in posts], next_cursor)
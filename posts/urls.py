@@ -5,8 +5,12 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.post_list, name='post_list'),
+    path('timeline/', views.timeline, name='timeline'),
+    path('trending/', views.trending, name='trending'),
     path('post/<int:post_id>/', views.post_detail, name='post_detail'),
     path('post/new/', views.post_create, name='post_create'),
     path('post/<int:post_id>/like/', views.like_post, name='like_post'),
+    path('api/post/<int:post_id>/like/', views.like_api, name='like_api'),
     path('post/<int:post_id>/comment/', views.add_comment, name='add_comment'),
+    path('post/<int:post_id>/comments/', views.post_comments, name='post_comments'),
 ]
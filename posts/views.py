@@ -1,29 +1,82 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_POST, require_http_methods
+from core.pagination import InvalidCursor
+from core.uploads import ImageUploadHandler, validate_uploads
 from .models import Post, Comment, Like
 from .forms import PostForm ,CommentForm
+from .comments import first_comment_page_html, render_comment_page
+from .feed import get_feed_page
+from .tags import trending_hashtags
+from .timeline import get_timeline_page
+
+def _visible_post_or_404(request, post_id):
+    """Cached snapshot of a post the user may see (see ``Post.cached``)"""
+    post = Post.cached(post_id)
+    if post is None or not post.is_visible_to(request.user):
+        raise Http404("No Post matches the given query.")
+    return post
+
 
 @login_required
 def post_list(request):
-    posts = Post.objects.all().order_by('-created_at')
-    return render(request, 'posts/post_list.html', {'posts': posts})
+    try:
+        page = get_feed_page(request.user, cursor=request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid feed cursor")
+    return render(request, 'posts/post_list.html', {
+        'posts': page.items,
+        'next_cursor': page.next_cursor,
+    })
+
+@login_required
+def timeline(request):
+    try:
+        page = get_timeline_page(request.user, cursor=request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid timeline cursor")
+    return render(request, 'posts/post_list.html', {
+        'posts': page.items,
+        'next_cursor': page.next_cursor,
+        'feed_title': 'Friends',
+    })
 
 @login_required
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all().order_by('-created_at')
+    posts = Post.objects.visible_to(request.user).with_engagement(request.user)
+    post = get_object_or_404(posts, id=post_id)
     comment_form = CommentForm()
     return render(request, 'posts/post_detail.html', {
         'post': post,
-        'comments': comments,
+        'comments_html': first_comment_page_html(post.id) if post.comment_count else '',
         'comment_form': comment_form
     })
 
 @login_required
+def post_comments(request, post_id):
+    """HTML fragment of an older page of comments, for "load more" """
+    post = _visible_post_or_404(request, post_id)
+    try:
+        html = render_comment_page(post.id, cursor=request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid comments cursor")
+    return HttpResponse(html)
+
+@login_required
+@csrf_exempt
 def post_create(request):
+    # Must be installed before CSRF checking reads the body, hence the split
+    request.upload_handlers = [ImageUploadHandler(request)]
+    return _post_create(request)
+
+@csrf_protect
+def _post_create(request):
     if request.method == 'POST':
         form = PostForm(request.POST, request.FILES)
-        if form.is_valid():
+        if validate_uploads(form, request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
@@ -32,25 +85,51 @@ def post_create(request):
         form = PostForm()
     return render(request, 'posts/post_form.html', {'form': form})
 
+@require_POST
 @login_required
 def like_post(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    existing_like = Like.objects.filter(post=post, user=request.user).first()
-    if existing_like:
-        existing_like.delete()
-    else:
-        Like.objects.create(post=post, user=request.user)
+    """Form fallback of ``like_api``: like or unlike (``action``), or toggle if unspecified"""
+    post = _visible_post_or_404(request, post_id)
+    action = request.POST.get('action')
+    with transaction.atomic():
+        if action == 'like':
+            Like.set(post, request.user)
+        elif action == 'unlike':
+            Like.unset(post, request.user)
+        elif not Like.unset(post, request.user):
+            Like.set(post, request.user)
     return redirect('posts:post_detail', post_id=post.id)
 
 
+@require_http_methods(['PUT', 'DELETE'])
+@login_required
+def like_api(request, post_id):
+    """PUT likes the post, DELETE unlikes it; both are idempotent. Answers with the new state as JSON"""
+    post = _visible_post_or_404(request, post_id)
+    liked = request.method == 'PUT'
+    with transaction.atomic():
+        changed = (Like.set if liked else Like.unset)(post, request.user)
+        like_count = Post.objects.filter(id=post.id).values_list('like_count', flat=True).get()
+    return JsonResponse({'post_id': post.id, 'liked': liked, 'changed': changed, 'like_count': like_count})
+
+
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = _visible_post_or_404(request, post_id)
     if request.method == 'POST':
         form = CommentForm(request.POST)
         if form.is_valid():
             comment = form.save(commit=False)
             comment.post = post
             comment.author = request.user
-            comment.save()
+            with transaction.atomic():
+                comment.save()
     return redirect('posts:post_detail', post_id=post.id)
+
+
+@login_required
+def trending(request):
+    """Most used hashtags of the last day, read from hourly counters"""
+    return JsonResponse({
+        'hashtags': [{'tag': tag, 'uses': uses} for tag, uses in trending_hashtags()],
+    })
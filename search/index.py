@@ -0,0 +1,183 @@
+"""
+Full-text search over posts, comments and people.
+
+Every post and comment with text has a ``SearchDocument``, kept in step
+by search.signals (deletes cascade). The database maintains the inverted
+index over ``SearchDocument.body`` (see migration 0001):
+
+* SQLite: the external-content FTS5 table ``search_index``, updated by
+  triggers and ranked with bm25;
+* PostgreSQL: a generated ``tsvector`` column with a GIN index, ranked
+  with ts_rank_cd.
+
+Visibility is checked with ``visibility_q`` on columns copied from the
+post, so the index lookup never joins ``posts_post``.
+
+People are found by prefixes of their username and names in
+``UserDocument`` (``user_index`` on SQLite, a ``simple`` tsvector on
+PostgreSQL), honouring each user's ``profile_visibility``.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from core.graph import friend_ids
+from core.pagination import InvalidCursor, KeysetPage, paginate_keyset
+from posts.models import visibility_q
+from .models import SearchDocument, UserDocument
+
+
+SEARCH_PAGE_SIZE = getattr(settings, 'SEARCH_PAGE_SIZE', 20)
+
+# Relevance pages are OFFSET-based, so only this many are served
+SEARCH_MAX_PAGES = getattr(settings, 'SEARCH_MAX_PAGES', 10)
+
+# Relevance ranking only scores the newest visible matches, however many there are
+SEARCH_MAX_CANDIDATES = getattr(settings, 'SEARCH_MAX_CANDIDATES', 5000)
+
+# People shown above the first page of post results
+SEARCH_MAX_PEOPLE = getattr(settings, 'SEARCH_MAX_PEOPLE', 5)
+
+# Longer queries are cut to their first terms
+SEARCH_MAX_TERMS = 8
+
+SORTS = ('relevance', 'recent')
+
+_TERM_RE = re.compile(r'\w+')
+
+
+def search_terms(query):
+    """The words of a user's query, lowercased; operators and quotes are dropped"""
+    return _TERM_RE.findall(query.lower())[:SEARCH_MAX_TERMS]
+
+
+def fts_query(terms):
+    # Quoted, each term is a plain token rather than FTS5 syntax
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def candidate_cutoff(documents):
+    """
+    Lowest id among the newest ``SEARCH_MAX_CANDIDATES`` of ``documents``
+    (matches the viewer may see), or None if there are fewer. Ranking
+    only these keeps very common words cheap.
+    """
+    newest = documents.order_by('-id')
+    if connections[documents.db].vendor == 'sqlite':
+        # Walk the FTS5 rowids backwards instead of sorting every match
+        newest = documents.extra(order_by=['-search_index.rowid'])
+    ids = newest.values_list('id', flat=True)[SEARCH_MAX_CANDIDATES - 1:SEARCH_MAX_CANDIDATES]
+    return next(iter(ids), None)
+
+
+def matching(documents, terms, ranked=True):
+    """
+    Restrict ``documents`` to those containing every term and, if
+    ``ranked``, annotate ``rank`` (higher is more relevant) over the
+    newest ``SEARCH_MAX_CANDIDATES`` of them.
+    """
+    table = SearchDocument._meta.db_table
+    vendor = connections[documents.db].vendor
+    if vendor not in ('postgresql', 'sqlite'):
+        raise NotImplementedError(f"Full-text search is not supported on {vendor}")
+
+    if vendor == 'postgresql':
+        text = ' '.join(terms)
+        tsquery = "plainto_tsquery('english', %s)"
+        documents = documents.filter(
+            RawSQL(f'"{table}"."vector" @@ {tsquery}', [text], output_field=BooleanField()),
+        )
+        if ranked:
+            documents = documents.filter(id__gte=candidate_cutoff(documents) or 0).annotate(
+                rank=RawSQL(f'ts_rank_cd("{table}"."vector", {tsquery})', [text], output_field=FloatField())
+            )
+        return documents
+
+    # Join the FTS5 table so one index scan both matches and scores (bm25()
+    # is lower for better matches); the ORM has no other way to add it
+    documents = documents.extra(
+        tables=['search_index'],
+        where=[f'search_index.rowid = "{table}"."id"', 'search_index MATCH %s'],
+        params=[fts_query(terms)],
+    )
+    if ranked:
+        documents = documents.extra(
+            where=['search_index.rowid >= %s'], params=[candidate_cutoff(documents) or 0],
+            select={'rank': '-bm25(search_index)'},
+        )
+    return documents
+
+
+def search_documents(viewer, terms, ranked=True):
+    """Documents matching ``terms`` that ``viewer`` may see"""
+    documents = SearchDocument.objects.filter(visibility_q(viewer)).select_related(
+        'post__author', 'comment__author',
+    )
+    return matching(documents, terms, ranked=ranked)
+
+
+def people_visible_to(viewer):
+    """``Q`` over ``UserDocument`` for people whose profile ``viewer`` may see"""
+    return (
+        Q(user__settings__isnull=True)
+        | Q(user__settings__profile_visibility='public')
+        | Q(user=viewer)
+        | Q(user__settings__profile_visibility='friends', user__in=friend_ids(viewer))
+    )
+
+
+def search_people(viewer, query, limit=SEARCH_MAX_PEOPLE):
+    """Active users whose names start with every term of ``query``, best match first"""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    people = UserDocument.objects.filter(people_visible_to(viewer), user__is_active=True).select_related('user')
+    table = UserDocument._meta.db_table
+    vendor = connections[people.db].vendor
+    if vendor == 'postgresql':
+        tsquery = "to_tsquery('simple', %s)"
+        prefixes = ' & '.join(f'{term}:*' for term in terms)
+        people = people.filter(
+            RawSQL(f'"{table}"."vector" @@ {tsquery}', [prefixes], output_field=BooleanField())
+        ).annotate(
+            rank=RawSQL(f'ts_rank_cd("{table}"."vector", {tsquery})', [prefixes], output_field=FloatField())
+        )
+    elif vendor == 'sqlite':
+        people = people.extra(
+            tables=['user_index'],
+            where=[f'user_index.rowid = "{table}"."user_id"', 'user_index MATCH %s'],
+            params=[' '.join(f'"{term}"*' for term in terms)],
+            select={'rank': '-bm25(user_index)'},
+        )
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {vendor}")
+    return [document.user for document in people.order_by('-rank', 'user__username')[:limit]]
+
+
+def get_search_page(viewer, query, sort='relevance', cursor=None, page_size=SEARCH_PAGE_SIZE):
+    """
+    Return one ``KeysetPage`` of ``viewer``'s results for ``query``.
+
+    ``recent`` pages use keyset cursors. ``relevance`` pages use the page
+    number as cursor, up to ``SEARCH_MAX_PAGES``.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return KeysetPage([])
+    if sort == 'recent':
+        return paginate_keyset(search_documents(viewer, terms, ranked=False), cursor=cursor, page_size=page_size)
+
+    try:
+        page = int(cursor or 1)
+    except ValueError:
+        raise InvalidCursor(cursor)
+    if not 1 <= page <= SEARCH_MAX_PAGES:
+        raise InvalidCursor(cursor)
+    start = (page - 1) * page_size
+    documents = search_documents(viewer, terms).order_by('-rank', '-created_at', '-id')
+    items = list(documents[start:start + page_size + 1])
+    next_cursor = str(page + 1) if len(items) > page_size and page < SEARCH_MAX_PAGES else None
+    return KeysetPage(items[:page_size], next_cursor)
@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.models import Comment, Post
+from search.models import SearchDocument, UserDocument, has_text_sql
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild search documents from all posts, comments and users, e.g. after "
+        "bulk loads that skipped the indexing signals"
+    )
+
+    def handle(self, *args, **options):
+        documents = SearchDocument._meta.db_table
+        posts = Post._meta.db_table
+        comments = Comment._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            SearchDocument.objects.all().delete()
+            cursor.execute(
+                f"INSERT INTO {documents} (post_id, comment_id, author_id, privacy, body, created_at) "
+                f"SELECT id, NULL, author_id, privacy, content, created_at FROM {posts} "
+                f"WHERE {has_text_sql('content', connection.vendor)}"
+            )
+            cursor.execute(
+                f"INSERT INTO {documents} (post_id, comment_id, author_id, privacy, body, created_at) "
+                f"SELECT c.post_id, c.id, p.author_id, p.privacy, c.content, c.created_at "
+                f"FROM {comments} c JOIN {posts} p ON p.id = c.post_id WHERE {has_text_sql('c.content', connection.vendor)}"
+            )
+            UserDocument.objects.all().delete()
+            cursor.execute(
+                f"INSERT INTO {UserDocument._meta.db_table} (user_id, body) "
+                f"SELECT id, trim(username || ' ' || first_name || ' ' || last_name) FROM {User._meta.db_table}"
+            )
+            if connection.vendor == 'sqlite':
+                # Merge the FTS5 segments written row by row into one b-tree
+                cursor.execute("INSERT INTO search_index(search_index) VALUES ('optimize')")
+                cursor.execute("INSERT INTO user_index(user_index) VALUES ('optimize')")
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {SearchDocument.objects.count()} posts and comments, "
+            f"and {UserDocument.objects.count()} users"
+        ))
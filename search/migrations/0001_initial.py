@@ -0,0 +1,99 @@
+# Generated by Django 4.2.9 on 2026-10-18 05:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from search.models import has_text_sql
+
+
+# The inverted index lives outside the ORM. On SQLite, a migration that
+# rebuilds search_searchdocument drops these triggers and must recreate them.
+SQLITE_INDEX = [
+    """CREATE VIRTUAL TABLE search_index USING fts5(
+        body, content='search_searchdocument', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER search_document_insert AFTER INSERT ON search_searchdocument BEGIN
+        INSERT INTO search_index(rowid, body) VALUES (new.id, new.body);
+    END""",
+    """CREATE TRIGGER search_document_delete AFTER DELETE ON search_searchdocument BEGIN
+        INSERT INTO search_index(search_index, rowid, body) VALUES ('delete', old.id, old.body);
+    END""",
+    """CREATE TRIGGER search_document_update AFTER UPDATE OF body ON search_searchdocument BEGIN
+        INSERT INTO search_index(search_index, rowid, body) VALUES ('delete', old.id, old.body);
+        INSERT INTO search_index(rowid, body) VALUES (new.id, new.body);
+    END""",
+]
+SQLITE_DROP_INDEX = [
+    "DROP TRIGGER IF EXISTS search_document_insert",
+    "DROP TRIGGER IF EXISTS search_document_delete",
+    "DROP TRIGGER IF EXISTS search_document_update",
+    "DROP TABLE IF EXISTS search_index",
+]
+POSTGRES_INDEX = [
+    """ALTER TABLE search_searchdocument ADD COLUMN vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', body)) STORED""",
+    "CREATE INDEX search_document_vector_idx ON search_searchdocument USING GIN (vector)",
+]
+POSTGRES_DROP_INDEX = [
+    "ALTER TABLE search_searchdocument DROP COLUMN IF EXISTS vector",
+]
+
+def backfill(vendor):
+    return [
+        f"""INSERT INTO search_searchdocument (post_id, comment_id, author_id, privacy, body, created_at)
+        SELECT id, NULL, author_id, privacy, content, created_at FROM posts_post
+        WHERE {has_text_sql('content', vendor)}""",
+        f"""INSERT INTO search_searchdocument (post_id, comment_id, author_id, privacy, body, created_at)
+        SELECT c.post_id, c.id, p.author_id, p.privacy, c.content, c.created_at
+        FROM posts_comment c JOIN posts_post p ON p.id = c.post_id
+        WHERE {has_text_sql('c.content', vendor)}""",
+    ]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('posts', '0009_content_addressed_image'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('privacy', models.CharField(choices=[('public', 'Public'), ('friends', 'Friends Only'), ('private', 'Private')], max_length=10)),
+                ('body', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('comment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.comment')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-created_at', '-id'], name='search_recent_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(condition=models.Q(('comment__isnull', True)), fields=('post',), name='search_one_document_per_post'),
+        ),
+        migrations.RunPython(
+            run({'sqlite': SQLITE_INDEX, 'postgresql': POSTGRES_INDEX}),
+            run({'sqlite': SQLITE_DROP_INDEX, 'postgresql': POSTGRES_DROP_INDEX}),
+        ),
+        migrations.RunPython(
+            run({'sqlite': backfill('sqlite'), 'postgresql': backfill('postgresql')}),
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.9 on 2026-10-18 06:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# As for search_index in 0001: the inverted index over names lives outside
+# the ORM. Names are matched by prefix, so they are not stemmed.
+SQLITE_INDEX = [
+    """CREATE VIRTUAL TABLE user_index USING fts5(
+        body, content='search_userdocument', content_rowid='user_id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER user_document_insert AFTER INSERT ON search_userdocument BEGIN
+        INSERT INTO user_index(rowid, body) VALUES (new.user_id, new.body);
+    END""",
+    """CREATE TRIGGER user_document_delete AFTER DELETE ON search_userdocument BEGIN
+        INSERT INTO user_index(user_index, rowid, body) VALUES ('delete', old.user_id, old.body);
+    END""",
+    """CREATE TRIGGER user_document_update AFTER UPDATE OF body ON search_userdocument BEGIN
+        INSERT INTO user_index(user_index, rowid, body) VALUES ('delete', old.user_id, old.body);
+        INSERT INTO user_index(rowid, body) VALUES (new.user_id, new.body);
+    END""",
+]
+SQLITE_DROP_INDEX = [
+    "DROP TRIGGER IF EXISTS user_document_insert",
+    "DROP TRIGGER IF EXISTS user_document_delete",
+    "DROP TRIGGER IF EXISTS user_document_update",
+    "DROP TABLE IF EXISTS user_index",
+]
+POSTGRES_INDEX = [
+    """ALTER TABLE search_userdocument ADD COLUMN vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple', body)) STORED""",
+    "CREATE INDEX search_user_vector_idx ON search_userdocument USING GIN (vector)",
+]
+POSTGRES_DROP_INDEX = [
+    "ALTER TABLE search_userdocument DROP COLUMN IF EXISTS vector",
+]
+
+BACKFILL = [
+    """INSERT INTO search_userdocument (user_id, body)
+    SELECT id, trim(username || ' ' || first_name || ' ' || last_name) FROM auth_user""",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDocument',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('body', models.TextField()),
+            ],
+        ),
+        migrations.RunPython(
+            run({'sqlite': SQLITE_INDEX, 'postgresql': POSTGRES_INDEX}),
+            run({'sqlite': SQLITE_DROP_INDEX, 'postgresql': POSTGRES_DROP_INDEX}),
+        ),
+        migrations.RunPython(
+            run({'sqlite': BACKFILL, 'postgresql': BACKFILL}),
+            migrations.RunPython.noop,
+        ),
+    ]
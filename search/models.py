@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.db import models
+
+from posts.models import Comment, Post
+
+
+# Text made only of these has nothing to index. Live indexing and the bulk
+# SQL of rebuild_search_index (and the 0001 backfill) apply the same test.
+BLANK = ' \t\n\r\x0b\x0c'
+
+
+def has_text(text):
+    return bool(text.strip(BLANK))
+
+
+def has_text_sql(column, vendor):
+    """SQL condition equivalent to ``has_text(column)``"""
+    trim = 'btrim' if vendor == 'postgresql' else 'trim'
+    return f"{trim}({column}, '{BLANK}') <> ''"
+
+
+class SearchDocument(models.Model):
+    """
+    Searchable text of one post or comment.
+
+    The database indexes ``body`` itself (see search.index). Comments carry
+    their post's ``author`` and ``privacy``, so ``visibility_q`` filters
+    documents without joining posts.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    comment = models.OneToOneField(Comment, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    # The post's author and privacy, which decide who may see this text
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    privacy = models.CharField(max_length=10, choices=Post.PRIVACY_CHOICES)
+    body = models.TextField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post'], condition=models.Q(comment__isnull=True), name='search_one_document_per_post',
+            ),
+        ]
+        indexes = [
+            # Newest-first ("recent") result pages
+            models.Index(fields=['-created_at', '-id'], name='search_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{'comment' if self.comment_id else 'post'} {self.comment_id or self.post_id}"
+
+    @classmethod
+    def index_post(cls, post):
+        """Create, update or drop the document of ``post`` and copy its privacy to its comments'"""
+        if has_text(post.content):
+            cls.objects.update_or_create(post=post, comment=None, defaults={
+                'author_id': post.author_id,
+                'privacy': post.privacy,
+                'body': post.content,
+                'created_at': post.created_at,
+            })
+        else:
+            cls.objects.filter(post=post, comment=None).delete()
+        cls.objects.filter(post=post).exclude(privacy=post.privacy).update(privacy=post.privacy)
+
+    @classmethod
+    def index_comment(cls, comment):
+        """Create, update or drop the document of ``comment``"""
+        if not has_text(comment.content):
+            cls.objects.filter(comment=comment).delete()
+            return
+        post = comment.post
+        cls.objects.update_or_create(comment=comment, defaults={
+            'post_id': post.id,
+            'author_id': post.author_id,
+            'privacy': post.privacy,
+            'body': comment.content,
+            'created_at': comment.created_at,
+        })
+
+
+class UserDocument(models.Model):
+    """
+    Searchable names of one user: username, first and last name, matched
+    by prefix so people are found while their name is still being typed.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    body = models.TextField()
+
+    def __str__(self):
+        return f"user {self.user_id}"
+
+    @staticmethod
+    def body_of(user):
+        return ' '.join(name for name in (user.username, user.first_name, user.last_name) if name)
+
+    @classmethod
+    def index_user(cls, user):
+        cls.objects.update_or_create(user=user, defaults={'body': cls.body_of(user)})
@@ -0,0 +1,35 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from posts.models import Comment, Post
+from .models import SearchDocument, UserDocument
+
+
+# Post fields copied into search documents
+INDEXED_POST_FIELDS = {'content', 'privacy'}
+
+# User fields copied into people search documents
+INDEXED_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    """Keep the post's document, and its comments' privacy, in step with edits"""
+    if update_fields is not None and not INDEXED_POST_FIELDS & set(update_fields):
+        return
+    SearchDocument.index_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    """Index new and edited comments"""
+    SearchDocument.index_comment(instance)
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, update_fields=None, **kwargs):
+    """Keep the user's names searchable; logins (last_login only) are skipped"""
+    if update_fields is not None and not INDEXED_USER_FIELDS & set(update_fields):
+        return
+    UserDocument.index_user(instance)
@@ -0,0 +1,189 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from core.models import Friendship
+from posts.models import Comment, Post
+from .index import get_search_page, search_people, search_terms
+from .models import SearchDocument, UserDocument
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob, self.eve = [
+            User.objects.create_user(name, password='pass12345') for name in ('alice', 'bob', 'eve')
+        ]
+        Friendship.objects.create(from_user=self.alice, to_user=self.bob, status='accepted')
+
+    def search(self, viewer, query, **kwargs):
+        return [
+            (doc.post_id, doc.comment_id) for doc in get_search_page(viewer, query, **kwargs)
+        ]
+
+    def test_matches_stemmed_words_of_posts_and_comments(self):
+        post = Post.objects.create(author=self.alice, content='Hiking the mountains today')
+        comment = Comment.objects.create(post=post, author=self.bob, content='Great mountain views')
+        self.assertEqual(set(self.search(self.eve, 'mountain')), {(post.id, None), (post.id, comment.id)})
+        self.assertEqual(self.search(self.eve, 'hike today'), [(post.id, None)])
+        self.assertEqual(self.search(self.eve, 'hike beach'), [])
+
+    def test_respects_privacy_and_friendship(self):
+        public = Post.objects.create(author=self.alice, content='gardening tips')
+        friends = Post.objects.create(author=self.alice, content='gardening with friends', privacy='friends')
+        private = Post.objects.create(author=self.alice, content='gardening diary', privacy='private')
+        Comment.objects.create(post=friends, author=self.bob, content='gardening is fun')
+
+        self.assertEqual({p for p, _ in self.search(self.eve, 'gardening')}, {public.id})
+        self.assertEqual({p for p, _ in self.search(self.bob, 'gardening')}, {public.id, friends.id})
+        self.assertEqual({p for p, _ in self.search(self.alice, 'gardening')}, {public.id, friends.id, private.id})
+
+    def test_edits_and_deletes_update_the_index(self):
+        post = Post.objects.create(author=self.alice, content='original words')
+        comment = Comment.objects.create(post=post, author=self.bob, content='original reply')
+
+        post.content = 'edited words'
+        post.privacy = 'private'
+        post.save()
+        self.assertEqual(self.search(self.alice, 'original'), [(post.id, comment.id)])
+        self.assertEqual(self.search(self.alice, 'edited'), [(post.id, None)])
+        # The comment follows its post's privacy
+        self.assertEqual(self.search(self.bob, 'original'), [])
+
+        comment.delete()
+        self.assertEqual(self.search(self.alice, 'original'), [])
+        post.delete()
+        self.assertFalse(SearchDocument.objects.exists())
+        self.assertEqual(self.search(self.alice, 'edited'), [])
+
+    def test_ranks_by_relevance_and_pages(self):
+        weak = Post.objects.create(author=self.alice, content='a long post that mentions python once among many other words')
+        strong = Post.objects.create(author=self.alice, content='python python python')
+        self.assertEqual(self.search(self.eve, 'python'), [(strong.id, None), (weak.id, None)])
+
+        page = get_search_page(self.eve, 'python', page_size=1)
+        self.assertEqual(page.next_cursor, '2')
+        self.assertEqual([doc.post_id for doc in get_search_page(self.eve, 'python', cursor='2', page_size=1)], [weak.id])
+
+        recent = get_search_page(self.eve, 'python', sort='recent', page_size=1)
+        self.assertEqual([doc.post_id for doc in recent], [strong.id])
+        older = get_search_page(self.eve, 'python', sort='recent', cursor=recent.next_cursor, page_size=1)
+        self.assertEqual([doc.post_id for doc in older], [weak.id])
+
+    @mock.patch('search.index.SEARCH_MAX_CANDIDATES', 2)
+    def test_candidate_cutoff_counts_only_visible_matches(self):
+        visible = Post.objects.create(author=self.alice, content='needle in public')
+        for i in range(3):
+            Post.objects.create(author=self.alice, content=f'needle {i}', privacy='private')
+        self.assertEqual(self.search(self.eve, 'needle'), [(visible.id, None)])
+
+        newer = [Post.objects.create(author=self.bob, content=f'needle again {i}') for i in range(3)]
+        # Relevance ranks the newest two visible matches; recent pages through all of them
+        self.assertEqual({p for p, _ in self.search(self.eve, 'needle')}, {newer[1].id, newer[2].id})
+        found, cursor = [], None
+        while True:
+            page = get_search_page(self.eve, 'needle', sort='recent', cursor=cursor, page_size=2)
+            found += [doc.post_id for doc in page]
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        self.assertEqual(found, [newer[2].id, newer[1].id, newer[0].id, visible.id])
+
+    def test_query_syntax_is_not_interpreted(self):
+        post = Post.objects.create(author=self.alice, content='cats AND dogs')
+        self.assertEqual(search_terms('"cats" OR -dogs*'), ['cats', 'or', 'dogs'])
+        self.assertEqual(self.search(self.eve, '"cats" AND (dogs'), [(post.id, None)])
+        self.assertEqual(self.search(self.eve, '***'), [])
+
+    def test_search_view(self):
+        Post.objects.create(author=self.alice, content='searchable post')
+        self.client.force_login(self.eve)
+        response = self.client.get(reverse('search:search'), {'q': 'searchable'})
+        self.assertContains(response, 'searchable post')
+        response = self.client.get(reverse('search:search'), {'q': 'searchable', 'cursor': '99'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebuild_command(self):
+        post = Post.objects.create(author=self.alice, content='rebuilt content')
+        Comment.objects.bulk_create([Comment(post=post, author=self.bob, content='bulk loaded reply')])
+        SearchDocument.objects.filter(comment=None).delete()
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search(self.eve, 'rebuilt')), 1)
+        self.assertEqual(len(self.search(self.eve, 'bulk reply')), 1)
+
+    def test_rebuild_indexes_the_same_documents_as_live_signals(self):
+        post = Post.objects.create(author=self.alice, content='spoken words', privacy='public')
+        blank = Post.objects.create(author=self.alice, content=' \n\t ', privacy='public')
+        Comment.objects.create(post=post, author=self.bob, content='\n')
+        Comment.objects.create(post=blank, author=self.bob, content='a reply')
+
+        def documents():
+            return sorted(SearchDocument.objects.values_list('post_id', 'comment_id', 'body'), key=str)
+
+        live = documents()
+        self.assertNotIn(blank.id, [post_id for post_id, comment_id, _ in live if comment_id is None])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(documents(), live)
+
+    def test_rebuild_indexes_bulk_created_users(self):
+        User.objects.bulk_create([User(username='bulk_loaded', first_name='Bulky')])
+        self.assertEqual(search_people(self.eve, 'bulky'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual([user.username for user in search_people(self.eve, 'bulky')], ['bulk_loaded'])
+
+
+class PeopleSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice', first_name='Alice', last_name='Liddell', password='pass12345')
+        self.bob = User.objects.create_user('bobby', first_name='Robert', last_name='Tables', password='pass12345')
+        self.eve = User.objects.create_user('eve', password='pass12345')
+
+    def people(self, viewer, query):
+        return [user.username for user in search_people(viewer, query)]
+
+    def test_matches_name_prefixes(self):
+        self.assertEqual(self.people(self.eve, 'ali'), ['alice'])
+        self.assertEqual(self.people(self.eve, 'Alice Lid'), ['alice'])
+        self.assertEqual(self.people(self.eve, 'rob tab'), ['bobby'])
+        self.assertEqual(self.people(self.eve, 'bob'), ['bobby'])
+        self.assertEqual(self.people(self.eve, 'alice tables'), [])
+
+    def test_renames_update_the_index_and_logins_do_not(self):
+        self.bob.last_name = 'Drop'
+        self.bob.save()
+        self.assertEqual(self.people(self.eve, 'tables'), [])
+        self.assertEqual(self.people(self.eve, 'drop'), ['bobby'])
+        with self.assertNumQueries(1):
+            self.bob.save(update_fields=['last_login'])
+
+    def test_respects_profile_visibility(self):
+        settings = self.alice.settings
+        settings.profile_visibility = 'friends'
+        settings.save()
+        self.assertEqual(self.people(self.eve, 'alice'), [])
+        self.assertEqual(self.people(self.alice, 'alice'), ['alice'])
+        Friendship.objects.create(from_user=self.alice, to_user=self.eve, status='accepted')
+        self.assertEqual(self.people(self.eve, 'alice'), ['alice'])
+
+        settings.profile_visibility = 'private'
+        settings.save()
+        self.assertEqual(self.people(self.eve, 'alice'), [])
+
+        self.bob.is_active = False
+        self.bob.save()
+        self.assertEqual(self.people(self.eve, 'bob'), [])
+
+    def test_search_view_lists_people_on_the_first_page(self):
+        self.client.force_login(self.eve)
+        response = self.client.get(reverse('search:search'), {'q': 'liddell'})
+        self.assertContains(response, reverse('profile_detail', args=['alice']))
+        self.assertNotContains(response, 'Nothing matched')
+        UserDocument.objects.filter(user=self.alice).delete()
+        self.assertEqual(self.people(self.eve, 'liddell'), [])
@@ -0,0 +1,26 @@
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest
+from django.shortcuts import render
+
+from core.pagination import InvalidCursor
+from .index import SORTS, get_search_page, search_people
+
+
+@login_required
+def search(request):
+    query = request.GET.get('q', '').strip()
+    sort = request.GET.get('sort')
+    if sort not in SORTS:
+        sort = SORTS[0]
+    cursor = request.GET.get('cursor')
+    try:
+        page = get_search_page(request.user, query, sort=sort, cursor=cursor)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid search cursor")
+    return render(request, 'search/results.html', {
+        'query': query,
+        'sort': sort,
+        'people': [] if cursor else search_people(request.user, query),
+        'results': page.items,
+        'next_cursor': page.next_cursor,
+    })
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from decouple import Csv, config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -31,21 +33,26 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    'daphne',  # runserver serves ASGI, so WebSockets work locally
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'channels',
     'accounts',  
     'posts',     
     'core',         
     'notifications',  
     'user_settings',  
+    'search',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -66,22 +73,83 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'notifications.context_processors.notifications',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'socialhub.wsgi.application'
+ASGI_APPLICATION = 'socialhub.asgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite by default; set DATABASE_ENGINE=postgresql and the DB_* variables in production.
+
+DATABASE_ENGINE = config("DATABASE_ENGINE", default='sqlite')
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config("DB_NAME", default='socialhub'),
+            'USER': config("DB_USER", default='socialhub'),
+            'PASSWORD': config("DB_PASSWORD", default=''),
+            'HOST': config("DB_HOST", default='localhost'),
+            'PORT': config("DB_PORT", default='5432'),
+            # Keep connections open between requests; health checks replace dead ones
+            'CONN_MAX_AGE': config("DB_CONN_MAX_AGE", cast=int, default=60),
+            'CONN_HEALTH_CHECKS': True,
+            # Server-side cursors let .iterator() stream big result sets. Turn them
+            # off behind a transaction-pooling pgbouncer, which cannot keep them.
+            'DISABLE_SERVER_SIDE_CURSORS': config("DB_DISABLE_SERVER_SIDE_CURSORS", cast=bool, default=False),
+            'OPTIONS': {
+                'connect_timeout': config("DB_CONNECT_TIMEOUT", cast=int, default=5),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            # The stock backend plus SQLITE_PRAGMAS and transaction_mode
+            'ENGINE': 'core.backends.sqlite3',
+            'NAME': config("SQLITE_PATH", default=str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                # Seconds to wait for a lock before "database is locked"
+                'timeout': 20,
+                # Take the write lock at BEGIN so lock waits happen there
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+# Read replicas: comma-separated hosts (PostgreSQL) or database files (SQLite)
+# holding replicated copies of the default database. core.routers sends reads
+# of GET requests to them, except for users who wrote in the last
+# REPLICA_PIN_SECONDS.
+DATABASE_REPLICAS = []
+for number, location in enumerate(config("DB_REPLICAS", default='', cast=Csv()), start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST' if DATABASE_ENGINE == 'postgresql' else 'NAME': location,
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = config("REPLICA_PIN_SECONDS", cast=int, default=10)
+
+# Applied to every new SQLite connection by core.backends.sqlite3. WAL lets readers run
+# alongside the writer; NORMAL sync is crash-safe in WAL mode and skips an
+# fsync per commit.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,  # KiB, i.e. 20 MB
+    'temp_store': 'memory',
 }
 
 
@@ -130,8 +198,6 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-from decouple import config
-
 EMAIL_BACKEND = config("EMAIL_BACKEND", default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config("EMAIL_HOST", default='')
 EMAIL_PORT = config("EMAIL_PORT", cast=int, default=587)
@@ -140,6 +206,54 @@ EMAIL_HOST_USER = config("EMAIL_HOST_USER", default='')
 EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD", default='')
 DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL", default='noreply@socialhub.com')
 
+# Channels: Redis when REDIS_URL is set, otherwise the in-process memory layer
+# (fine for local development and tests, but only reaches sockets on this worker)
+REDIS_URL = config("REDIS_URL", default='')
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        }
+    }
+
+# Cache: 'locmem' (per-process LRU, the default), 'file' (shared by the workers
+# of one host) or 'redis' (shared by every host). The backends come from
+# core.backends.cache or Django and report evictions to core.metrics. Bump
+# CACHE_VERSION to retire every cached entry at once after a deploy.
+CACHE_BACKEND = config("CACHE_BACKEND", default='locmem')
+CACHE_BACKENDS = {
+    'locmem': ('core.backends.cache.LocMemCache', 'socialhub'),
+    'file': ('core.backends.cache.FileBasedCache', str(BASE_DIR / 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', REDIS_URL or 'redis://127.0.0.1:6379/1'),
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': config("CACHE_LOCATION", default=CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'TIMEOUT': config("CACHE_TIMEOUT", cast=int, default=300),
+        'KEY_PREFIX': 'socialhub',
+        'VERSION': config("CACHE_VERSION", cast=int, default=1),
+    }
+}
+if CACHE_BACKEND != 'redis':
+    # Redis evicts by its own maxmemory policy instead
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': config("CACHE_MAX_ENTRIES", cast=int, default=10000)}
+
+# Sessions are read on every request; keep them in the cache in front of the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Request metrics (core.middleware): share of requests sampled, and the
+# bearer token Prometheus uses for /metrics/prometheus/
+METRICS_SAMPLE_RATE = config("METRICS_SAMPLE_RATE", cast=float, default=1.0 if DEBUG else 0.05)
+METRICS_TOKEN = config("METRICS_TOKEN", default='')
+
 # Authentication
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/'
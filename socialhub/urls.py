@@ -15,15 +15,15 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
 from django.shortcuts import redirect
+from core.views import metrics_dashboard, metrics_prometheus, serve_media
 
 def home_redirect(request):
     """Temporary redirect to login page"""
     if request.user.is_authenticated:
-        return redirect('posts:home')  # We'll create this later
+        return redirect('posts:post_list')
     return redirect('login')
 
 urlpatterns = [
@@ -32,8 +32,15 @@ urlpatterns = [
     path('', home_redirect, name='home'),
     path('posts/', include('posts.urls', namespace='posts')),
     path('user_settings/', include('user_settings.urls', namespace='user_settings')),
+    path('friends/', include('core.urls', namespace='core')),
+    path('notifications/', include('notifications.urls', namespace='notifications')),
+    path('search/', include('search.urls', namespace='search')),
+    path('metrics/', metrics_dashboard, name='metrics'),
+    path('metrics/prometheus/', metrics_prometheus, name='metrics_prometheus'),
 ]
 
 # Serve media files in development
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += [
+        re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.*)$", serve_media, name='media'),
+    ]
@@ -1,6 +1,15 @@
-from django.db import models
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models
 from django.contrib.auth.models import User
 
+from core.cache import CacheNamespace
+
+
+SETTINGS_CACHE_TIMEOUT = getattr(settings, 'USER_SETTINGS_CACHE_TIMEOUT', 60 * 15)
+
+# Settings by user id; dropped by accounts.signals
+settings_cache = CacheNamespace('user_settings', timeout=SETTINGS_CACHE_TIMEOUT)
+
 
 class UserSettings(models.Model):
     """
@@ -62,6 +71,13 @@ class UserSettings(models.Model):
     def __str__(self):
         return f"{self.user.username}'s Settings"
     
+    @classmethod
+    def for_user(cls, user_id):
+        """The user's settings from the cache when possible; None if they have none"""
+        return settings_cache.get_or_set(
+            user_id, lambda: cls.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).first()
+        )
+    
     class Meta:
         verbose_name = "User Settings"
         verbose_name_plural = "User Settings"